@@ -35,6 +35,9 @@ def create_app():
     # Access token expiry: default to 1 day
     from datetime import timedelta
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
+    # Put exec club uids in access tokens so exec checks skip the database (see app/authz.py).
+    # Revoked claims are still honoured by other processes for up to DATA_VERSION_TTL_SECONDS.
+    app.config['JWT_MEMBERSHIP_CLAIMS'] = os.environ.get('JWT_MEMBERSHIP_CLAIMS') == '1'
 
     # Initialize extensions
     db.init_app(app)
@@ -42,6 +45,56 @@ def create_app():
     jwt.init_app(app)
     cors.init_app(app, resources={r"/*": {"origins": ["http://localhost:5173", "http://127.0.0.1:5173", "http://localhost:5174", "http://127.0.0.1:5174", "https://sage-clubs.vercel.app", "https://sage-main.vercel.app"]}}, supports_credentials=True)
 
+    # Pub/sub for live updates, shared across worker processes through
+    # LISTEN/NOTIFY on Postgres (see app/pubsub.py). Each open stream holds a
+    # request thread, so keep SSE_MAX_STREAMS below the threads per process.
+    from .pubsub import create_broker
+    app.extensions['pubsub'] = create_broker(app.config['SQLALCHEMY_DATABASE_URI'],
+                                             max_subscribers=int(os.environ.get('SSE_MAX_STREAMS') or 8))
+    app.config['SSE_KEEPALIVE_SECONDS'] = int(os.environ.get('SSE_KEEPALIVE_SECONDS') or 15)
+
+    # Process-local cache for expensive read endpoints (see app/cache.py)
+    from .cache import SimpleCache
+    app.extensions['cache'] = SimpleCache()
+    app.config['DATA_VERSION_TTL_SECONDS'] = int(os.environ.get('DATA_VERSION_TTL_SECONDS') or 30)
+
+    # Cross-request cache of users' club memberships (see app/authz.py); 0 disables it
+    membership_cache_size = int(os.environ.get('MEMBERSHIP_CACHE_SIZE') or 0)
+    if membership_cache_size:
+        app.extensions['membership_cache'] = SimpleCache(max_entries=membership_cache_size)
+    app.config['MEMBERSHIP_CACHE_TTL_SECONDS'] = int(os.environ.get('MEMBERSHIP_CACHE_TTL_SECONDS') or 30)
+    # Per-user membership versions checked against token claims, kept apart from
+    # the response cache so that many users can't evict it
+    app.extensions['membership_versions'] = SimpleCache(max_entries=int(os.environ.get('MEMBERSHIP_VERSION_CACHE_SIZE') or 4096))
+
+    # Pooled keep-alive session for outbound HTTP calls (see app/http.py)
+    from .http import create_http_session
+    app.extensions['http_session'] = create_http_session(int(os.environ.get('HTTP_POOL_SIZE') or 8))
+    app.config['MEDIA_MAX_UPLOAD_BYTES'] = int(os.environ.get('MEDIA_MAX_UPLOAD_BYTES') or 20 * 1024 * 1024)
+    # Local content-addressed media storage with resized variants instead of
+    # Cloudinary (see app/storage.py)
+    if os.environ.get('MEDIA_STORAGE') == 'local':
+        from .storage import LocalStorage, VariantPool
+        media_storage = LocalStorage(os.environ.get('MEDIA_LOCAL_ROOT') or os.path.join(app.instance_path, 'media'))
+        app.extensions['media_storage'] = media_storage
+        app.extensions['media_variants'] = VariantPool(media_storage, int(os.environ.get('MEDIA_VARIANT_WORKERS') or 2))
+    app.config['MEDIA_PUBLIC_URL'] = os.environ.get('MEDIA_PUBLIC_URL')
+    # Largest image, in pixels, that local storage accepts and renders variants of
+    app.config['MEDIA_MAX_IMAGE_PIXELS'] = int(os.environ.get('MEDIA_MAX_IMAGE_PIXELS') or 40_000_000)
+    # How long /media/sign parameters may be confirmed after issue; Cloudinary itself caps it at an hour
+    app.config['MEDIA_SIGNED_UPLOAD_TTL_SECONDS'] = int(os.environ.get('MEDIA_SIGNED_UPLOAD_TTL_SECONDS') or 600)
+
+    # Password hashing cost and verification pool (see app/passwords.py)
+    from .passwords import DEFAULT_METHOD, PasswordHasher
+    app.extensions['password_hasher'] = PasswordHasher(
+        method=os.environ.get('PASSWORD_HASH_METHOD') or DEFAULT_METHOD,
+        workers=int(os.environ.get('PASSWORD_HASH_WORKERS') or 0)
+    )
+
+    # Per-process interval index over event times (see app/schedule_index.py)
+    from .schedule_index import EventIntervalIndex
+    app.extensions['event_index'] = EventIntervalIndex()
+
     # Register blueprints
     from .routes import auth as auth_bp
     from .routes import clubs as clubs_bp
@@ -57,11 +110,17 @@ def create_app():
     app.register_blueprint(comments_bp.bp)
     app.register_blueprint(media_bp.bp)
 
+    # CLI commands
+    from .metrics import rebuild_club_metrics_command
+    app.cli.add_command(rebuild_club_metrics_command)
+
     # Import models so they are registered with SQLAlchemy
     with app.app_context():
         from . import models  # noqa: F401
-        # Create all tables if they don't exist
-        db.create_all()
+        # Create missing tables, and add columns and indexes that tables made
+        # by an older release lack (see app/schema.py)
+        from .schema import upgrade_schema
+        upgrade_schema()
 
     return app
 
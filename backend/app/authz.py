@@ -0,0 +1,135 @@
+"""Authorization helpers backed by a request-scoped view of the caller.
+
+memberships(user_uid) loads all of a user's club memberships in one query and
+keeps them on flask.g for the rest of the request, so repeated exec/member
+checks cost nothing after the first. With MEMBERSHIP_CACHE_SIZE > 0 they are
+also kept across requests in a process-local LRU
+(app.extensions['membership_cache']) for MEMBERSHIP_CACHE_TTL_SECONDS.
+
+Routes that change a membership (join, leave, promote, demote) call
+invalidate_memberships after committing. That clears this process's entry;
+other worker processes see the change once their entry expires, so keep the
+TTL short.
+
+With JWT_MEMBERSHIP_CLAIMS enabled, access tokens also carry the user's exec
+club uids and their membership version (see membership_claims). Exec checks
+for the token's own user are then answered from the token while that version
+is current. The version is a per-user data version (app/cache.py), bumped in
+the same transaction as any change to the user's exec memberships, so stale
+tokens fall back to the database. Users whose exec memberships never changed
+have no version row and are at version 0. Per-user versions are memoized in
+their own LRU (app.extensions['membership_versions']), so logins can't evict
+cached responses. Tokens are minted from the database, never
+from the caches above. Checks compare against the memoized version, so a
+process keeps honouring revoked claims for up to DATA_VERSION_TTL_SECONDS
+after a demotion made through another process.
+"""
+from flask import current_app, g
+from flask_jwt_extended import get_jwt
+
+from . import db
+from .cache import bump_data_version, data_version, stored_data_version
+from .models import ClubMember, User
+
+# tokens for users who run more clubs than this carry no claims
+MAX_EXEC_CLAIMS = 50
+# app.extensions key of the cache memoizing per-user membership versions
+MEMBERSHIP_VERSIONS = 'membership_versions'
+
+
+def _cache_key(user_uid):
+    return f'memberships:{user_uid}'
+
+
+def memberships(user_uid):
+    """{club_uid: {'type': ..., 'role': ...}} for every club the user belongs to."""
+    loaded = g.setdefault('memberships', {})
+    if user_uid in loaded:
+        return loaded[user_uid]
+
+    cache = current_app.extensions.get('membership_cache')
+    result = cache.get(_cache_key(user_uid)) if cache else None
+    if result is None:
+        rows = db.session.query(ClubMember.club_uid, ClubMember.type, ClubMember.role).filter_by(user_uid=user_uid)
+        result = {club_uid: {'type': type_, 'role': role} for club_uid, type_, role in rows}
+        if cache:
+            cache.set(_cache_key(user_uid), result, timeout=current_app.config['MEMBERSHIP_CACHE_TTL_SECONDS'])
+    loaded[user_uid] = result
+    return result
+
+
+def club_membership(user_uid, club_uid):
+    """The user's {'type', 'role'} in the club, or None if not a member."""
+    return memberships(user_uid).get(club_uid)
+
+
+def is_club_member(user_uid, club_uid):
+    return club_membership(user_uid, club_uid) is not None
+
+
+def is_club_exec(user_uid, club_uid):
+    exec_clubs = _claimed_exec_clubs(user_uid)
+    if exec_clubs is not None:
+        return club_uid in exec_clubs
+    membership = club_membership(user_uid, club_uid)
+    return membership is not None and membership['type'] == 'exec'
+
+
+def _membership_version_name(user_uid):
+    return f'membership:{user_uid}'
+
+
+def bump_membership_version(user_uid):
+    """Mark tokens issued before a change to user_uid's exec memberships as
+    stale. Call before committing the change."""
+    bump_data_version(_membership_version_name(user_uid), cache=MEMBERSHIP_VERSIONS)
+
+
+def membership_claims(user_uid):
+    """Extra JWT claims for user_uid: {'exec_clubs': [...], 'mv': version}.
+
+    Empty unless JWT_MEMBERSHIP_CLAIMS is enabled.
+    """
+    if not current_app.config['JWT_MEMBERSHIP_CLAIMS']:
+        return {}
+    # read the version first and the clubs straight from the database: a change
+    # committed in between leaves the token with an old version, never with
+    # an old club list under a current version
+    version = stored_data_version(_membership_version_name(user_uid))
+    exec_clubs = [club_uid for (club_uid,) in db.session.query(ClubMember.club_uid).filter_by(user_uid=user_uid, type='exec')]
+    if len(exec_clubs) > MAX_EXEC_CLAIMS:
+        return {}
+    return {'exec_clubs': exec_clubs, 'mv': version}
+
+
+def _claimed_exec_clubs(user_uid):
+    """The exec club uids in the request's token if they can be trusted, else None."""
+    if not current_app.config['JWT_MEMBERSHIP_CLAIMS']:
+        return None
+    try:
+        claims = get_jwt()
+    except RuntimeError:
+        return None
+    if claims.get('sub') != user_uid or 'mv' not in claims:
+        return None
+    if claims['mv'] != data_version(_membership_version_name(user_uid), cache=MEMBERSHIP_VERSIONS):
+        return None
+    return claims['exec_clubs']
+
+
+def invalidate_memberships(*user_uids):
+    """Forget cached memberships after a committed membership change."""
+    loaded = g.get('memberships', {})
+    cache = current_app.extensions.get('membership_cache')
+    for user_uid in user_uids:
+        loaded.pop(user_uid, None)
+        if cache:
+            cache.delete(_cache_key(user_uid))
+
+
+def current_user(user_uid):
+    """The User for user_uid, loaded at most once per request."""
+    users = g.setdefault('users', {})
+    if user_uid not in users:
+        users[user_uid] = db.session.get(User, user_uid)
+    return users[user_uid]
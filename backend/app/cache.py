@@ -0,0 +1,129 @@
+"""Process-local response cache and shared data-version counters.
+
+Cached values are keyed by the version of the data they were computed from.
+Writers (e.g. the course scraper) call bump_data_version in the transaction
+that changes the data; once it commits, readers simply stop hitting the old
+keys. The cache backend lives in
+app.extensions['cache']; any object with the same get/set/delete/clear
+methods (e.g. a Redis wrapper) can replace SimpleCache.
+"""
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import db
+from .course_import import UPSERT_DIALECTS
+from .models import DataVersion
+
+
+class SimpleCache:
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            # move to the end so eviction drops the least recently used entry
+            del self._data[key]
+            self._data[key] = item
+            return value
+
+    def set(self, key, value, timeout=None):
+        """Store value; timeout is in seconds, None means no expiry."""
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires_at)
+            while len(self._data) > self.max_entries:
+                # dicts keep insertion order, so this drops the least recently used entry
+                del self._data[next(iter(self._data))]
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def get_cache(extension='cache'):
+    return current_app.extensions[extension]
+
+
+def _version_key(name):
+    return f'data-version:{name}'
+
+
+def stored_data_version(name):
+    """The committed version of a named data set, read from the database."""
+    return db.session.query(DataVersion.version).filter_by(name=name).scalar() or 0
+
+
+def data_version(name, cache='cache'):
+    """Current version of a named data set.
+
+    The value is memoized for DATA_VERSION_TTL_SECONDS in the cache stored
+    under app.extensions[cache], so most calls don't touch the database; other
+    processes see a bump within that TTL. Versions with many names (e.g. one
+    per user) use their own cache so they can't evict cached responses.
+    """
+    cache = get_cache(cache)
+    version = cache.get(_version_key(name))
+    if version is None:
+        version = stored_data_version(name)
+        cache.set(_version_key(name), version, timeout=current_app.config['DATA_VERSION_TTL_SECONDS'])
+    return version
+
+
+def bump_data_version(name, cache='cache'):
+    """Increment a named data version. The caller commits. Returns the new version.
+
+    This process's memoized value is dropped once the session commits, so a
+    reader in between can't cache the old version again for the whole TTL.
+    """
+    now = datetime.utcnow()
+    insert = UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+    if insert is not None:
+        # a single statement, so two first bumps of a name can't both insert it
+        stmt = insert(DataVersion).values(name=name, version=1, updated_at=now)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[DataVersion.name],
+            set_={'version': DataVersion.version + 1, 'updated_at': now}
+        ))
+    else:
+        updated = DataVersion.query.filter_by(name=name).update({
+            'version': DataVersion.version + 1,
+            'updated_at': now
+        })
+        if not updated:
+            db.session.add(DataVersion(name=name, version=1, updated_at=now))
+        db.session.flush()
+    db.session.info.setdefault('bumped_data_versions', set()).add((cache, name))
+    return stored_data_version(name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_bumped_versions(session):
+    names = session.info.pop('bumped_data_versions', None)
+    if names and has_app_context():
+        for cache, name in names:
+            if cache in current_app.extensions:
+                get_cache(cache).delete(_version_key(name))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_bumped_versions(session):
+    session.info.pop('bumped_data_versions', None)
@@ -0,0 +1,176 @@
+"""Bulk persistence of scraped course data.
+
+upsert_courses writes a whole scrape in one transaction with a handful of
+set-based statements instead of per-course queries: courses are upserted with
+INSERT ... ON CONFLICT (PostgreSQL and SQLite) and their time slots are
+replaced with one bulk delete and one bulk insert.
+
+Each course stores a content hash of its name, raw and parsed schedule and
+enrollment, so rows whose scraped content did not change are not written at all.
+"""
+import hashlib
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import db
+from .models import Course, TimeSlot
+
+# values per IN (...) list
+CHUNK_SIZE = 5000
+# bound parameters per statement: SQLite's default SQLITE_MAX_VARIABLE_NUMBER,
+# which is below Postgres' 65535
+MAX_BIND_PARAMS = 32766
+
+UPSERT_DIALECTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _parse_time(value):
+    return datetime.strptime(value, '%H:%M').time()
+
+
+def content_hash(course_data):
+    """sha256 hex digest of the fields a scrape can change.
+
+    Covers the parsed meeting blocks as well as the raw schedule, so a parser
+    change that reads the same string differently still rewrites the slots.
+    """
+    blocks = course_data.get('blocks') or [course_data]
+    parts = [course_data['course_name'], course_data['schedule_raw'] or '', str(course_data['students_enrolled'])]
+    parts.extend(f"{','.join(block.get('days') or [])}|{block.get('start_time') or ''}|{block.get('end_time') or ''}"
+                 for block in blocks)
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _slot_rows(course_data):
+    """TimeSlot mappings for a scraped course. Raises ValueError on bad times.
+
+    Courses meeting at different times on different days carry one entry per
+    meeting in 'blocks'; otherwise the top-level days and times are used.
+    """
+    blocks = course_data.get('blocks') or [course_data]
+    rows = []
+    for block in blocks:
+        if not (block.get('start_time') and block.get('end_time')):
+            continue
+        start = _parse_time(block['start_time'])
+        end = _parse_time(block['end_time'])
+        rows.extend({
+            'course_code': course_data['course_code'],
+            'day_of_week': day,
+            'start_time': start,
+            'end_time': end,
+            'students_count': course_data['students_enrolled']
+        } for day in block.get('days', []))
+    return rows
+
+
+def _write_courses(rows, added, changed, now):
+    insert = UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+    if insert is not None:
+        # each row binds one parameter per column, created_at included
+        for chunk in _chunks(rows, MAX_BIND_PARAMS // (len(rows[0]) + 1)):
+            stmt = insert(Course).values([dict(row, created_at=now) for row in chunk])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Course.course_code],
+                set_={
+                    'course_name': stmt.excluded.course_name,
+                    'schedule_raw': stmt.excluded.schedule_raw,
+                    'students_enrolled': stmt.excluded.students_enrolled,
+                    'content_hash': stmt.excluded.content_hash,
+                    'updated_at': stmt.excluded.updated_at
+                }
+            )
+            db.session.execute(stmt)
+        return
+
+    # other databases: plain bulk insert for new codes, bulk update for the rest
+    by_code = {row['course_code']: row for row in rows}
+    ids = {}
+    for chunk in _chunks(changed):
+        ids.update(db.session.query(Course.course_code, Course.id).filter(Course.course_code.in_(chunk)))
+    db.session.bulk_insert_mappings(Course, [dict(by_code[code], created_at=now) for code in added])
+    db.session.bulk_update_mappings(Course, [dict(by_code[code], id=ids[code]) for code in changed])
+
+
+def upsert_courses(courses, remove_missing=False, partial=False):
+    """Write the courses whose content changed and replace their time slots.
+
+    Courses already stored with the same content hash are left untouched.
+    Stored courses absent from this scrape are reported as removed, and only
+    deleted when remove_missing is set (a partial or sharded scrape would
+    otherwise drop courses it never saw).
+
+    With partial set the courses are one batch of a larger run: only their
+    own stored hashes are loaded and nothing is reported as removed.
+
+    Everything is committed in one transaction. Returns a dict with the
+    added, changed and removed course codes, the number of unchanged
+    courses, and the skipped courses with their errors.
+    """
+    now = datetime.utcnow()
+    course_rows = {}
+    slot_rows = {}
+    skipped = {}
+    for course_data in courses:
+        code = course_data.get('course_code')
+        try:
+            slots = _slot_rows(course_data)
+            digest = content_hash(course_data)
+        except (KeyError, TypeError, ValueError) as e:
+            skipped[code] = str(e)
+            continue
+        # later entries for the same code win
+        course_rows[code] = {
+            'course_code': code,
+            'course_name': course_data['course_name'],
+            'schedule_raw': course_data['schedule_raw'],
+            'students_enrolled': course_data['students_enrolled'],
+            'content_hash': digest,
+            'updated_at': now
+        }
+        slot_rows[code] = slots
+
+    if partial:
+        stored = {}
+        for chunk in _chunks(list(course_rows)):
+            stored.update(db.session.query(Course.course_code, Course.content_hash)
+                          .filter(Course.course_code.in_(chunk)))
+    else:
+        stored = dict(db.session.query(Course.course_code, Course.content_hash))
+    added = [code for code in course_rows if code not in stored]
+    changed = [code for code in course_rows
+               if code in stored and stored[code] != course_rows[code]['content_hash']]
+    removed = [] if partial else [code for code in stored if code not in course_rows]
+    written = added + changed
+
+    try:
+        if written:
+            _write_courses([course_rows[code] for code in written], added, changed, now)
+            for chunk in _chunks(changed):
+                TimeSlot.query.filter(TimeSlot.course_code.in_(chunk)).delete(synchronize_session=False)
+            db.session.bulk_insert_mappings(TimeSlot, [row for code in written for row in slot_rows[code]])
+        if remove_missing and removed:
+            for chunk in _chunks(removed):
+                TimeSlot.query.filter(TimeSlot.course_code.in_(chunk)).delete(synchronize_session=False)
+                Course.query.filter(Course.course_code.in_(chunk)).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {
+        'added': added,
+        'changed': changed,
+        'removed': removed,
+        'unchanged': len(course_rows) - len(written),
+        'skipped': skipped
+    }
@@ -0,0 +1,22 @@
+"""Shared outbound HTTP session.
+
+One requests.Session per process, in app.extensions['http_session'], so calls
+to external services (e.g. media uploads) reuse keep-alive connections instead
+of opening a new one per request. urllib3's connection pool is thread-safe;
+HTTP_POOL_SIZE should match the number of request threads per worker.
+"""
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+
+
+def create_http_session(pool_size=8):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_http_session():
+    return current_app.extensions['http_session']
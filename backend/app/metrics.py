@@ -0,0 +1,151 @@
+"""Incrementally maintained per-club daily activity rollup.
+
+Routes call `record_club_activity` in the same transaction as the change they
+make, so dashboards can read one `club_daily_metrics` row per day instead of
+scanning `club_members` and `event_participants`. `flask rebuild-club-metrics`
+recomputes the table from the fact tables.
+
+joins, event_signups and events_created count the memberships, signups and
+events that still exist, by the day they were made: removing one subtracts it
+from that day again (see record_membership_removed and record_event_removed),
+so the live counters always match what a rebuild produces. leaves has no
+surviving fact rows; it only grows, and the rebuild keeps it.
+
+Starting the app against a database from before the rollup (or before
+events.created_at) adds the column and rebuilds the table once, see
+app/schema.py. Events created before that have no created_at and are not
+counted in events_created.
+"""
+from datetime import datetime, date
+
+import click
+from flask.cli import with_appcontext
+
+from . import db
+from .course_import import UPSERT_DIALECTS
+from .models import ClubDailyMetric, ClubMember, Event, EventParticipant
+
+COUNTERS = ('joins', 'leaves', 'event_signups', 'events_created')
+
+
+def record_club_activity(club_uid, day=None, **deltas):
+    """Add deltas (e.g. joins=1) to the club's rollup row for day (default today).
+
+    The caller is responsible for committing the session.
+    """
+    if not club_uid:
+        return
+    day = day or datetime.utcnow().date()
+    insert = UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+    if insert is not None:
+        # one statement, so concurrent first actions of the day can't both insert the row
+        stmt = insert(ClubDailyMetric).values(
+            club_uid=club_uid, day=day, **{c: deltas.get(c, 0) for c in COUNTERS}
+        )
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[ClubDailyMetric.club_uid, ClubDailyMetric.day],
+            set_={field: getattr(ClubDailyMetric, field) + stmt.excluded[field] for field in deltas}
+        ))
+        return
+    metric = db.session.get(ClubDailyMetric, (club_uid, day))
+    if metric is None:
+        metric = ClubDailyMetric(club_uid=club_uid, day=day, **{c: 0 for c in COUNTERS})
+        db.session.add(metric)
+        for field, delta in deltas.items():
+            setattr(metric, field, getattr(metric, field) + delta)
+    else:
+        # increment in SQL so concurrent workers don't overwrite each other
+        for field, delta in deltas.items():
+            setattr(metric, field, getattr(ClubDailyMetric, field) + delta)
+
+
+def _as_date(value):
+    # sqlite returns date() as a string, postgres as a date
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def record_membership_removed(member):
+    """Record a member leaving: a leave today, and one join fewer on the day
+    they joined. Call before committing the delete."""
+    record_club_activity(member.club_uid, leaves=1)
+    if member.joined_at is not None:
+        record_club_activity(member.club_uid, day=member.joined_at.date(), joins=-1)
+
+
+def record_event_removed(event):
+    """Take a deleted event and its signups back out of the rollup. Call
+    before deleting the event's participants."""
+    if not event.club_uid:
+        return
+    signup_day = db.func.date(EventParticipant.joined_at)
+    for day, count in db.session.query(
+        signup_day, db.func.count(EventParticipant.id)
+    ).filter(
+        EventParticipant.event_uid == event.uid, EventParticipant.joined_at.isnot(None)
+    ).group_by(signup_day):
+        record_club_activity(event.club_uid, day=_as_date(day), event_signups=-count)
+    if event.created_at is not None:
+        record_club_activity(event.club_uid, day=event.created_at.date(), events_created=-1)
+
+
+def rebuild_club_metrics():
+    """Recompute club_daily_metrics from the fact tables. Returns the row count.
+
+    Joins, signups and created events are recounted from the rows that still
+    exist, which the live counters match. Leaves have no surviving fact rows,
+    so existing leave counts are kept.
+    """
+    rows = {}
+
+    def row(club_uid, day):
+        key = (club_uid, _as_date(day))
+        if key not in rows:
+            rows[key] = {c: 0 for c in COUNTERS}
+        return rows[key]
+
+    for club_uid, day, leaves in db.session.query(
+        ClubDailyMetric.club_uid, ClubDailyMetric.day, ClubDailyMetric.leaves
+    ).filter(ClubDailyMetric.leaves > 0):
+        row(club_uid, day)['leaves'] = leaves
+
+    join_day = db.func.date(ClubMember.joined_at)
+    for club_uid, day, count in db.session.query(
+        ClubMember.club_uid, join_day, db.func.count(ClubMember.id)
+    ).filter(ClubMember.joined_at.isnot(None)).group_by(ClubMember.club_uid, join_day):
+        row(club_uid, day)['joins'] = count
+
+    signup_day = db.func.date(EventParticipant.joined_at)
+    for club_uid, day, count in db.session.query(
+        Event.club_uid, signup_day, db.func.count(EventParticipant.id)
+    ).join(
+        Event, Event.uid == EventParticipant.event_uid
+    ).filter(
+        Event.club_uid.isnot(None), EventParticipant.joined_at.isnot(None)
+    ).group_by(Event.club_uid, signup_day):
+        row(club_uid, day)['event_signups'] = count
+
+    created_day = db.func.date(Event.created_at)
+    for club_uid, day, count in db.session.query(
+        Event.club_uid, created_day, db.func.count(Event.uid)
+    ).filter(
+        Event.club_uid.isnot(None), Event.created_at.isnot(None)
+    ).group_by(Event.club_uid, created_day):
+        row(club_uid, day)['events_created'] = count
+
+    ClubDailyMetric.query.delete()
+    db.session.add_all(
+        ClubDailyMetric(club_uid=club_uid, day=day, **counters)
+        for (club_uid, day), counters in rows.items()
+    )
+    db.session.commit()
+    return len(rows)
+
+
+@click.command('rebuild-club-metrics')
+@with_appcontext
+def rebuild_club_metrics_command():
+    """Rebuild the club_daily_metrics rollup from scratch."""
+    count = rebuild_club_metrics()
+    click.echo(f"Rebuilt {count} club metric rows")
@@ -1,8 +1,7 @@
 import uuid
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
-
 from . import db
+from .passwords import get_password_hasher
 
 
 def generate_uuid():
@@ -20,10 +19,13 @@ class User(db.Model):
 	clubs = db.relationship('ClubMember', back_populates='user', cascade='all, delete-orphan')
 
 	def set_password(self, password):
-		self.password_hash = generate_password_hash(password)
+		self.password_hash = get_password_hasher().hash(password)
 
 	def check_password(self, password):
-		return check_password_hash(self.password_hash, password)
+		return get_password_hasher().verify(self.password_hash, password)
+
+	def password_needs_rehash(self):
+		return get_password_hasher().needs_rehash(self.password_hash)
 
 	def __repr__(self):
 		return f"<User {self.email}>"
@@ -58,6 +60,11 @@ class ClubMember(db.Model):
 	user = db.relationship('User', back_populates='clubs')
 	club = db.relationship('Club', back_populates='members')
 
+	# per-club lookups and the joined_at range scan used by club stats
+	__table_args__ = (
+		db.Index('ix_club_members_club_joined_at', 'club_uid', 'joined_at'),
+	)
+
 	def __repr__(self):
 		return f"<ClubMember user={self.user_uid} club={self.club_uid} type={self.type}>"
 
@@ -75,6 +82,7 @@ class Event(db.Model):
 	limit = db.Column(db.Integer, nullable=True)
 	type = db.Column(db.String(50), nullable=False)  # 'in-person' or 'online'
 	status = db.Column(db.String(50), nullable=False, default='scheduled')
+	created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 	# Optional media
 	banner_url = db.Column(db.String(1024), nullable=True)
@@ -83,6 +91,12 @@ class Event(db.Model):
 
 	club = db.relationship('Club', backref=db.backref('events', cascade='all, delete-orphan'))
 
+	# support keyset pagination of the events feed on (start_datetime, uid), globally and per club
+	__table_args__ = (
+		db.Index('ix_events_start_datetime_uid', 'start_datetime', 'uid'),
+		db.Index('ix_events_club_start_datetime_uid', 'club_uid', 'start_datetime', 'uid'),
+	)
+
 	def __repr__(self):
 		return f"<Event {self.name} ({self.uid})>"
 
@@ -102,6 +116,33 @@ class EventParticipant(db.Model):
 		return f"<EventParticipant user={self.user_uid} event={self.event_uid} type={self.type}>"
 
 
+class ClubDailyMetric(db.Model):
+	"""Per-club daily activity rollup read by the exec dashboard"""
+	__tablename__ = 'club_daily_metrics'
+	club_uid = db.Column(db.String(36), db.ForeignKey('clubs.uid'), primary_key=True)
+	day = db.Column(db.Date, primary_key=True)
+	joins = db.Column(db.Integer, nullable=False, default=0)
+	leaves = db.Column(db.Integer, nullable=False, default=0)
+	event_signups = db.Column(db.Integer, nullable=False, default=0)
+	events_created = db.Column(db.Integer, nullable=False, default=0)
+
+	club = db.relationship('Club', backref=db.backref('daily_metrics', cascade='all, delete-orphan'))
+
+	def __repr__(self):
+		return f"<ClubDailyMetric club={self.club_uid} day={self.day}>"
+
+
+class DataVersion(db.Model):
+	"""Counter bumped whenever a derived data set (e.g. calendar) changes"""
+	__tablename__ = 'data_versions'
+	name = db.Column(db.String(50), primary_key=True)
+	version = db.Column(db.Integer, nullable=False, default=0)
+	updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+	def __repr__(self):
+		return f"<DataVersion {self.name}={self.version}>"
+
+
 class Course(db.Model):
 	"""Scraped course data for calendar heatmap analysis"""
 	__tablename__ = 'courses'
@@ -110,6 +151,7 @@ class Course(db.Model):
 	course_name = db.Column(db.String(255), nullable=False)
 	schedule_raw = db.Column(db.String(255))  # Raw schedule string from portal
 	students_enrolled = db.Column(db.Integer, default=0)
+	content_hash = db.Column(db.String(64))  # sha256 of name, schedule and enrollment
 	created_at = db.Column(db.DateTime, default=datetime.utcnow)
 	updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 	
@@ -153,5 +195,10 @@ class Comment(db.Model):
 	# Self-referential relationship for replies
 	replies = db.relationship('Comment', backref=db.backref('parent', remote_side=[uid]), cascade='all, delete-orphan')
 
+	# paginated thread reads filter on event and parent, ordered by created_at
+	__table_args__ = (
+		db.Index('ix_comments_event_parent_created_at', 'event_uid', 'parent_uid', 'created_at'),
+	)
+
 	def __repr__(self):
 		return f"<Comment {self.uid} by {self.user_uid} on {self.event_uid}>"
@@ -0,0 +1,109 @@
+"""Minute-resolution occupancy grids built from course time slots.
+
+A grid is a (7, MINUTES_PER_DAY // bucket_minutes) array whose cell [d, b]
+holds the total weight (e.g. students) of every slot overlapping bucket b on
+day d. Grids are built with a difference array and a prefix sum, so the cost
+is O(slots + buckets) however long the slots are.
+"""
+import numpy as np
+
+DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+DAY_INDEX = {day: i for i, day in enumerate(DAYS)}
+MINUTES_PER_DAY = 24 * 60
+
+
+def valid_bucket(bucket_minutes):
+    return 1 <= bucket_minutes <= MINUTES_PER_DAY and MINUTES_PER_DAY % bucket_minutes == 0
+
+
+def slot_arrays(rows):
+    """Convert (day_of_week, start_time, end_time, students) rows into arrays.
+
+    Returns (days, starts, ends, students) where starts/ends are minutes since
+    midnight. Rows with an unknown day or a non-positive duration are dropped.
+    """
+    days, starts, ends, students = [], [], [], []
+    for day, start, end, count in rows:
+        index = DAY_INDEX.get(day)
+        if index is None or start is None or end is None:
+            continue
+        days.append(index)
+        starts.append(start.hour * 60 + start.minute)
+        ends.append(end.hour * 60 + end.minute)
+        students.append(count or 0)
+    days = np.asarray(days, dtype=np.intp)
+    starts = np.asarray(starts, dtype=np.intp)
+    ends = np.asarray(ends, dtype=np.intp)
+    students = np.asarray(students, dtype=np.int64)
+    keep = ends > starts
+    return days[keep], starts[keep], ends[keep], students[keep]
+
+
+def occupancy_grid(days, starts, ends, weights, bucket_minutes):
+    """Sum weights over every bucket each slot touches.
+
+    A slot occupies a bucket if it overlaps any part of it, so 10:00-11:30 and
+    11:00-12:20 both count towards the 11:00 bucket at 30-minute resolution.
+    """
+    buckets = MINUTES_PER_DAY // bucket_minutes
+    diff = np.zeros((len(DAYS), buckets + 1), dtype=np.int64)
+    first = starts // bucket_minutes
+    # ceil division: a slot ending mid-bucket still occupies that bucket
+    stop = np.minimum(-(-ends // bucket_minutes), buckets)
+    np.add.at(diff, (days, first), weights)
+    np.add.at(diff, (days, stop), -weights)
+    return np.cumsum(diff, axis=1)[:, :buckets]
+
+
+def find_free_windows(grid, bucket_minutes, duration_minutes, days, start_minute, end_minute,
+                      max_busy=None, limit=5, step_minutes=15):
+    """Rank the quietest windows of duration_minutes in a precomputed grid.
+
+    Candidate windows start every step_minutes on the given day indexes and lie
+    within [start_minute, end_minute). Each is scored by its peak occupancy,
+    then its mean occupancy, using sliding-window reductions over the grid.
+    Windows busier than max_busy at any point are dropped, and overlapping
+    windows on the same day are suppressed so results are distinct.
+
+    Returns up to limit dicts with day index, start/end minute, peak and mean.
+    """
+    width = -(-duration_minutes // bucket_minutes)
+    step = max(step_minutes // bucket_minutes, 1)
+    first = -(-start_minute // bucket_minutes)
+    last = end_minute // bucket_minutes - width
+    if not days or last < first:
+        return []
+
+    starts = np.arange(first, last + 1, step)
+    rows = grid[list(days)]
+    windows = np.lib.stride_tricks.sliding_window_view(rows, width, axis=1)[:, starts]
+    peaks = windows.max(axis=2)
+    means = windows.mean(axis=2)
+
+    if max_busy is None:
+        day_pos, start_pos = np.nonzero(np.ones(peaks.shape, dtype=bool))
+    else:
+        day_pos, start_pos = np.nonzero(peaks <= max_busy)
+    peak = peaks[day_pos, start_pos]
+    mean = means[day_pos, start_pos]
+    # lexsort uses the last key as the primary one
+    order = np.lexsort((starts[start_pos], day_pos, mean, peak))
+
+    results = []
+    taken = {}
+    for i in order:
+        day = days[day_pos[i]]
+        start = int(starts[start_pos[i]])
+        if any(abs(start - other) < width for other in taken.get(day, ())):
+            continue
+        taken.setdefault(day, []).append(start)
+        results.append({
+            'day': day,
+            'start_minute': start * bucket_minutes,
+            'end_minute': start * bucket_minutes + duration_minutes,
+            'peak': int(peak[i]),
+            'mean': float(mean[i]),
+        })
+        if len(results) == limit:
+            break
+    return results
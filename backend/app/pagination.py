@@ -0,0 +1,34 @@
+"""Helpers shared by keyset-paginated endpoints.
+
+Cursors are opaque to clients: a urlsafe base64 encoding of the last row's
+(datetime, uid) sort key.
+"""
+import base64
+from datetime import datetime
+
+
+def encode_cursor(sort_datetime, uid):
+    """Encode a row's (datetime, uid) sort key as an opaque cursor."""
+    raw = f"{sort_datetime.isoformat()}|{uid}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor. Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        value, uid = raw.split('|', 1)
+        return datetime.fromisoformat(value), uid
+    except Exception:
+        raise ValueError('invalid cursor')
+
+
+def int_arg(args, name, default, minimum, maximum):
+    """Read an integer query param, clamped to maximum. Raises ValueError if invalid."""
+    try:
+        value = int(args.get(name, default))
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an integer')
+    if value < minimum:
+        raise ValueError(f'{name} must be at least {minimum}')
+    return min(value, maximum)
@@ -0,0 +1,61 @@
+"""Password hashing with a configurable algorithm and cost.
+
+The hasher lives in app.extensions['password_hasher']. PASSWORD_HASH_METHOD is
+any werkzeug method string, e.g. 'scrypt:32768:8:1' (the default) or
+'pbkdf2:sha256:600000'. Hashes made with other parameters still verify, and
+login rehashes them with the current ones.
+
+With PASSWORD_HASH_WORKERS > 0, hashing and verification run in a thread pool
+of that size. hashlib's scrypt and pbkdf2 release the GIL, so the pool caps
+how many CPU-bound hashes one worker process runs at once while its other
+request threads keep serving.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class PasswordHasher:
+    def __init__(self, method=DEFAULT_METHOD, workers=0):
+        self.method = method
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+        self._prefix = None
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        return self._pool.submit(fn, *args).result()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if pwhash was made with a different method or cost."""
+        if self._prefix is None:
+            # werkzeug fills in defaults (e.g. 'pbkdf2:sha256' gets its
+            # iteration count), so compare against the prefix it really writes
+            self._prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._prefix
+
+
+_default_hasher = PasswordHasher()
+
+
+def get_password_hasher():
+    """The app's hasher, or the default one outside an application context."""
+    if has_app_context():
+        return current_app.extensions['password_hasher']
+    return _default_hasher
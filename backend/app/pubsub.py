@@ -0,0 +1,185 @@
+"""Publish/subscribe used to push live updates (e.g. new comments) to
+Server-Sent Event streams.
+
+The broker lives in app.extensions['pubsub']. LocalBroker only fans out within
+one process, which is enough for the development server. With a Postgres
+database, PostgresBroker sends every message through NOTIFY so that streams
+open in any worker process receive it; each process LISTENs on one connection
+and hands messages to its own subscribers.
+
+Each open stream holds a request thread until the client goes away, so a
+broker accepts at most max_subscribers streams per process and subscribe()
+returns None beyond that.
+"""
+import json
+import logging
+import queue
+import select
+import threading
+import time
+import uuid
+
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBroker:
+    def __init__(self, max_queue_size=100, max_subscribers=8):
+        self.max_queue_size = max_queue_size
+        self.max_subscribers = max_subscribers
+        self._channels = {}
+        self._subscribers = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """Register a subscriber on channel and return its message queue, or
+        None if the process already has max_subscribers."""
+        q = queue.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            if self._subscribers >= self.max_subscribers:
+                return None
+            self._subscribers += 1
+            self._channels.setdefault(channel, set()).add(q)
+        return q
+
+    def unsubscribe(self, channel, q):
+        with self._lock:
+            subscribers = self._channels.get(channel)
+            if subscribers is None or q not in subscribers:
+                return
+            subscribers.discard(q)
+            self._subscribers -= 1
+            if not subscribers:
+                del self._channels[channel]
+
+    def publish(self, channel, message):
+        """Deliver message to every subscriber of channel without blocking.
+
+        Subscribers whose queue is full (stalled clients) miss the message.
+        """
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        """Hand message to this process's subscribers of channel."""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                pass
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._channels.get(channel, ()))
+
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more; json.dumps output is
+# ASCII, so longer messages are split into chunks of this many characters
+NOTIFY_CHUNK_SIZE = 7000
+NOTIFY_CHANNEL = 'live_updates'
+LISTEN_RECONNECT_SECONDS = 1
+
+
+def notify_payloads(channel, message):
+    """NOTIFY payloads carrying one message, as "<id>:<index>:<count>:<chunk>"."""
+    body = json.dumps([channel, message])
+    message_id = uuid.uuid4().hex
+    chunks = [body[i:i + NOTIFY_CHUNK_SIZE] for i in range(0, len(body), NOTIFY_CHUNK_SIZE)]
+    return [f'{message_id}:{i}:{len(chunks)}:{chunk}' for i, chunk in enumerate(chunks)]
+
+
+class PostgresBroker(LocalBroker):
+    """LocalBroker whose messages reach every process through LISTEN/NOTIFY.
+
+    A process starts listening when its first stream subscribes. Messages
+    published while the listening connection is down are lost.
+    """
+
+    def __init__(self, database_url, **kwargs):
+        super().__init__(**kwargs)
+        # libpq doesn't understand SQLAlchemy driver names like postgresql+psycopg2
+        self.dsn = make_url(database_url).set(drivername='postgresql').render_as_string(hide_password=False)
+        self._listener = None
+        # message id -> chunks received so far
+        self._partial = {}
+
+    def subscribe(self, channel):
+        q = super().subscribe(channel)
+        if q is not None:
+            self._ensure_listener()
+        return q
+
+    def publish(self, channel, message):
+        """NOTIFY every process, this one included. The notification is sent
+        on its own connection, so call this after the change has committed."""
+        from . import db
+        try:
+            with db.engine.begin() as conn:
+                for payload in notify_payloads(channel, message):
+                    conn.execute(text('SELECT pg_notify(:channel, :payload)'), {'channel': NOTIFY_CHANNEL, 'payload': payload})
+        except Exception:
+            # the change itself is saved; only its live update is lost
+            current_app.logger.warning('publishing to %s failed', channel, exc_info=True)
+
+    def receive(self, payload):
+        """Handle one NOTIFY payload, delivering the message once complete."""
+        message_id, index, count, chunk = payload.split(':', 3)
+        if count == '1':
+            body = chunk
+        else:
+            parts = self._partial.setdefault(message_id, {})
+            parts[int(index)] = chunk
+            if len(parts) < int(count):
+                return
+            del self._partial[message_id]
+            body = ''.join(parts[i] for i in range(int(count)))
+        channel, message = json.loads(body)
+        self.deliver(channel, message)
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='pubsub-listener', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        import psycopg2
+
+        while True:
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN {NOTIFY_CHANNEL}')
+                try:
+                    while True:
+                        select.select([conn], [], [], 60)
+                        conn.poll()
+                        while conn.notifies:
+                            payload = conn.notifies.pop(0).payload
+                            try:
+                                self.receive(payload)
+                            except ValueError:
+                                logger.warning('ignoring malformed pub/sub payload %.100r', payload)
+                finally:
+                    conn.close()
+            except Exception:
+                logger.warning('pub/sub listener lost its connection; reconnecting', exc_info=True)
+                # chunks of messages cut off by the disconnect will never complete
+                self._partial.clear()
+                time.sleep(LISTEN_RECONNECT_SECONDS)
+
+
+def create_broker(database_url, max_subscribers):
+    """PostgresBroker for Postgres databases, LocalBroker otherwise."""
+    if make_url(database_url).get_backend_name() == 'postgresql':
+        return PostgresBroker(database_url, max_subscribers=max_subscribers)
+    return LocalBroker(max_subscribers=max_subscribers)
+
+
+def get_broker():
+    return current_app.extensions['pubsub']
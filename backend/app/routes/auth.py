@@ -3,10 +3,15 @@ from flask import current_app
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from .. import db
 from ..models import User
+from ..authz import current_user, membership_claims
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
 
+def issue_token(user_uid):
+    return create_access_token(identity=user_uid, additional_claims=membership_claims(user_uid))
+
+
 @bp.route('/register', methods=['POST'])
 def register():
     data = request.get_json() or {}
@@ -24,7 +29,7 @@ def register():
     db.session.add(user)
     db.session.commit()
 
-    access_token = create_access_token(identity=user.uid)
+    access_token = issue_token(user.uid)
     return jsonify({'access_token': access_token, 'uid': user.uid}), 201
 
 
@@ -40,15 +45,29 @@ def login():
     if not user or not user.check_password(password):
         return jsonify({'msg': 'invalid credentials'}), 401
 
-    access_token = create_access_token(identity=user.uid)
+    # upgrade hashes made with older PASSWORD_HASH_METHOD settings
+    if user.password_needs_rehash():
+        user.set_password(password)
+        db.session.commit()
+
+    access_token = issue_token(user.uid)
     return jsonify({'access_token': access_token, 'uid': user.uid}), 200
 
 
+@bp.route('/token', methods=['POST'])
+@jwt_required()
+def refresh_token():
+    """Reissue the caller's access token, e.g. with current membership claims"""
+    uid = get_jwt_identity()
+    if not current_user(uid):
+        return jsonify({'msg': 'user not found'}), 404
+    return jsonify({'access_token': issue_token(uid), 'uid': uid}), 200
+
+
 @bp.route('/me', methods=['GET'])
 @jwt_required()
 def me():
-    uid = get_jwt_identity()
-    user = User.query.get(uid)
+    user = current_user(get_jwt_identity())
     if not user:
         return jsonify({'msg': 'user not found'}), 404
     return jsonify({'uid': user.uid, 'name': user.name, 'email': user.email}), 200
@@ -1,107 +1,232 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, current_app, jsonify, request
 from sqlalchemy import func
+import numpy as np
 from .. import db
+from ..cache import get_cache, data_version
 from ..models import TimeSlot, Course
+from ..occupancy import DAYS, find_free_windows, occupancy_grid, slot_arrays, valid_bucket
 
 bp = Blueprint('calendar', __name__, url_prefix='/calendar')
 
+DEFAULT_BUCKET_MINUTES = 30
+# resolution of the grid used by free-window search
+SEARCH_BUCKET_MINUTES = 5
+MAX_FREE_WINDOWS = 50
 
-@bp.route('/heatmap', methods=['GET'])
-def get_heatmap_data():
-	"""
-	Get calendar heatmap data showing student density by day/time
-	Returns aggregated data for visualization
-	"""
-	try:
-		# Aggregate students by day and time slot
-		heatmap_data = db.session.query(
+# bumped by the course scraper after it commits new time slots
+DATA_VERSION = 'calendar'
+
+
+def cached_json(key, build):
+	"""Serve build()'s JSON payload from the cache while the calendar data
+	version is unchanged, serializing it only once per version."""
+	cache = get_cache()
+	cache_key = f"calendar:v{data_version(DATA_VERSION)}:{key}"
+	body = cache.get(cache_key)
+	if body is None:
+		body = current_app.json.dumps(build())
+		cache.set(cache_key, body)
+	return Response(body, status=200, mimetype='application/json')
+
+
+def students_grid(bucket):
+	"""Students-busy occupancy grid for the current data version, built once
+	and then kept in the cache."""
+	cache = get_cache()
+	cache_key = f"calendar:v{data_version(DATA_VERSION)}:grid:{bucket}"
+	grid = cache.get(cache_key)
+	if grid is None:
+		rows = db.session.query(
 			TimeSlot.day_of_week,
 			TimeSlot.start_time,
 			TimeSlot.end_time,
-			func.sum(TimeSlot.students_count).label('total_students'),
-			func.count(TimeSlot.id).label('course_count')
-		).group_by(
-			TimeSlot.day_of_week,
-			TimeSlot.start_time,
-			TimeSlot.end_time
-		).order_by(
-			TimeSlot.start_time
+			TimeSlot.students_count
 		).all()
+		days, starts, ends, students = slot_arrays(rows)
+		grid = occupancy_grid(days, starts, ends, students, bucket)
+		cache.set(cache_key, grid)
+	return grid
+
+
+def format_minute(minute):
+	return f'{minute // 60 % 24:02d}:{minute % 60:02d}'
 
-		# Format data for frontend
-		result = []
-		for slot in heatmap_data:
-			result.append({
-				'day': slot.day_of_week,
-				'start_time': slot.start_time.strftime('%H:%M'),
-				'end_time': slot.end_time.strftime('%H:%M'),
-				'total_students': slot.total_students,
-				'course_count': slot.course_count,
-				'density': slot.total_students  # Used for heatmap intensity
-			})
 
-		return jsonify({
-			'success': True,
-			'data': result,
-			'total_slots': len(result)
-		}), 200
+def parse_days(value):
+	"""Parse a comma separated list of day names or prefixes (e.g. 'tue,wed')."""
+	if not value:
+		return list(range(len(DAYS)))
+	days = []
+	for part in value.split(','):
+		part = part.strip().lower()
+		matches = [i for i, day in enumerate(DAYS) if len(part) >= 2 and day.lower().startswith(part)]
+		if len(matches) != 1:
+			raise ValueError(f'unknown day: {part}')
+		if matches[0] not in days:
+			days.append(matches[0])
+	return days
 
+
+@bp.route('/heatmap', methods=['GET'])
+def get_heatmap_data():
+	"""
+	Get calendar heatmap data showing student density by day/time
+	Returns a 7 x (24*60/bucket) occupancy grid, where overlapping course
+	slots are summed, plus a flat list of the non-empty buckets.
+
+	Query params: bucket - bucket size in minutes, must divide 1440 (default 30)
+	"""
+	try:
+		bucket = int(request.args.get('bucket', DEFAULT_BUCKET_MINUTES))
+	except ValueError:
+		bucket = 0
+	if not valid_bucket(bucket):
+		return jsonify({'error': 'bucket must be a number of minutes that divides 1440'}), 400
+
+	try:
+		return cached_json(f'heatmap:{bucket}', lambda: build_heatmap(bucket))
 	except Exception as e:
 		return jsonify({'error': str(e)}), 500
 
 
+def build_heatmap(bucket):
+	rows = db.session.query(
+		TimeSlot.day_of_week,
+		TimeSlot.start_time,
+		TimeSlot.end_time,
+		TimeSlot.students_count
+	).all()
+	days, starts, ends, students = slot_arrays(rows)
+	students_grid = occupancy_grid(days, starts, ends, students, bucket)
+	courses_grid = occupancy_grid(days, starts, ends, np.ones_like(students), bucket)
+
+	# Format the non-empty buckets for frontend
+	result = []
+	for day_index, bucket_index in zip(*np.nonzero(courses_grid)):
+		start = int(bucket_index) * bucket
+		end = start + bucket
+		total_students = int(students_grid[day_index, bucket_index])
+		result.append({
+			'day': DAYS[day_index],
+			'start_time': format_minute(start),
+			'end_time': format_minute(end),
+			'total_students': total_students,
+			'course_count': int(courses_grid[day_index, bucket_index]),
+			'density': total_students  # Used for heatmap intensity
+		})
+
+	return {
+		'success': True,
+		'bucket_minutes': bucket,
+		'days': list(DAYS),
+		'grid': students_grid.tolist(),
+		'data': result,
+		'total_slots': len(result)
+	}
+
+
 @bp.route('/optimal-times', methods=['GET'])
 def get_optimal_times():
 	"""
 	Get optimal times for events (times with LEAST student activity)
 	"""
 	try:
-		# Get all possible days
-		days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-		
-		# Get busy times
-		busy_times = db.session.query(
-			TimeSlot.day_of_week,
-			TimeSlot.start_time,
-			TimeSlot.end_time,
-			func.sum(TimeSlot.students_count).label('total_students')
-		).group_by(
-			TimeSlot.day_of_week,
-			TimeSlot.start_time,
-			TimeSlot.end_time
-		).all()
+		return cached_json('optimal-times', build_optimal_times)
+	except Exception as e:
+		return jsonify({'error': str(e)}), 500
 
-		# Convert to dict for easy lookup
-		busy_dict = {}
-		for slot in busy_times:
-			key = f"{slot.day_of_week}_{slot.start_time.strftime('%H:%M')}"
-			busy_dict[key] = slot.total_students
-
-		# Find least busy times per day
-		optimal_times = []
-		for day in days:
-			day_slots = [s for s in busy_times if s.day_of_week == day]
-			if day_slots:
-				# Sort by student count (ascending)
-				sorted_slots = sorted(day_slots, key=lambda x: x.total_students)
-				best_slot = sorted_slots[0]
-				
-				optimal_times.append({
-					'day': day,
-					'start_time': best_slot.start_time.strftime('%H:%M'),
-					'end_time': best_slot.end_time.strftime('%H:%M'),
-					'student_count': best_slot.total_students,
-					'recommendation': 'Optimal time - lowest student activity'
-				})
-
-		return jsonify({
-			'success': True,
-			'optimal_times': optimal_times
-		}), 200
 
+def build_optimal_times():
+	# Get all possible days
+	days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+	
+	# Get busy times
+	busy_times = db.session.query(
+		TimeSlot.day_of_week,
+		TimeSlot.start_time,
+		TimeSlot.end_time,
+		func.sum(TimeSlot.students_count).label('total_students')
+	).group_by(
+		TimeSlot.day_of_week,
+		TimeSlot.start_time,
+		TimeSlot.end_time
+	).all()
+
+	# Convert to dict for easy lookup
+	busy_dict = {}
+	for slot in busy_times:
+		key = f"{slot.day_of_week}_{slot.start_time.strftime('%H:%M')}"
+		busy_dict[key] = slot.total_students
+
+	# Find least busy times per day
+	optimal_times = []
+	for day in days:
+		day_slots = [s for s in busy_times if s.day_of_week == day]
+		if day_slots:
+			# Sort by student count (ascending)
+			sorted_slots = sorted(day_slots, key=lambda x: x.total_students)
+			best_slot = sorted_slots[0]
+			
+			optimal_times.append({
+				'day': day,
+				'start_time': best_slot.start_time.strftime('%H:%M'),
+				'end_time': best_slot.end_time.strftime('%H:%M'),
+				'student_count': best_slot.total_students,
+				'recommendation': 'Optimal time - lowest student activity'
+			})
+
+	return {
+		'success': True,
+		'optimal_times': optimal_times
+	}
+
+
+@bp.route('/free-windows', methods=['GET'])
+def get_free_windows():
+	"""
+	Search for the quietest windows to hold an event.
+
+	Query params (all optional):
+	  duration    window length in minutes (default 60)
+	  days        comma separated days, names or prefixes (default all week)
+	  start_hour  earliest start hour (default 8)
+	  end_hour    latest end hour (default 22)
+	  max_busy    drop windows where more students than this are in class
+	  limit       number of windows to return (default 5, max 50)
+	Windows are ranked by peak then mean number of students in class.
+	"""
+	args = request.args
+	try:
+		duration = int(args.get('duration', 60))
+		start_hour = int(args.get('start_hour', 8))
+		end_hour = int(args.get('end_hour', 22))
+		limit = min(int(args.get('limit', 5)), MAX_FREE_WINDOWS)
+		max_busy = int(args['max_busy']) if args.get('max_busy') else None
+		days = parse_days(args.get('days'))
+	except ValueError as e:
+		return jsonify({'error': str(e)}), 400
+	if duration < 1 or limit < 1 or not 0 <= start_hour < end_hour <= 24:
+		return jsonify({'error': 'duration and limit must be positive and 0 <= start_hour < end_hour <= 24'}), 400
+
+	try:
+		windows = find_free_windows(
+			students_grid(SEARCH_BUCKET_MINUTES), SEARCH_BUCKET_MINUTES, duration, days,
+			start_hour * 60, end_hour * 60, max_busy=max_busy, limit=limit
+		)
 	except Exception as e:
 		return jsonify({'error': str(e)}), 500
 
+	return jsonify({
+		'success': True,
+		'windows': [{
+			'day': DAYS[w['day']],
+			'start_time': format_minute(w['start_minute']),
+			'end_time': format_minute(w['end_minute']),
+			'peak_students': w['peak'],
+			'average_students': round(w['mean'], 1)
+		} for w in windows]
+	}), 200
+
 
 @bp.route('/stats', methods=['GET'])
 def get_stats():
@@ -109,32 +234,35 @@ def get_stats():
 	Get overall statistics about scraped course data
 	"""
 	try:
-		total_courses = Course.query.count()
-		total_slots = TimeSlot.query.count()
-		total_students = db.session.query(func.sum(TimeSlot.students_count)).scalar() or 0
-		
-		# Get busiest day
-		busiest_day = db.session.query(
-			TimeSlot.day_of_week,
-			func.sum(TimeSlot.students_count).label('total')
-		).group_by(TimeSlot.day_of_week).order_by(func.sum(TimeSlot.students_count).desc()).first()
-
-		# Get busiest time
-		busiest_time = db.session.query(
-			TimeSlot.start_time,
-			func.sum(TimeSlot.students_count).label('total')
-		).group_by(TimeSlot.start_time).order_by(func.sum(TimeSlot.students_count).desc()).first()
-
-		return jsonify({
-			'success': True,
-			'stats': {
-				'total_courses': total_courses,
-				'total_time_slots': total_slots,
-				'total_students_tracked': total_students,
-				'busiest_day': busiest_day.day_of_week if busiest_day else None,
-				'busiest_time': busiest_time.start_time.strftime('%H:%M') if busiest_time else None
-			}
-		}), 200
-
+		return cached_json('stats', build_stats)
 	except Exception as e:
 		return jsonify({'error': str(e)}), 500
+
+
+def build_stats():
+	total_courses = Course.query.count()
+	total_slots = TimeSlot.query.count()
+	total_students = db.session.query(func.sum(TimeSlot.students_count)).scalar() or 0
+	
+	# Get busiest day
+	busiest_day = db.session.query(
+		TimeSlot.day_of_week,
+		func.sum(TimeSlot.students_count).label('total')
+	).group_by(TimeSlot.day_of_week).order_by(func.sum(TimeSlot.students_count).desc()).first()
+
+	# Get busiest time
+	busiest_time = db.session.query(
+		TimeSlot.start_time,
+		func.sum(TimeSlot.students_count).label('total')
+	).group_by(TimeSlot.start_time).order_by(func.sum(TimeSlot.students_count).desc()).first()
+
+	return {
+		'success': True,
+		'stats': {
+			'total_courses': total_courses,
+			'total_time_slots': total_slots,
+			'total_students_tracked': total_students,
+			'busiest_day': busiest_day.day_of_week if busiest_day else None,
+			'busiest_time': busiest_time.start_time.strftime('%H:%M') if busiest_time else None
+		}
+	}
@@ -1,23 +1,31 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from .. import db
-from ..models import Club, ClubMember, User, Event, EventParticipant
+from ..models import Club, ClubMember, User, Event, EventParticipant, ClubDailyMetric
+from ..authz import bump_membership_version, invalidate_memberships, is_club_exec, memberships
+from ..metrics import record_club_activity, record_membership_removed
+from ..storage import media_variant_url
 from datetime import datetime
 
 bp = Blueprint('clubs', __name__, url_prefix='/clubs')
 
 
-def is_club_exec(user_uid, club_uid):
-    return ClubMember.query.filter_by(user_uid=user_uid, club_uid=club_uid, type='exec').first() is not None
-
-
 @bp.route('/', methods=['GET'])
 def list_clubs():
     """Get all clubs"""
-    clubs = Club.query.all()
+    # member counts are aggregated in the same statement so the number of
+    # queries stays constant regardless of how many clubs exist
+    rows = db.session.query(
+        Club,
+        db.func.count(ClubMember.id).label('member_count')
+    ).outerjoin(
+        ClubMember, ClubMember.club_uid == Club.uid
+    ).group_by(
+        Club.uid
+    ).all()
+
     result = []
-    for club in clubs:
-        member_count = ClubMember.query.filter_by(club_uid=club.uid).count()
+    for club, member_count in rows:
         result.append({
             'uid': club.uid,
             'name': club.name,
@@ -26,7 +34,7 @@ def list_clubs():
             'social_links': club.social_links,
             'status': club.status,
             'member_count': member_count,
-            'icon_url': club.icon_url,
+            'icon_url': media_variant_url(club.icon_url, 'thumb'),
         })
     return jsonify(result), 200
 
@@ -51,7 +59,10 @@ def create_club():
     uid = get_jwt_identity()
     member = ClubMember(user_uid=uid, club_uid=club.uid, type='exec', role='founder', joined_at=datetime.utcnow())
     db.session.add(member)
+    record_club_activity(club.uid, joins=1)
+    bump_membership_version(uid)
     db.session.commit()
+    invalidate_memberships(uid)
 
     return jsonify({'uid': club.uid, 'name': club.name}), 201
 
@@ -93,14 +104,16 @@ def join_club(club_uid):
     if not club:
         return jsonify({'msg': 'club not found'}), 404
 
-    # don't duplicate membership
-    existing = ClubMember.query.filter_by(user_uid=uid, club_uid=club_uid).first()
-    if existing:
+    # don't duplicate membership; checked in the database, as a cached
+    # "not a member" may be stale
+    if ClubMember.query.filter_by(user_uid=uid, club_uid=club_uid).first():
         return jsonify({'msg': 'already a member'}), 400
 
     member = ClubMember(user_uid=uid, club_uid=club_uid, type='member')
     db.session.add(member)
+    record_club_activity(club_uid, joins=1)
     db.session.commit()
+    invalidate_memberships(uid)
     return jsonify({'msg': 'joined'}), 201
 
 
@@ -112,7 +125,7 @@ def leave_club(club_uid):
     if not club:
         return jsonify({'msg': 'club not found'}), 404
 
-    # find membership
+    # find membership; read from the database, the rollup needs its join day
     membership = ClubMember.query.filter_by(user_uid=uid, club_uid=club_uid).first()
     if not membership:
         return jsonify({'msg': 'not a member'}), 400
@@ -121,8 +134,10 @@ def leave_club(club_uid):
     if membership.type == 'exec':
         return jsonify({'msg': 'executives cannot leave. please transfer ownership first'}), 403
 
+    record_membership_removed(membership)
     db.session.delete(membership)
     db.session.commit()
+    invalidate_memberships(uid)
     return jsonify({'msg': 'left club'}), 200
 
 
@@ -144,23 +159,29 @@ def club_stats(club_uid):
         return jsonify({'msg': 'club not found'}), 404
 
     # Total members and execs
-    total_members = ClubMember.query.filter_by(club_uid=club_uid).count()
-    exec_count = ClubMember.query.filter_by(club_uid=club_uid, type='exec').count()
+    total_members, exec_count = db.session.query(
+        db.func.count(ClubMember.id),
+        db.func.coalesce(db.func.sum(db.case((ClubMember.type == 'exec', 1), else_=0)), 0)
+    ).filter(ClubMember.club_uid == club_uid).one()
 
-    # Members joined per day for the last 30 days
+    # Members joined per day for the last 30 days, read from the daily rollup;
+    # days without activity have no row and are filled in below.
     from datetime import datetime, timedelta
 
     today = datetime.utcnow().date()
-    days = []
+    window_start = today - timedelta(days=29)
+    joins_by_day = dict(db.session.query(
+        ClubDailyMetric.day,
+        ClubDailyMetric.joins
+    ).filter(
+        ClubDailyMetric.club_uid == club_uid,
+        ClubDailyMetric.day >= window_start
+    ).all())
+
     members_by_day = []
-    for i in range(29, -1, -1):
-        d = today - timedelta(days=i)
-        days.append(d.isoformat())
-        count = ClubMember.query.filter(
-            ClubMember.club_uid == club_uid,
-            db.func.date(ClubMember.joined_at) == d
-        ).count()
-        members_by_day.append({'date': d.isoformat(), 'count': count})
+    for i in range(30):
+        d = window_start + timedelta(days=i)
+        members_by_day.append({'date': d.isoformat(), 'count': joins_by_day.get(d, 0)})
 
     # Recent events and attendance
     events = Event.query.filter_by(club_uid=club_uid).order_by(Event.start_datetime.desc()).limit(10).all()
@@ -169,8 +190,17 @@ def club_stats(club_uid):
     event_type_counts = {}
     upcoming_events_count = Event.query.filter(Event.club_uid == club_uid, Event.start_datetime >= datetime.utcnow()).count()
 
+    participant_counts = {}
+    if events:
+        participant_counts = dict(db.session.query(
+            EventParticipant.event_uid,
+            db.func.count(EventParticipant.id)
+        ).filter(
+            EventParticipant.event_uid.in_([e.uid for e in events])
+        ).group_by(EventParticipant.event_uid).all())
+
     for e in events:
-        participant_count = EventParticipant.query.filter_by(event_uid=e.uid).count()
+        participant_count = participant_counts.get(e.uid, 0)
         recent_events.append({
             'uid': e.uid,
             'name': e.name,
@@ -200,18 +230,17 @@ def club_stats(club_uid):
 def get_my_clubs():
     """Get all clubs where the current user is an executive"""
     uid = get_jwt_identity()
-    memberships = ClubMember.query.filter_by(user_uid=uid, type='exec').all()
+    exec_roles = {club_uid: m['role'] for club_uid, m in memberships(uid).items() if m['type'] == 'exec'}
     
     clubs = []
-    for membership in memberships:
-        club = Club.query.get(membership.club_uid)
-        if club:
+    if exec_roles:
+        for club in Club.query.filter(Club.uid.in_(exec_roles)):
             clubs.append({
                 'uid': club.uid,
                 'name': club.name,
-                'role': membership.role,
+                'role': exec_roles[club.uid],
                 'budget': str(club.budget),
-                'icon_url': club.icon_url,
+                'icon_url': media_variant_url(club.icon_url, 'thumb'),
             })
     
     return jsonify(clubs), 200
@@ -251,13 +280,18 @@ def add_exec(club_uid):
         # Promote member to exec
         existing.type = 'exec'
         existing.role = role
+        bump_membership_version(user.uid)
         db.session.commit()
+        invalidate_memberships(user.uid)
         return jsonify({'msg': 'member promoted to executive', 'user_uid': user.uid, 'user_name': user.name, 'role': role}), 200
     
     # Add as new exec
     member = ClubMember(user_uid=user.uid, club_uid=club_uid, type='exec', role=role, joined_at=datetime.utcnow())
     db.session.add(member)
+    record_club_activity(club_uid, joins=1)
+    bump_membership_version(user.uid)
     db.session.commit()
+    invalidate_memberships(user.uid)
     
     return jsonify({'msg': 'executive added', 'user_uid': user.uid, 'user_name': user.name, 'role': role}), 201
 
@@ -288,6 +322,8 @@ def remove_exec(club_uid, user_uid):
     # Demote to regular member
     membership.type = 'member'
     membership.role = None
+    bump_membership_version(user_uid)
     db.session.commit()
+    invalidate_memberships(user_uid)
     
     return jsonify({'msg': 'executive removed'}), 200
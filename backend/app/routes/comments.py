@@ -1,38 +1,255 @@
-from flask import Blueprint, request, jsonify
+from datetime import datetime
+import json
+import queue
+from flask import Blueprint, Response, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from .. import db
 from ..models import Comment, Event, User
+from ..authz import current_user
+from ..pagination import encode_cursor, decode_cursor, int_arg
+from ..pubsub import get_broker
 
 bp = Blueprint('comments', __name__, url_prefix='/comments')
 
 
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+# how many levels of replies are inlined below a page of comments, and how many
+# replies are inlined per comment; the rest are fetched from /<uid>/replies
+DEFAULT_REPLY_DEPTH = 3
+MAX_REPLY_DEPTH = 10
+DEFAULT_REPLIES_PER_COMMENT = 5
+MAX_REPLIES_PER_COMMENT = 50
+
+
+def serialize_comment(comment, user_name):
+	return {
+		'uid': comment.uid,
+		'content': comment.content,
+		'created_at': comment.created_at.isoformat(),
+		'user_name': user_name or 'Unknown',
+		'user_uid': comment.user_uid,
+		'replies': [],
+		'reply_count': 0,
+		'replies_cursor': None
+	}
+
+
+def comments_channel(event_uid):
+	return f'comments:{event_uid}'
+
+
+def publish_comment(comment, payload):
+	"""Push a newly committed comment to live subscribers of its event."""
+	get_broker().publish(comments_channel(comment.event_uid), dict(payload, parent_uid=comment.parent_uid))
+
+
+def thread_args(args):
+	"""Parse limit/depth/replies query params. Raises ValueError if invalid."""
+	return (
+		int_arg(args, 'limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE),
+		int_arg(args, 'depth', DEFAULT_REPLY_DEPTH, 0, MAX_REPLY_DEPTH),
+		int_arg(args, 'replies', DEFAULT_REPLIES_PER_COMMENT, 0, MAX_REPLIES_PER_COMMENT),
+	)
+
+
+def expand_replies(event_uid, nodes, depth, replies_per_comment):
+	"""Inline up to `depth` levels of replies below the serialized `nodes`.
+
+	Each level costs one query regardless of thread size. Every node gets its
+	total `reply_count`; nodes whose replies were cut off also get a
+	`replies_cursor` for GET /comments/<uid>/replies.
+	"""
+	frontier = {node['uid']: node for node in nodes}
+	for level in range(depth + 1):
+		if not frontier:
+			break
+		cap = replies_per_comment if level < depth else 0
+		# rank each parent's replies oldest first, and count them, in one pass
+		ranked = db.session.query(
+			Comment.uid.label('uid'),
+			db.func.row_number().over(
+				partition_by=Comment.parent_uid,
+				order_by=(Comment.created_at.asc(), Comment.uid.asc())
+			).label('position'),
+			db.func.count(Comment.uid).over(partition_by=Comment.parent_uid).label('total')
+		).filter(
+			Comment.event_uid == event_uid,
+			Comment.parent_uid.in_(list(frontier))
+		).subquery()
+		rows = db.session.query(Comment, User.name, ranked.c.position, ranked.c.total).join(
+			ranked, ranked.c.uid == Comment.uid
+		).outerjoin(
+			User, User.uid == Comment.user_uid
+		).filter(
+			# keep one row past the cap so reply_count is known even when nothing is inlined
+			ranked.c.position <= max(cap, 1)
+		).order_by(Comment.created_at.asc(), Comment.uid.asc()).all()
+
+		next_frontier = {}
+		last_inlined = {}
+		for comment, user_name, position, total in rows:
+			parent = frontier[comment.parent_uid]
+			parent['reply_count'] = total
+			if position <= cap:
+				child = serialize_comment(comment, user_name)
+				parent['replies'].append(child)
+				next_frontier[comment.uid] = child
+				last_inlined[comment.parent_uid] = comment
+
+		for uid, node in frontier.items():
+			if node['reply_count'] > len(node['replies']):
+				last = last_inlined.get(uid)
+				if last:
+					node['replies_cursor'] = encode_cursor(last.created_at, last.uid)
+				else:
+					# nothing inlined: the cursor sorts before every reply
+					node['replies_cursor'] = encode_cursor(datetime.min, '')
+		frontier = next_frontier
+
+
 @bp.route('/event/<event_uid>', methods=['GET'])
 def get_event_comments(event_uid):
-	"""Get all comments for an event (hierarchical structure)"""
+	"""Get a page of top-level comments for an event, newest first, with replies
+	inlined up to a limited depth.
+
+	Query params (all optional):
+	  limit    top-level comments per page (default 20, max 50)
+	  cursor   next_cursor value from the previous page
+	  depth    levels of replies to inline (default 3, max 10)
+	  replies  replies inlined per comment (default 5, max 50)
+	Returns JSON: { comments: [...], next_cursor: <str or null> }
+	"""
+	event = Event.query.get(event_uid)
+	if not event:
+		return jsonify({'msg': 'event not found'}), 404
+	
+	try:
+		limit, depth, replies_per_comment = thread_args(request.args)
+	except ValueError as e:
+		return jsonify({'msg': str(e)}), 400
+	
+	query = db.session.query(Comment, User.name).outerjoin(
+		User, User.uid == Comment.user_uid
+	).filter(
+		Comment.event_uid == event_uid,
+		Comment.parent_uid.is_(None)
+	)
+	
+	if request.args.get('cursor'):
+		try:
+			cursor_created, cursor_uid = decode_cursor(request.args.get('cursor'))
+		except ValueError:
+			return jsonify({'msg': 'invalid cursor'}), 400
+		query = query.filter(db.or_(
+			Comment.created_at < cursor_created,
+			db.and_(Comment.created_at == cursor_created, Comment.uid < cursor_uid)
+		))
+	
+	# fetch one extra row to know whether another page exists
+	rows = query.order_by(Comment.created_at.desc(), Comment.uid.desc()).limit(limit + 1).all()
+	has_more = len(rows) > limit
+	rows = rows[:limit]
+	
+	comments = [serialize_comment(comment, user_name) for comment, user_name in rows]
+	expand_replies(event_uid, comments, depth, replies_per_comment)
+	
+	next_cursor = None
+	if has_more:
+		last = rows[-1][0]
+		next_cursor = encode_cursor(last.created_at, last.uid)
+	return jsonify({'comments': comments, 'next_cursor': next_cursor}), 200
+
+
+@bp.route('/<comment_uid>/replies', methods=['GET'])
+def get_comment_replies(comment_uid):
+	"""Expand one subtree: a page of direct replies to a comment, oldest first,
+	each with its own replies inlined up to a limited depth.
+
+	Takes the same query params as get_event_comments; pass a node's
+	replies_cursor as `cursor` to continue after the replies already shown.
+	Returns JSON: { replies: [...], next_cursor: <str or null> }
+	"""
+	parent = Comment.query.get(comment_uid)
+	if not parent:
+		return jsonify({'msg': 'comment not found'}), 404
+	
+	try:
+		limit, depth, replies_per_comment = thread_args(request.args)
+	except ValueError as e:
+		return jsonify({'msg': str(e)}), 400
+	
+	query = db.session.query(Comment, User.name).outerjoin(
+		User, User.uid == Comment.user_uid
+	).filter(
+		Comment.event_uid == parent.event_uid,
+		Comment.parent_uid == comment_uid
+	)
+	
+	if request.args.get('cursor'):
+		try:
+			cursor_created, cursor_uid = decode_cursor(request.args.get('cursor'))
+		except ValueError:
+			return jsonify({'msg': 'invalid cursor'}), 400
+		query = query.filter(db.or_(
+			Comment.created_at > cursor_created,
+			db.and_(Comment.created_at == cursor_created, Comment.uid > cursor_uid)
+		))
+	
+	rows = query.order_by(Comment.created_at.asc(), Comment.uid.asc()).limit(limit + 1).all()
+	has_more = len(rows) > limit
+	rows = rows[:limit]
+	
+	replies = [serialize_comment(comment, user_name) for comment, user_name in rows]
+	expand_replies(parent.event_uid, replies, depth, replies_per_comment)
+	
+	next_cursor = None
+	if has_more:
+		last = rows[-1][0]
+		next_cursor = encode_cursor(last.created_at, last.uid)
+	return jsonify({'replies': replies, 'next_cursor': next_cursor}), 200
+
+
+@bp.route('/event/<event_uid>/stream', methods=['GET'])
+def stream_event_comments(event_uid):
+	"""Server-Sent Events stream of comments and replies posted to an event.
+
+	Each message is a `comment` event whose data is the serialized comment plus
+	its parent_uid (null for top-level comments). Comment lines are sent as
+	keepalives while the thread is quiet. Returns 503 when this process already
+	serves SSE_MAX_STREAMS streams.
+	"""
 	event = Event.query.get(event_uid)
 	if not event:
 		return jsonify({'msg': 'event not found'}), 404
 	
-	# Get all top-level comments (no parent)
-	top_comments = Comment.query.filter_by(event_uid=event_uid, parent_uid=None).order_by(Comment.created_at.desc()).all()
+	broker = get_broker()
+	channel = comments_channel(event_uid)
+	# subscribe before the response starts so nothing posted in between is lost
+	messages = broker.subscribe(channel)
+	if messages is None:
+		response = jsonify({'msg': 'too many live streams, try again later'})
+		response.headers['Retry-After'] = '30'
+		return response, 503
+	keepalive = current_app.config['SSE_KEEPALIVE_SECONDS']
 	
-	def build_comment_tree(comment):
-		user = User.query.get(comment.user_uid)
-		replies_data = []
-		for reply in comment.replies:
-			replies_data.append(build_comment_tree(reply))
-		
-		return {
-			'uid': comment.uid,
-			'content': comment.content,
-			'created_at': comment.created_at.isoformat(),
-			'user_name': user.name if user else 'Unknown',
-			'user_uid': comment.user_uid,
-			'replies': replies_data
-		}
+	def stream():
+		yield ': connected\n\n'
+		while True:
+			try:
+				message = messages.get(timeout=keepalive)
+			except queue.Empty:
+				yield ': keepalive\n\n'
+				continue
+			yield f"event: comment\nid: {message['uid']}\ndata: {json.dumps(message)}\n\n"
 	
-	result = [build_comment_tree(comment) for comment in top_comments]
-	return jsonify(result), 200
+	response = Response(stream(), mimetype='text/event-stream', headers={
+		'Cache-Control': 'no-cache',
+		# stop reverse proxies from buffering the stream
+		'X-Accel-Buffering': 'no'
+	})
+	response.call_on_close(lambda: broker.unsubscribe(channel, messages))
+	return response
 
 
 @bp.route('/', methods=['POST'])
@@ -59,15 +276,10 @@ def create_comment():
 	db.session.add(comment)
 	db.session.commit()
 	
-	user = User.query.get(uid)
-	return jsonify({
-		'uid': comment.uid,
-		'content': comment.content,
-		'created_at': comment.created_at.isoformat(),
-		'user_name': user.name if user else 'Unknown',
-		'user_uid': uid,
-		'replies': []
-	}), 201
+	user = current_user(uid)
+	payload = serialize_comment(comment, user.name if user else None)
+	publish_comment(comment, payload)
+	return jsonify(payload), 201
 
 
 @bp.route('/<comment_uid>/reply', methods=['POST'])
@@ -97,12 +309,7 @@ def reply_to_comment(comment_uid):
 	db.session.add(reply)
 	db.session.commit()
 	
-	user = User.query.get(uid)
-	return jsonify({
-		'uid': reply.uid,
-		'content': reply.content,
-		'created_at': reply.created_at.isoformat(),
-		'user_name': user.name if user else 'Unknown',
-		'user_uid': uid,
-		'replies': []
-	}), 201
+	user = current_user(uid)
+	payload = serialize_comment(reply, user.name if user else None)
+	publish_comment(reply, payload)
+	return jsonify(payload), 201
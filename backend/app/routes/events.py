@@ -2,27 +2,115 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from .. import db
 from ..models import Event, EventParticipant, ClubMember, Club
-from datetime import datetime
+from ..authz import is_club_exec, is_club_member
+from ..metrics import record_club_activity, record_event_removed
+from ..pagination import encode_cursor, decode_cursor, int_arg
+from ..schedule_index import event_end, get_event_index, record_event_change
+from ..storage import media_variant_url
+from .calendar import SEARCH_BUCKET_MINUTES, students_grid
+from datetime import datetime, timedelta, timezone
 
 bp = Blueprint('events', __name__, url_prefix='/events')
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
 
-def is_club_exec(user_uid, club_uid):
-    return ClubMember.query.filter_by(user_uid=user_uid, club_uid=club_uid, type='exec').first() is not None
+# conflict score = peak students in class
+#   + MEMBER_CONFLICT_WEIGHT per club member registered for an overlapping event
+#   + CLUB_CONFLICT_WEIGHT per overlapping event of the same club
+MEMBER_CONFLICT_WEIGHT = 10
+CLUB_CONFLICT_WEIGHT = 100
+
+
+def parse_utc_datetime(value):
+    """datetime.fromisoformat, with aware times ("...Z", "+02:00") converted to
+    the naive UTC the database stores. Raises ValueError like fromisoformat."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def participant_counts_subquery():
+    """Subquery of (event_uid, participant_count) for joining onto events."""
+    return db.session.query(
+        EventParticipant.event_uid,
+        db.func.count(EventParticipant.id).label('participant_count')
+    ).group_by(EventParticipant.event_uid).subquery()
 
 
 @bp.route('/', methods=['GET'])
 def get_all_events():
-    events = Event.query.order_by(Event.start_datetime.desc()).all()
+    """Get a page of events, newest first.
+
+    Query params (all optional):
+      limit      page size (default 50, max 100)
+      cursor     next_cursor value from the previous page
+      club_uid   only events for this club
+      type       only events of this type ('in-person' or 'online')
+      status     'upcoming' or 'completed'
+      from, to   ISO datetimes bounding start_datetime (inclusive)
+    Returns JSON: { events: [...], next_cursor: <str or null> }
+    """
+    args = request.args
+    try:
+        limit = int_arg(args, 'limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'msg': str(e)}), 400
+
+    now = datetime.utcnow()
+    counts = participant_counts_subquery()
+    # load club names and participant counts alongside the events in one statement
+    query = db.session.query(
+        Event,
+        Club.name,
+        db.func.coalesce(counts.c.participant_count, 0)
+    ).outerjoin(
+        Club, Club.uid == Event.club_uid
+    ).outerjoin(
+        counts, counts.c.event_uid == Event.uid
+    )
+
+    if args.get('club_uid'):
+        query = query.filter(Event.club_uid == args.get('club_uid'))
+    if args.get('type'):
+        query = query.filter(Event.type == args.get('type'))
+
+    status = args.get('status')
+    if status == 'upcoming':
+        query = query.filter(db.or_(Event.end_datetime.is_(None), Event.end_datetime >= now))
+    elif status == 'completed':
+        query = query.filter(Event.end_datetime < now)
+    elif status:
+        return jsonify({'msg': "status must be 'upcoming' or 'completed'"}), 400
+
+    try:
+        if args.get('from'):
+            query = query.filter(Event.start_datetime >= parse_utc_datetime(args.get('from')))
+        if args.get('to'):
+            query = query.filter(Event.start_datetime <= parse_utc_datetime(args.get('to')))
+    except ValueError:
+        return jsonify({'msg': 'invalid datetime format, use ISO format'}), 400
+
+    if args.get('cursor'):
+        try:
+            cursor_start, cursor_uid = decode_cursor(args.get('cursor'))
+        except ValueError:
+            return jsonify({'msg': 'invalid cursor'}), 400
+        # keyset condition: (start_datetime, uid) < cursor in descending order
+        query = query.filter(db.or_(
+            Event.start_datetime < cursor_start,
+            db.and_(Event.start_datetime == cursor_start, Event.uid < cursor_uid)
+        ))
+
+    # fetch one extra row to know whether another page exists
+    rows = query.order_by(Event.start_datetime.desc(), Event.uid.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
     result = []
-    for event in events:
-        participant_count = EventParticipant.query.filter_by(event_uid=event.uid).count()
-        club_name = None
-        if event.club_uid:
-            club = Club.query.get(event.club_uid)
-            club_name = club.name if club else None
+    for event, club_name, participant_count in rows:
         # Compute simple status: 'completed' if event ended in the past, otherwise 'upcoming'
-        now = datetime.utcnow()
         if event.end_datetime and event.end_datetime < now:
             computed_status = 'completed'
         else:
@@ -41,9 +129,14 @@ def get_all_events():
             'club_uid': event.club_uid,
             'club_name': club_name,
             'participant_count': participant_count,
-            'banner_url': event.banner_url
+            'banner_url': media_variant_url(event.banner_url, 'card')
         })
-    return jsonify(result), 200
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.start_datetime, last.uid)
+    return jsonify({'events': result, 'next_cursor': next_cursor}), 200
 
 
 @bp.route('/', methods=['POST'])
@@ -71,17 +164,101 @@ def create_event():
             return jsonify({'msg': 'only club execs can create events for this club'}), 403
 
     try:
-        start_dt = datetime.fromisoformat(start)
-        end_dt = datetime.fromisoformat(end) if end else None
+        start_dt = parse_utc_datetime(start)
+        end_dt = parse_utc_datetime(end) if end else None
     except Exception:
         return jsonify({'msg': 'invalid datetime format, use ISO format'}), 400
 
     event = Event(name=name, start_datetime=start_dt, end_datetime=end_dt, description=data.get('description'), location=data.get('location'), limit=data.get('limit'), type=event_type, status=status, club_uid=club_uid, banner_url=banner_url)
     db.session.add(event)
+    record_club_activity(club_uid, events_created=1)
+    record_event_change(event)
     db.session.commit()
     return jsonify({'uid': event.uid, 'name': event.name}), 201
 
 
+@bp.route('/conflicts', methods=['GET'])
+@jwt_required()
+def check_conflicts():
+    """Score a proposed event time against course load and overlapping events.
+
+    Query params:
+      start, end   ISO datetimes of the proposed event (end defaults to start + 1h)
+      club_uid     optional; the club the event is for (caller must be an exec)
+      exclude      optional; uid of the event being edited, ignored as a conflict
+    Lower scores are better.
+    """
+    uid = get_jwt_identity()
+    args = request.args
+    club_uid = args.get('club_uid')
+    if not args.get('start'):
+        return jsonify({'msg': 'start is required'}), 400
+    try:
+        start = parse_utc_datetime(args.get('start'))
+        end = parse_utc_datetime(args.get('end')) if args.get('end') else None
+    except ValueError:
+        return jsonify({'msg': 'invalid datetime format, use ISO format'}), 400
+    end = event_end(start, end)
+    if club_uid and not is_club_exec(uid, club_uid):
+        return jsonify({'msg': 'only club execs can check conflicts for this club'}), 403
+
+    # course load on the proposed weekday, clamped to that day
+    day_start = datetime.combine(start.date(), datetime.min.time())
+    minutes_from = (start - day_start) // timedelta(minutes=1)
+    minutes_to = (min(end, day_start + timedelta(days=1)) - day_start) // timedelta(minutes=1)
+    first = minutes_from // SEARCH_BUCKET_MINUTES
+    last = max(-(-minutes_to // SEARCH_BUCKET_MINUTES), first + 1)
+    window = students_grid(SEARCH_BUCKET_MINUTES)[start.weekday(), first:last]
+    peak_students = int(window.max())
+
+    overlapping = [e for e in get_event_index().overlapping(start, end) if e[0] != args.get('exclude')]
+    names = {}
+    if overlapping:
+        names = dict(db.session.query(Event.uid, Event.name).filter(Event.uid.in_([e[0] for e in overlapping])))
+
+    # overlapping events (from any club) that this club's members registered for
+    members_registered = {}
+    if club_uid and overlapping:
+        members_registered = dict(db.session.query(
+            EventParticipant.event_uid,
+            db.func.count(db.distinct(EventParticipant.user_uid))
+        ).join(
+            ClubMember, ClubMember.user_uid == EventParticipant.user_uid
+        ).filter(
+            ClubMember.club_uid == club_uid,
+            EventParticipant.event_uid.in_([e[0] for e in overlapping])
+        ).group_by(EventParticipant.event_uid).all())
+
+    club_conflicts = []
+    member_conflicts = []
+    for event_uid, event_start, event_stop, event_club_uid in overlapping:
+        item = {
+            'uid': event_uid,
+            'name': names.get(event_uid),
+            'start_datetime': event_start.isoformat(),
+            'end_datetime': event_stop.isoformat()
+        }
+        if club_uid and event_club_uid == club_uid:
+            club_conflicts.append(item)
+        elif members_registered.get(event_uid):
+            member_conflicts.append(dict(item, members_registered=members_registered[event_uid]))
+
+    members_affected = sum(c['members_registered'] for c in member_conflicts)
+    score = peak_students + MEMBER_CONFLICT_WEIGHT * members_affected + CLUB_CONFLICT_WEIGHT * len(club_conflicts)
+    return jsonify({
+        'start_datetime': start.isoformat(),
+        'end_datetime': end.isoformat(),
+        'score': score,
+        'course_load': {
+            'peak_students': peak_students,
+            'average_students': round(float(window.mean()), 1)
+        },
+        'club_conflicts': club_conflicts,
+        'member_conflicts': member_conflicts,
+        'overlapping_events': len(overlapping)
+    }), 200
+
+
 @bp.route('/<event_uid>', methods=['GET'])
 def get_event(event_uid):
     from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
@@ -95,7 +272,7 @@ def get_event(event_uid):
         c = Club.query.get(event.club_uid)
         if c:
             club_name = c.name
-            club_icon = c.icon_url
+            club_icon = media_variant_url(c.icon_url, 'thumb')
 
     # Compute status for this event
     now = datetime.utcnow()
@@ -139,12 +316,12 @@ def update_event(event_uid):
         event.name = data.get('name')
     if 'start_datetime' in data:
         try:
-            event.start_datetime = datetime.fromisoformat(data.get('start_datetime'))
+            event.start_datetime = parse_utc_datetime(data.get('start_datetime'))
         except Exception:
             return jsonify({'msg': 'invalid start_datetime format'}), 400
     if 'end_datetime' in data:
         try:
-            event.end_datetime = datetime.fromisoformat(data.get('end_datetime')) if data.get('end_datetime') else None
+            event.end_datetime = parse_utc_datetime(data.get('end_datetime')) if data.get('end_datetime') else None
         except Exception:
             return jsonify({'msg': 'invalid end_datetime format'}), 400
     for fld in ('description', 'location', 'limit', 'type', 'status'):
@@ -152,6 +329,7 @@ def update_event(event_uid):
             setattr(event, fld, data.get(fld))
     if 'banner_url' in data:
         event.banner_url = data.get('banner_url')
+    record_event_change(event)
     db.session.commit()
     return jsonify({'msg': 'updated'}), 200
 
@@ -166,8 +344,7 @@ def join_event(event_uid):
 
     # If event linked to a club, only club members can join
     if event.club_uid:
-        membership = ClubMember.query.filter_by(user_uid=uid, club_uid=event.club_uid).first()
-        if not membership:
+        if not is_club_member(uid, event.club_uid):
             return jsonify({'msg': 'must be a club member to join this event'}), 403
 
     existing = EventParticipant.query.filter_by(user_uid=uid, event_uid=event_uid).first()
@@ -181,6 +358,7 @@ def join_event(event_uid):
 
     participant = EventParticipant(user_uid=uid, event_uid=event_uid, type='inperson' if event.type == 'in-person' else 'online')
     db.session.add(participant)
+    record_club_activity(event.club_uid, event_signups=1)
     db.session.commit()
     return jsonify({'msg': 'joined'}), 201
 
@@ -198,6 +376,8 @@ def leave_event(event_uid):
     if not participation:
         return jsonify({'msg': 'not registered for this event'}), 400
 
+    if participation.joined_at is not None:
+        record_club_activity(event.club_uid, day=participation.joined_at.date(), event_signups=-1)
     db.session.delete(participation)
     db.session.commit()
     return jsonify({'msg': 'left event'}), 200
@@ -214,8 +394,10 @@ def delete_event(event_uid):
     if event.club_uid and not is_club_exec(uid, event.club_uid):
         return jsonify({'msg': 'only club execs can delete this event'}), 403
 
+    record_event_removed(event)
     # Delete all participants first (cascade will handle this if configured, but being explicit)
     EventParticipant.query.filter_by(event_uid=event_uid).delete()
+    record_event_change(event, deleted=True)
     db.session.delete(event)
     db.session.commit()
     return jsonify({'msg': 'deleted'}), 200
@@ -230,7 +412,15 @@ def get_club_events(club_uid):
     if not club:
         return jsonify({'msg': 'club not found'}), 404
     
-    events = Event.query.filter_by(club_uid=club_uid).order_by(Event.start_datetime.desc()).all()
+    counts = participant_counts_subquery()
+    rows = db.session.query(
+        Event,
+        db.func.coalesce(counts.c.participant_count, 0)
+    ).outerjoin(
+        counts, counts.c.event_uid == Event.uid
+    ).filter(
+        Event.club_uid == club_uid
+    ).order_by(Event.start_datetime.desc()).all()
     
     # Try to get current user if authenticated
     current_user_uid = None
@@ -240,18 +430,21 @@ def get_club_events(club_uid):
     except:
         pass
     
+    # Resolve the user's attendance for every event of the club at once
+    attending_uids = set()
+    if current_user_uid:
+        attending_uids = {
+            event_uid for (event_uid,) in db.session.query(EventParticipant.event_uid).join(
+                Event, Event.uid == EventParticipant.event_uid
+            ).filter(
+                Event.club_uid == club_uid,
+                EventParticipant.user_uid == current_user_uid
+            )
+        }
+    
     result = []
-    for event in events:
-        # Count participants
-        participant_count = EventParticipant.query.filter_by(event_uid=event.uid).count()
-        
-        # Check if current user is attending
-        is_attending = False
-        if current_user_uid:
-            is_attending = EventParticipant.query.filter_by(
-                event_uid=event.uid, 
-                user_uid=current_user_uid
-            ).first() is not None
+    for event, participant_count in rows:
+        is_attending = event.uid in attending_uids
         
         result.append({
             'uid': event.uid,
@@ -265,7 +458,7 @@ def get_club_events(club_uid):
             'status': event.status,
             'club_uid': event.club_uid,
             'participant_count': participant_count,
-            'banner_url': event.banner_url,
+            'banner_url': media_variant_url(event.banner_url, 'card'),
             'is_attending': is_attending
         })
     
@@ -1,30 +1,51 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required
+from flask import Blueprint, current_app, request, jsonify, send_file
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NEED_DATA
+import hashlib
+import hmac
 import os
+import re
+import time
+import uuid
 import requests
+from .. import db
+from ..authz import is_club_exec
+from ..http import get_http_session
+from ..models import Club, Event
+from ..storage import (
+    DISPLAY_VARIANT, KEY_RE, get_media_storage, get_variant_pool, image_info,
+    media_url, original_key, spool_upload
+)
 
 bp = Blueprint('media', __name__, url_prefix='/media')
 
+# bytes read from the client and forwarded upstream at a time
+CHUNK_SIZE = 64 * 1024
+# form fields sent before the file (preset_type, upload_preset) are small
+MAX_FIELD_BYTES = 1024
+# (connect, read) seconds for the upstream upload
+UPLOAD_TIMEOUT = (5, 30)
 
-@bp.route('/upload', methods=['POST'])
-@jwt_required()
-def upload_media():
-    """Upload a file to Cloudinary using unsigned upload preset.
+# what a signed upload is attached to: target kind -> (model, url column, default preset_type)
+SIGNED_TARGETS = {
+    'clubs': (Club, 'icon_url', 'logo'),
+    'events': (Event, 'banner_url', 'banner'),
+}
+# public ids of signed uploads end in <kind>/<uid>/<preset_type>/<timestamp>-<nonce>;
+# an upload preset may put a folder in front
+SIGNED_PUBLIC_ID_RE = re.compile(r'(clubs|events|users)/([\w-]+)/(\w+)/(\d+)-([0-9a-f]+)$')
+FORMAT_RE = re.compile(r'[a-z0-9]{1,10}')
 
-    Requires env vars: CLOUDINARY_CLOUD_NAME and CLOUDINARY_UPLOAD_PRESET
-    Returns JSON: { url: <uploaded_url> }
-    """
-    file = request.files.get('file')
-    if not file:
-        return jsonify({'msg': 'file is required'}), 400
 
-    cloud_name = os.environ.get('CLOUDINARY_CLOUD_NAME')
+class UploadTooLarge(Exception):
+    pass
 
-    # Allow selecting different unsigned presets for different upload types
-    # Priority: preset_type -> form-provided upload_preset -> env default
-    preset_type = request.form.get('preset_type') or request.form.get('type')
-    form_upload_preset = request.form.get('upload_preset')
 
+def select_upload_preset(preset_type=None, form_upload_preset=None):
+    """Pick the Cloudinary unsigned preset for an upload.
+
+    Priority: preset_type -> form-provided upload_preset -> env default
+    """
     upload_preset = None
     if preset_type:
         if preset_type.lower() == 'logo':
@@ -41,17 +62,173 @@ def upload_media():
     # final fallback to the generic env var
     if not upload_preset:
         upload_preset = os.environ.get('CLOUDINARY_UPLOAD_PRESET')
+    return upload_preset
+
+
+def cloudinary_api_url():
+    # CLOUDINARY_API_URL points uploads at another endpoint, e.g. a local stub in tests
+    return os.environ.get('CLOUDINARY_API_URL') or 'https://api.cloudinary.com'
+
+
+def cloudinary_delivery_url():
+    return os.environ.get('CLOUDINARY_DELIVERY_URL') or 'https://res.cloudinary.com'
+
+
+def cloudinary_signature(params, api_secret):
+    """Cloudinary's request signature: sha1 of the sorted, non-empty params plus the secret."""
+    payload = '&'.join(f'{key}={value}' for key, value in sorted(params.items()) if value not in (None, ''))
+    return hashlib.sha1((payload + api_secret).encode()).hexdigest()
+
+
+def multipart_events(stream, boundary):
+    """Decode a multipart body from stream as it arrives, CHUNK_SIZE at a time."""
+    decoder = MultipartDecoder(boundary, max_form_memory_size=CHUNK_SIZE + MAX_FIELD_BYTES)
+    while True:
+        event = decoder.next_event()
+        if event is NEED_DATA:
+            decoder.receive_data(stream.read(CHUNK_SIZE) or None)
+            continue
+        yield event
+        if isinstance(event, Epilogue):
+            return
+
+
+def _part_header(boundary, name, filename=None, content_type=None):
+    disposition = f'form-data; name="{name}"'
+    if filename is not None:
+        # keep the header well-formed whatever the client sent
+        safe = filename.replace('"', '%22').replace('\r', '').replace('\n', '')
+        disposition += f'; filename="{safe}"'
+    header = f'--{boundary}\r\nContent-Disposition: {disposition}\r\n'
+    if content_type:
+        header += f'Content-Type: {content_type}\r\n'
+    return (header + '\r\n').encode()
+
+
+def file_chunks(events, max_bytes):
+    """The file part's bytes as they arrive from events, up to max_bytes."""
+    sent = 0
+    for event in events:
+        if not isinstance(event, Data):
+            break
+        sent += len(event.data)
+        if sent > max_bytes:
+            raise UploadTooLarge()
+        if event.data:
+            yield event.data
+        if not event.more_data:
+            break
+
+
+def upload_body(boundary, upload_preset, file_part, events, max_bytes):
+    """Multipart body for the upstream upload, streaming the file's chunks from events."""
+    yield _part_header(boundary, 'upload_preset') + upload_preset.encode() + b'\r\n'
+    yield _part_header(boundary, 'file', file_part.filename or 'upload',
+                       file_part.headers.get('Content-Type', 'application/octet-stream'))
+    yield from file_chunks(events, max_bytes)
+    yield f'\r\n--{boundary}--\r\n'.encode()
+
+
+def store_upload(storage, events, preset_type):
+    """Keep an upload in local storage and queue its variants (see app/storage.py)."""
+    hasher = hashlib.sha256()
+    try:
+        tmp_path = spool_upload(storage, file_chunks(events, current_app.config['MEDIA_MAX_UPLOAD_BYTES']), hasher)
+    except UploadTooLarge:
+        return jsonify({'msg': 'file too large'}), 413
+    except ValueError:
+        return jsonify({'msg': 'invalid multipart body'}), 400
+
+    info = image_info(tmp_path)
+    if not info:
+        os.remove(tmp_path)
+        return jsonify({'msg': 'file is not a supported image'}), 400
+    ext, (width, height) = info
+    # compressed formats can expand to far more memory than the upload size
+    if width * height > current_app.config['MEDIA_MAX_IMAGE_PIXELS']:
+        os.remove(tmp_path)
+        return jsonify({'msg': 'image dimensions too large'}), 400
+
+    # the same bytes always get the same keys, so a repeat upload stores and renders nothing
+    digest = hasher.hexdigest()
+    storage.put_file(original_key(digest, ext), tmp_path)
+    preset_type = (preset_type or '').lower()
+    urls = {name: media_url(key) for name, key in get_variant_pool().submit(digest, ext, preset_type).items()}
+    urls['original'] = media_url(original_key(digest, ext))
+    return jsonify({'url': urls[DISPLAY_VARIANT.get(preset_type, 'original')], 'variants': urls}), 200
+
+
+@bp.route('/upload', methods=['POST'])
+@jwt_required()
+def upload_media():
+    """Upload a file to Cloudinary using unsigned upload preset, or to local
+    storage when MEDIA_STORAGE=local.
+
+    The file is forwarded as it arrives rather than spooled first, so memory
+    use stays at a few chunks per upload. Form fields only count if they come
+    before the file part; preset_type may also be given in the query string.
+
+    Requires env vars: CLOUDINARY_CLOUD_NAME and CLOUDINARY_UPLOAD_PRESET
+    Returns JSON: { url: <uploaded_url> }, plus { variants: {name: url} } for local storage
+    """
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype != 'multipart/form-data' or not boundary:
+        return jsonify({'msg': 'file is required'}), 400
+
+    # read the fields that precede the file part
+    events = multipart_events(request.stream, boundary.encode())
+    fields = {}
+    field_name = None
+    file_part = None
+    try:
+        for event in events:
+            if isinstance(event, Field):
+                field_name = event.name
+                fields[field_name] = b''
+            elif isinstance(event, Data) and field_name is not None:
+                fields[field_name] += event.data
+                if len(fields[field_name]) > MAX_FIELD_BYTES:
+                    return jsonify({'msg': f'{field_name} is too long'}), 400
+            elif isinstance(event, File):
+                field_name = None
+                if event.name == 'file':
+                    file_part = event
+                    break
+    except ValueError:
+        return jsonify({'msg': 'invalid multipart body'}), 400
+    if file_part is None:
+        return jsonify({'msg': 'file is required'}), 400
+    form = {name: value.decode('utf-8', 'replace') for name, value in fields.items()}
+    preset_type = request.args.get('preset_type') or form.get('preset_type') or form.get('type')
+
+    storage = get_media_storage()
+    if storage is not None:
+        return store_upload(storage, events, preset_type)
+
+    cloud_name = os.environ.get('CLOUDINARY_CLOUD_NAME')
+
+    # Allow selecting different unsigned presets for different upload types
+    upload_preset = select_upload_preset(preset_type, form.get('upload_preset'))
 
     if not cloud_name or not upload_preset:
         return jsonify({'msg': 'cloudinary config not set (CLOUDINARY_CLOUD_NAME and an upload preset are required)'}), 500
 
-    url = f"https://api.cloudinary.com/v1_1/{cloud_name}/auto/upload"
-    files = {'file': (file.filename, file.stream, file.mimetype)}
-    data = {'upload_preset': upload_preset}
+    url = f"{cloudinary_api_url()}/v1_1/{cloud_name}/auto/upload"
+    out_boundary = uuid.uuid4().hex
+    body = upload_body(out_boundary, upload_preset, file_part, events, current_app.config['MEDIA_MAX_UPLOAD_BYTES'])
 
     try:
-        resp = requests.post(url, data=data, files=files, timeout=30)
-    except Exception as e:
+        resp = get_http_session().post(
+            url,
+            data=body,
+            headers={'Content-Type': f'multipart/form-data; boundary={out_boundary}'},
+            timeout=UPLOAD_TIMEOUT
+        )
+    except UploadTooLarge:
+        return jsonify({'msg': 'file too large'}), 413
+    except ValueError:
+        return jsonify({'msg': 'invalid multipart body'}), 400
+    except requests.RequestException as e:
         return jsonify({'msg': 'upload failed', 'error': str(e)}), 500
 
     if resp.status_code != 200:
@@ -59,3 +236,129 @@ def upload_media():
 
     result = resp.json()
     return jsonify({'url': result.get('secure_url')}), 200
+
+
+@bp.route('/files/<path:key>', methods=['GET'])
+def serve_file(key):
+    """A locally stored original or variant. Keys are content hashes, so
+    responses are cacheable forever."""
+    storage = get_media_storage()
+    if storage is None or not KEY_RE.fullmatch(key):
+        return jsonify({'msg': 'file not found'}), 404
+    if not storage.exists(key) and not get_variant_pool().ensure(key):
+        return jsonify({'msg': 'file not found'}), 404
+    return send_file(storage.path(key), max_age=365 * 24 * 3600)
+
+
+def _signed_target(uid, kind, target_uid):
+    """The Club/Event a signed upload is for, or an error response.
+
+    Uploads not yet attached to anything (logos and banners picked while
+    creating a club or event) are filed under the caller's own uid.
+    """
+    if kind == 'users':
+        if target_uid != uid:
+            return None, (jsonify({'msg': 'upload belongs to another user'}), 403)
+        return None, None
+    model = SIGNED_TARGETS[kind][0]
+    target = model.query.get(target_uid)
+    if not target:
+        return None, (jsonify({'msg': f'{model.__name__.lower()} not found'}), 404)
+    club_uid = target.uid if model is Club else target.club_uid
+    if club_uid and not is_club_exec(uid, club_uid):
+        return None, (jsonify({'msg': 'only club execs can change this image'}), 403)
+    return target, None
+
+
+@bp.route('/sign', methods=['POST'])
+@jwt_required()
+def sign_upload():
+    """Signed parameters for uploading one image straight to Cloudinary.
+
+    Body: {club_uid | event_uid | neither, preset_type?}. preset_type defaults
+    to 'logo' for clubs and 'banner' for events and picks the preset as
+    /media/upload does. The client posts `fields` plus its `file` to
+    `upload_url`, then passes Cloudinary's response to /media/confirm within
+    MEDIA_SIGNED_UPLOAD_TTL_SECONDS.
+
+    Requires env vars: CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY and CLOUDINARY_API_SECRET
+    """
+    uid = get_jwt_identity()
+    data = request.get_json() or {}
+    if get_media_storage() is not None:
+        return jsonify({'msg': 'signed uploads need Cloudinary storage (MEDIA_STORAGE is local)'}), 500
+    cloud_name = os.environ.get('CLOUDINARY_CLOUD_NAME')
+    api_key = os.environ.get('CLOUDINARY_API_KEY')
+    api_secret = os.environ.get('CLOUDINARY_API_SECRET')
+    if not cloud_name or not api_key or not api_secret:
+        return jsonify({'msg': 'cloudinary config not set (CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY and CLOUDINARY_API_SECRET are required)'}), 500
+
+    kind, target_uid = 'users', uid
+    if data.get('club_uid'):
+        kind, target_uid = 'clubs', data['club_uid']
+    elif data.get('event_uid'):
+        kind, target_uid = 'events', data['event_uid']
+    _, error = _signed_target(uid, kind, target_uid)
+    if error:
+        return error
+
+    default_type = SIGNED_TARGETS[kind][2] if kind in SIGNED_TARGETS else 'image'
+    preset_type = (data.get('preset_type') or default_type).lower()
+    if not re.fullmatch(r'\w{1,20}', preset_type):
+        return jsonify({'msg': 'invalid preset_type'}), 400
+
+    timestamp = int(time.time())
+    params = {
+        'timestamp': timestamp,
+        'public_id': f'{kind}/{target_uid}/{preset_type}/{timestamp}-{uuid.uuid4().hex[:12]}',
+        'upload_preset': select_upload_preset(preset_type),
+    }
+    fields = {key: value for key, value in params.items() if value}
+    fields['signature'] = cloudinary_signature(params, api_secret)
+    fields['api_key'] = api_key
+    return jsonify({
+        'upload_url': f"{cloudinary_api_url()}/v1_1/{cloud_name}/image/upload",
+        'fields': fields,
+        'expires_at': timestamp + current_app.config['MEDIA_SIGNED_UPLOAD_TTL_SECONDS']
+    }), 200
+
+
+@bp.route('/confirm', methods=['POST'])
+@jwt_required()
+def confirm_upload():
+    """Record a finished direct upload on the club or event it was signed for.
+
+    Body: the public_id, version, signature and format from Cloudinary's upload
+    response. The signature proves Cloudinary stored that public_id, and the
+    public_id says which target it was signed for. Returns JSON: { url }
+    """
+    uid = get_jwt_identity()
+    data = request.get_json() or {}
+    cloud_name = os.environ.get('CLOUDINARY_CLOUD_NAME')
+    api_secret = os.environ.get('CLOUDINARY_API_SECRET')
+    if not cloud_name or not api_secret:
+        return jsonify({'msg': 'cloudinary config not set (CLOUDINARY_CLOUD_NAME and CLOUDINARY_API_SECRET are required)'}), 500
+
+    public_id = str(data.get('public_id') or '')
+    version = str(data.get('version') or '')
+    fmt = str(data.get('format') or '').lower()
+    expected = cloudinary_signature({'public_id': public_id, 'version': version}, api_secret)
+    if not version.isdigit() or not hmac.compare_digest(expected, str(data.get('signature') or '')):
+        return jsonify({'msg': 'invalid upload signature'}), 400
+    match = SIGNED_PUBLIC_ID_RE.search(public_id)
+    if not match or not FORMAT_RE.fullmatch(fmt):
+        return jsonify({'msg': 'not a signed upload'}), 400
+    kind, target_uid, _, timestamp, _ = match.groups()
+    if time.time() - int(timestamp) > current_app.config['MEDIA_SIGNED_UPLOAD_TTL_SECONDS']:
+        return jsonify({'msg': 'upload signature expired'}), 400
+
+    target, error = _signed_target(uid, kind, target_uid)
+    if error:
+        return error
+
+    url = f"{cloudinary_delivery_url()}/{cloud_name}/image/upload/v{version}/{public_id}.{fmt}"
+    if target is not None:
+        # a banner leaves event times alone, so the events version isn't bumped
+        setattr(target, SIGNED_TARGETS[kind][1], url)
+        db.session.commit()
+    return jsonify({'url': url}), 200
@@ -0,0 +1,121 @@
+"""In-memory interval index over event times for conflict checks.
+
+Events are kept sorted by start time. Together with the longest current
+event duration, that bounds an overlap query to a contiguous slice found by
+binary search, so each check is O(log n + matches) rather than a table scan.
+
+The index is loaded lazily per process and tagged with the 'events' data
+version. Routes call record_event_change in the same transaction as an event
+create/update/delete, which applies the change incrementally; other processes
+notice the bumped version and reload.
+"""
+import bisect
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from flask import current_app
+
+from . import db
+from .cache import bump_data_version, data_version
+from .models import Event
+
+DATA_VERSION = 'events'
+# events without an end time are treated as lasting this long
+DEFAULT_EVENT_DURATION = timedelta(hours=1)
+
+
+def event_end(start, end):
+    return end if end and end > start else start + DEFAULT_EVENT_DURATION
+
+
+class EventIntervalIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._starts = []  # sorted (start, uid)
+        self._events = {}  # uid -> (start, end, club_uid)
+        # how many events have each duration, so the longest can shrink on removal
+        self._durations = Counter()
+        self._max_duration = timedelta(0)
+        self.version = None
+
+    def load(self, rows, version):
+        """Replace the contents with (uid, start, end, club_uid) rows."""
+        with self._lock:
+            self._events = {}
+            self._durations = Counter()
+            self._max_duration = timedelta(0)
+            for uid, start, end, club_uid in rows:
+                self._put(uid, start, end, club_uid)
+            self._starts = sorted((start, uid) for uid, (start, _, _) in self._events.items())
+            self.version = version
+
+    def _put(self, uid, start, end, club_uid):
+        end = event_end(start, end)
+        self._events[uid] = (start, end, club_uid)
+        self._durations[end - start] += 1
+        self._max_duration = max(self._max_duration, end - start)
+
+    def add(self, uid, start, end, club_uid):
+        with self._lock:
+            self._discard(uid)
+            self._put(uid, start, end, club_uid)
+            bisect.insort(self._starts, (start, uid))
+
+    def remove(self, uid):
+        with self._lock:
+            self._discard(uid)
+
+    def _discard(self, uid):
+        existing = self._events.pop(uid, None)
+        if existing is None:
+            return
+        duration = existing[1] - existing[0]
+        self._durations[duration] -= 1
+        if not self._durations[duration]:
+            del self._durations[duration]
+            if duration == self._max_duration:
+                # distinct durations are few, so this is cheap
+                self._max_duration = max(self._durations, default=timedelta(0))
+        i = bisect.bisect_left(self._starts, (existing[0], uid))
+        if i < len(self._starts) and self._starts[i] == (existing[0], uid):
+            del self._starts[i]
+
+    def overlapping(self, start, end):
+        """Events overlapping [start, end) as (uid, start, end, club_uid) tuples."""
+        with self._lock:
+            lo = bisect.bisect_left(self._starts, (start - self._max_duration,))
+            hi = bisect.bisect_left(self._starts, (end,))
+            result = []
+            for _, uid in self._starts[lo:hi]:
+                event_start, event_end_, club_uid = self._events[uid]
+                if event_end_ > start:
+                    result.append((uid, event_start, event_end_, club_uid))
+            return result
+
+    def __len__(self):
+        return len(self._events)
+
+
+def get_event_index():
+    """The process's event index, reloaded if another process changed events."""
+    index = current_app.extensions['event_index']
+    version = data_version(DATA_VERSION)
+    if index.version != version:
+        rows = db.session.query(Event.uid, Event.start_datetime, Event.end_datetime, Event.club_uid).all()
+        index.load(rows, version)
+    return index
+
+
+def record_event_change(event, deleted=False):
+    """Bump the events version and update this process's index. Call before
+    committing the create/update/delete of event."""
+    index = current_app.extensions['event_index']
+    previous = index.version
+    version = bump_data_version(DATA_VERSION)
+    if deleted:
+        index.remove(event.uid)
+    else:
+        index.add(event.uid, event.start_datetime, event.end_datetime, event.club_uid)
+    # only trust the incremental update if nobody else changed events meanwhile
+    index.version = version if previous is not None and version == previous + 1 else None
@@ -0,0 +1,78 @@
+"""Bring a database made by an older release up to the current models.
+
+The app has no migrations; create_app calls db.create_all(), which creates
+missing tables but never alters existing ones. upgrade_schema runs it and then
+adds the columns listed in ADDED_COLUMNS and any declared index that an
+existing table lacks. Every step checks first, so it is safe to run on every
+start and from several worker processes at once.
+"""
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.schema import CreateColumn
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+# (table, column) added to a model after its table was first created. The
+# columns must be nullable or have a server default, since existing rows get
+# no value.
+ADDED_COLUMNS = [
+    ('events', 'created_at'),
+    # stored rows get their hash the next time an import rewrites them
+    ('courses', 'content_hash'),
+]
+
+
+def _add_column(table_name, column_name):
+    column = db.metadata.tables[table_name].c[column_name]
+    ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {ddl}'))
+    except SQLAlchemyError:
+        # another process may have added it first
+        if column_name not in {c['name'] for c in inspect(db.engine).get_columns(table_name)}:
+            raise
+        return False
+    logger.info('added column %s.%s', table_name, column_name)
+    return True
+
+
+def upgrade_schema():
+    """Create missing tables, columns and indexes. Returns the (table, column)
+    pairs added to existing tables."""
+    existing = set(inspect(db.engine).get_table_names())
+    db.create_all()
+
+    added = []
+    for table_name, column_name in ADDED_COLUMNS:
+        if table_name not in existing:
+            continue
+        columns = {c['name'] for c in inspect(db.engine).get_columns(table_name)}
+        if column_name not in columns and _add_column(table_name, column_name):
+            added.append((table_name, column_name))
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        for index in table.indexes:
+            try:
+                index.create(db.engine, checkfirst=True)
+            except SQLAlchemyError:
+                # another process may have created it first
+                if index.name not in {i['name'] for i in inspect(db.engine).get_indexes(table.name)}:
+                    raise
+
+    # the rollup starts empty on a database that already has activity
+    if existing and ('club_daily_metrics' not in existing or ('events', 'created_at') in added):
+        from .metrics import rebuild_club_metrics
+        try:
+            rebuild_club_metrics()
+        except SQLAlchemyError:
+            # e.g. another process filled it at the same time
+            db.session.rollback()
+            logger.warning('rebuilding club metrics failed; run flask rebuild-club-metrics', exc_info=True)
+    return added
@@ -0,0 +1,228 @@
+"""Content-addressed media storage and resized image variants.
+
+With MEDIA_STORAGE=local, /media/upload keeps images in a LocalStorage under
+MEDIA_LOCAL_ROOT instead of sending them to Cloudinary. Files are keyed by
+the sha256 of the original upload:
+
+    <sha256>/original.<ext>      the uploaded bytes
+    <sha256>/<variant>.webp      resized copies, see VARIANTS
+
+so uploading the same logo again stores nothing new. The backend lives in
+app.extensions['media_storage']; any object with the same exists/path/put_file
+methods (e.g. a wrapper around an object store mounted locally) can replace it.
+
+Variants are rendered by a VariantPool (app.extensions['media_variants']) in
+background threads after the upload returns. Pillow releases the GIL while
+decoding, resizing and encoding, so a few threads keep up with uploads
+without holding up request threads. A variant requested before it has been
+rendered is rendered on demand.
+
+icon_url and banner_url hold the detail-size variant ('icon' and 'full');
+list endpoints swap in the smaller one through media_variant_url.
+"""
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, url_for
+from PIL import Image, ImageOps
+
+# preset_type -> {variant: ((width, height), crop)}; crop fills the box
+# (banners), otherwise the image is shrunk to fit inside it (logos)
+VARIANTS = {
+    'logo': {'thumb': ((96, 96), False), 'icon': ((256, 256), False)},
+    'banner': {'card': ((600, 200), True), 'full': ((1200, 400), True)},
+}
+# variant stored in icon_url / banner_url for each preset_type
+DISPLAY_VARIANT = {'logo': 'icon', 'banner': 'full'}
+VARIANT_FORMAT = 'webp'
+
+# Pillow format -> file extension of the stored original
+IMAGE_EXTENSIONS = {'PNG': 'png', 'JPEG': 'jpg', 'GIF': 'gif', 'WEBP': 'webp'}
+
+KEY_RE = re.compile(r'[0-9a-f]{64}/\w+\.\w+')
+VARIANT_URL_RE = re.compile(r'(/[0-9a-f]{64}/)\w+(\.' + VARIANT_FORMAT + r')$')
+
+
+class LocalStorage:
+    def __init__(self, root):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path(self, key):
+        # a level of hash-prefix directories keeps any one directory small
+        return os.path.join(self.root, key[:2], key)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def temp_file(self):
+        """A named temporary file on the same filesystem, for put_file."""
+        return tempfile.NamedTemporaryFile(dir=self.tmp_dir, delete=False)
+
+    def put_file(self, key, src_path):
+        """Move src_path into place under key. Returns False, and removes
+        src_path, if the key was already stored."""
+        dest = self.path(key)
+        if os.path.exists(dest):
+            os.remove(src_path)
+            return False
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(src_path, dest)
+        return True
+
+
+def original_key(digest, ext):
+    return f'{digest}/original.{ext}'
+
+
+def variant_key(digest, name):
+    return f'{digest}/{name}.{VARIANT_FORMAT}'
+
+
+def image_info(path):
+    """(file extension, (width, height)) for the image at path, or None if
+    Pillow can't read it or it is not one of IMAGE_EXTENSIONS.
+
+    Only the header is decoded, so a small file that expands to a huge
+    bitmap costs nothing here; callers check the size before rendering.
+    """
+    try:
+        with Image.open(path) as img:
+            img.verify()
+            ext = IMAGE_EXTENSIONS.get(img.format)
+            return (ext, img.size) if ext else None
+    except Exception:
+        return None
+
+
+def render_variant(storage, source_key, key, size, crop):
+    """Write one resized copy of source_key to key."""
+    with Image.open(storage.path(source_key)) as img:
+        # let JPEG decode at a reduced scale when the target is much smaller
+        img.draft('RGB', size)
+        img = ImageOps.exif_transpose(img)
+        img = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+        if crop:
+            # never upscale: shrink the box to the source, keeping its shape
+            scale = min(1, img.width / size[0], img.height / size[1])
+            img = ImageOps.fit(img, (max(1, round(size[0] * scale)), max(1, round(size[1] * scale))), Image.LANCZOS)
+        else:
+            img.thumbnail(size, Image.LANCZOS)
+        with storage.temp_file() as tmp:
+            img.save(tmp, VARIANT_FORMAT.upper(), quality=85, method=4)
+    storage.put_file(key, tmp.name)
+
+
+class VariantPool:
+    """Renders image variants in background threads, one job per key."""
+
+    def __init__(self, storage, workers=2):
+        self.storage = storage
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+        # variant key -> Future while it is being rendered
+        self._pending = {}
+
+    def _executor(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='media-variants')
+        return self._pool
+
+    def _render(self, source_key, key, size, crop):
+        try:
+            render_variant(self.storage, source_key, key, size, crop)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def submit(self, digest, ext, preset_type):
+        """Queue the missing variants of an original. Returns {variant: key}."""
+        keys = {}
+        for name, (size, crop) in VARIANTS.get(preset_type, {}).items():
+            key = keys[name] = variant_key(digest, name)
+            executor = self._executor()
+            with self._lock:
+                if key in self._pending or self.storage.exists(key):
+                    continue
+                self._pending[key] = executor.submit(
+                    self._render, original_key(digest, ext), key, size, crop)
+        return keys
+
+    def wait(self, key, timeout=None):
+        """Block until key has been rendered, if it is queued."""
+        with self._lock:
+            future = self._pending.get(key)
+        if future is not None:
+            future.result(timeout)
+
+    def ensure(self, key):
+        """Make sure a variant key exists, rendering it here if it was never
+        queued (e.g. the process restarted first). False if it can't exist,
+        including when its original can't be rendered."""
+        try:
+            self.wait(key)
+        except Exception:
+            current_app.logger.warning('rendering media variant %s failed', key, exc_info=True)
+            return False
+        if self.storage.exists(key):
+            return True
+        digest, filename = key.split('/')
+        name, _ = os.path.splitext(filename)
+        spec = next((variants[name] for variants in VARIANTS.values() if name in variants), None)
+        if spec is None:
+            return False
+        source = next((original_key(digest, ext) for ext in IMAGE_EXTENSIONS.values()
+                       if self.storage.exists(original_key(digest, ext))), None)
+        if source is None:
+            return False
+        try:
+            render_variant(self.storage, source, key, *spec)
+        except Exception:
+            current_app.logger.warning('rendering media variant %s failed', key, exc_info=True)
+            return False
+        return True
+
+
+def get_media_storage():
+    """The local media backend, or None when uploads go to Cloudinary."""
+    return current_app.extensions.get('media_storage')
+
+
+def get_variant_pool():
+    return current_app.extensions['media_variants']
+
+
+def media_url(key):
+    base = current_app.config.get('MEDIA_PUBLIC_URL')
+    if base:
+        return f"{base.rstrip('/')}/{key}"
+    return url_for('media.serve_file', key=key, _external=True)
+
+
+def media_variant_url(url, name):
+    """url with its variant swapped for name, when url is a locally stored
+    variant; any other url (e.g. Cloudinary's) is returned unchanged."""
+    if not url:
+        return url
+    return VARIANT_URL_RE.sub(lambda m: f'{m.group(1)}{name}{m.group(2)}', url)
+
+
+def spool_upload(storage, chunks, hasher):
+    """Write chunks to a temp file, feeding hasher. Returns the temp path."""
+    with storage.temp_file() as tmp:
+        try:
+            for chunk in chunks:
+                hasher.update(chunk)
+                tmp.write(chunk)
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    return tmp.name
@@ -0,0 +1,168 @@
+"""
+Offline course parser for saved catalogue snapshots
+Re-parses HTML saved by the scraper (SNAPSHOT_DIR) without a browser, so a
+selector fix can be checked against a whole catalogue in seconds. Only --save
+needs the scraper module (and selenium); parsing itself does not
+
+Usage (from backend/scraper):
+    python offline.py snapshots/ [--workers 4] [--json out.json] [--save]
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+import argparse
+import glob
+import json
+import os
+
+try:
+    from .schedule_parser import build_course, parse_many
+except ImportError:
+    # run as a script: python offline.py
+    from schedule_parser import build_course, parse_many
+
+# The live scraper's selectors as class names, in the order it tries them
+ITEM_CLASS = 'course-item'
+FIELD_CLASSES = {
+    'course_name': ['course-name'],
+    'schedule': ['course-time', 'time', 'schedule'],
+    'enrollment': ['enrollment', 'enrolled', 'students'],
+    'course_code': ['course-code'],
+}
+
+# Elements without an end tag
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+             'link', 'meta', 'source', 'track', 'wbr'}
+
+
+class CourseListParser(HTMLParser):
+    """Collects the raw text fields of every course-item element on a page"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.items = []
+        # open elements as (tag, [field classes it captures])
+        self._stack = []
+        self._item_depth = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+        captures = []
+        if self._item_depth is None:
+            if ITEM_CLASS in classes:
+                self._item_depth = len(self._stack)
+                self.items.append({'data-course-code': attrs.get('data-course-code'), 'text': {}})
+        else:
+            item_text = self.items[-1]['text']
+            # like find_element, only the first element with a class counts
+            captures = [c for c in classes if c not in item_text]
+            for c in captures:
+                item_text[c] = []
+        self._stack.append((tag, captures))
+
+    def handle_endtag(self, tag):
+        # tolerate unclosed elements by popping back to the matching tag
+        for depth in range(len(self._stack) - 1, -1, -1):
+            if self._stack[depth][0] == tag:
+                del self._stack[depth:]
+                if self._item_depth is not None and depth <= self._item_depth:
+                    self._item_depth = None
+                return
+
+    def handle_data(self, data):
+        if self._item_depth is None:
+            return
+        item_text = self.items[-1]['text']
+        for _, captures in self._stack[self._item_depth + 1:]:
+            for c in captures:
+                item_text[c].append(data)
+
+    def fields(self, item):
+        """Visible text per field, following the live scraper's fallbacks"""
+        text = {c: ' '.join(''.join(parts).split()) for c, parts in item['text'].items()}
+        result = {}
+        for field, classes in FIELD_CLASSES.items():
+            result[field] = next((text[c] for c in classes if c in text), None)
+        result['course_code'] = item['data-course-code'] or result['course_code'] or 'UNKNOWN'
+        return result
+
+
+def parse_html(html):
+    """Course records for every course entry in one page of HTML"""
+    page = CourseListParser()
+    page.feed(html)
+    page.close()
+
+    # the live scraper skips entries missing any of these
+    entries = [fields for fields in map(page.fields, page.items)
+               if None not in (fields['course_name'], fields['schedule'], fields['enrollment'])]
+    schedules = parse_many([fields['schedule'].strip() for fields in entries])
+    return [
+        build_course(
+            fields['course_name'], fields['course_code'], fields['schedule'], fields['enrollment'], schedule
+        )
+        for fields, schedule in zip(entries, schedules)
+    ]
+
+
+def parse_snapshot(path):
+    """Course records from one saved snapshot file"""
+    with open(path, encoding='utf-8') as f:
+        return parse_html(f.read())
+
+
+def parse_snapshots(directory, workers=None):
+    """
+    Parse every *.html snapshot in directory across worker processes
+
+    Results are merged in file name order, keeping the first entry per course
+    code like scrape_parallel does.
+    """
+    paths = sorted(glob.glob(os.path.join(directory, '*.html')))
+    if workers == 1 or len(paths) <= 1:
+        pages = map(parse_snapshot, paths)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pages = list(pool.map(parse_snapshot, paths))
+
+    courses = []
+    seen = set()
+    for page in pages:
+        for course in page:
+            if course['course_code'] not in seen:
+                seen.add(course['course_code'])
+                courses.append(course)
+    return courses
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Parse saved course page snapshots')
+    arg_parser.add_argument('directory', help='directory of saved *.html pages')
+    arg_parser.add_argument('--workers', type=int, default=None, help='parser processes (default: CPU count)')
+    arg_parser.add_argument('--json', dest='json_file', help='write the parsed courses to this JSON file')
+    arg_parser.add_argument('--save', action='store_true', help='save the parsed courses to the database')
+    args = arg_parser.parse_args()
+
+    courses = parse_snapshots(args.directory, workers=args.workers)
+    print(f"✓ Parsed {len(courses)} courses from {args.directory}")
+
+    if args.json_file:
+        with open(args.json_file, 'w') as f:
+            json.dump(courses, f, indent=2)
+        print(f"✓ Saved to {args.json_file}")
+    if args.save:
+        try:
+            from .scraper import CourseScheduleScraper
+        except ImportError:
+            from scraper import CourseScheduleScraper
+
+        scraper = CourseScheduleScraper(start_browser=False)
+        scraper.courses = courses
+        scraper.save_to_database(remove_missing=os.getenv('PRUNE_REMOVED_COURSES') == '1')
+
+
+if __name__ == "__main__":
+    main()
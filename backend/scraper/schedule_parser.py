@@ -0,0 +1,241 @@
+"""
+Schedule and enrollment string parsing for scraped courses
+Standard library only, with every pattern compiled once at import, so the
+live scraper and the browserless offline parser share it
+
+Understands the common registrar layouts:
+    "MWF 10:00-11:30", "TR 2:00pm-3:20pm", "TuTh 9-10:15am"
+    "Mon/Wed 10:00 - 11:15", "Mon, Wed, Fri 1pm to 2pm", "M-F 08:00-09:00"
+    "MW 10:00-11:15; F 13:00-14:00"        (multiple blocks)
+    "10:00-11:30 MWF"                      (days after the time)
+    "TBA", "TBD", "Arranged"
+
+Benchmark: python schedule_parser.py [count]
+"""
+
+import re
+from datetime import datetime
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Day tokens -> index into DAY_NAMES. Single letters are the compact registrar
+# codes and only count in uppercase; names and abbreviations are capitalized.
+DAY_TOKENS = {
+    'M': 0, 'T': 1, 'W': 2, 'R': 3, 'F': 4, 'S': 5, 'U': 6,
+    'Mo': 0, 'Tu': 1, 'We': 2, 'Th': 3, 'Fr': 4, 'Sa': 5, 'Su': 6,
+    'Mon': 0, 'Tue': 1, 'Tues': 1, 'Wed': 2, 'Thu': 3, 'Thur': 3, 'Thurs': 3,
+    'Fri': 4, 'Sat': 5, 'Sun': 6,
+}
+DAY_TOKENS.update({name: i for i, name in enumerate(DAY_NAMES)})
+
+# longest first so "Thurs" wins over "Th" and "T"
+DAY_TOKEN_RE = re.compile('|'.join(sorted(DAY_TOKENS, key=len, reverse=True)))
+DAY_WORD_RE = re.compile(r'[A-Za-z]+|-')
+
+# "9", "9:30", "09.30", "9am", "9:30 p.m."; the meridiem must not start a word ("9:30 Arts")
+_TIME = r'(?<![\d:.])(\d{1,2})(?:[:.](\d{2}))?(?:\s*([ap])(?:\.?m)?\.?(?![a-z]))?'
+TIME_RE = re.compile(_TIME, re.IGNORECASE)
+TIME_RANGE_RE = re.compile(_TIME + r'\s*(?:-|–|—|to)\s*' + _TIME + r'(?!\d)', re.IGNORECASE)
+TBA_RE = re.compile(r'\b(?:TBA|TBD|ARR|ARRANGED)\b', re.IGNORECASE)
+NUMBER_RE = re.compile(r'\d+')
+
+# "HH:MM" for every minute of the day, so formatting is a list lookup
+_CLOCK = [f'{h:02d}:{m:02d}' for h in range(24) for m in range(60)]
+
+
+def _day_word(word):
+    """Day indexes spelled by one word ("MWF", "TuTh", "mon"), or None"""
+    for candidate in (word, word.capitalize()):
+        days = []
+        pos = 0
+        while pos < len(candidate):
+            match = DAY_TOKEN_RE.match(candidate, pos)
+            if not match:
+                break
+            days.append(DAY_TOKENS[match.group()])
+            pos = match.end()
+        else:
+            return days
+    return None
+
+
+def parse_days(text):
+    """Day names mentioned in text, in order and without repeats
+
+    Words that are not day codes ("Lecture", "Room") are ignored, and ranges
+    such as "Mon-Fri" or "M-F" are expanded.
+    """
+    words = DAY_WORD_RE.findall(text)
+    days = []
+    i = 0
+    while i < len(words):
+        current = _day_word(words[i]) if words[i] != '-' else None
+        if current is None:
+            i += 1
+            continue
+        if len(current) == 1 and i + 2 < len(words) and words[i + 1] == '-':
+            end = _day_word(words[i + 2])
+            if end is not None and len(end) == 1 and end[0] >= current[0]:
+                current = list(range(current[0], end[0] + 1))
+                i += 2
+        for day in current:
+            if day not in days:
+                days.append(day)
+        i += 1
+    return [DAY_NAMES[day] for day in days]
+
+
+def _minutes(hour, minute, meridiem):
+    hour = int(hour)
+    minute = int(minute) if minute else 0
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem in 'pP' else 0)
+    if hour > 23 or minute > 59:
+        return None
+    return hour * 60 + minute
+
+
+def _time_range(match):
+    """(start, end) as "HH:MM" strings for one TIME_RANGE_RE match, or None"""
+    start_hour, start_minute, start_meridiem, end_hour, end_minute, end_meridiem = match.groups()
+    # "10-11" could be anything (a section, a room range); require some clock syntax
+    if not (start_minute or end_minute or start_meridiem or end_meridiem):
+        return None
+
+    end = _minutes(end_hour, end_minute, end_meridiem)
+    if end is None:
+        return None
+    if start_meridiem or not end_meridiem:
+        start = _minutes(start_hour, start_minute, start_meridiem)
+    else:
+        # "1:00-2:15pm" shares the end's meridiem unless that would start
+        # after the end, as in "11:00-12:15pm"
+        start = _minutes(start_hour, start_minute, end_meridiem)
+        if start is None or start > end:
+            start = _minutes(start_hour, start_minute, 'a')
+    if start is None:
+        return None
+    return _CLOCK[start], _CLOCK[end]
+
+
+def parse_time(time_str):
+    """A single "2:00pm" / "14:00" / "9am" as "HH:MM", or None"""
+    match = TIME_RE.fullmatch(time_str.strip())
+    if not match:
+        return None
+    minutes = _minutes(*match.groups())
+    return _CLOCK[minutes] if minutes is not None else None
+
+
+def parse_schedule(schedule_str):
+    """
+    Parse a schedule string into meeting blocks
+
+    Returns {'days', 'start_time', 'end_time', 'blocks', 'tba'} where blocks
+    is a list of {'days', 'start_time', 'end_time'}. The top-level days and
+    times are those of the first block, or the days alone when there is no
+    time range. Times are "HH:MM" in 24-hour format.
+    """
+    result = {'days': [], 'start_time': None, 'end_time': None, 'blocks': [], 'tba': False}
+    if not schedule_str:
+        return result
+
+    matches = list(TIME_RANGE_RE.finditer(schedule_str))
+    ranges = [(m, _time_range(m)) for m in matches]
+    ranges = [(m, times) for m, times in ranges if times]
+
+    if ranges:
+        # text between time ranges holds the days; decide once whether they
+        # come before ("MWF 10:00-11:30") or after ("10:00-11:30 MWF") the times
+        bounds = [0] + [edge for m, _ in ranges for edge in (m.start(), m.end())] + [len(schedule_str)]
+        gaps = [schedule_str[bounds[i]:bounds[i + 1]] for i in range(0, len(bounds), 2)]
+        leading = bool(parse_days(gaps[0])) or not parse_days(gaps[-1])
+        for i, (_, (start, end)) in enumerate(ranges):
+            days = parse_days(gaps[i] if leading else gaps[i + 1])
+            result['blocks'].append({'days': days, 'start_time': start, 'end_time': end})
+        first = result['blocks'][0]
+        result.update(days=first['days'], start_time=first['start_time'], end_time=first['end_time'])
+    else:
+        result['days'] = parse_days(schedule_str)
+        result['tba'] = bool(TBA_RE.search(schedule_str))
+    return result
+
+
+def parse_enrollment(enrollment_str):
+    """
+    Parse enrollment string to get student count
+    Examples: "45/50" -> 45, "45 of 50" -> 45, "45" -> 45
+    """
+    if not enrollment_str:
+        return 0
+    match = NUMBER_RE.search(enrollment_str)
+    return int(match.group()) if match else 0
+
+
+def parse_many(schedule_strs):
+    """
+    parse_schedule over a batch, parsing each distinct string once
+
+    Catalogues repeat a small set of meeting patterns, so identical strings
+    share one result dict; treat the results as read-only.
+    """
+    parsed = {}
+    results = []
+    for schedule_str in schedule_strs:
+        result = parsed.get(schedule_str)
+        if result is None:
+            result = parsed[schedule_str] = parse_schedule(schedule_str)
+        results.append(result)
+    return results
+
+
+def build_course(course_name, course_code, schedule, enrollment, parsed_schedule=None):
+    """
+    Turn the raw text of one course entry into a course record
+
+    Callers that parse schedules in a batch (see parse_many) pass the result
+    in as parsed_schedule.
+    """
+    if parsed_schedule is None:
+        parsed_schedule = parse_schedule(schedule)
+
+    return {
+        'course_name': course_name.strip(),
+        'course_code': course_code.strip(),
+        'schedule_raw': schedule.strip(),
+        'days': parsed_schedule['days'],
+        'start_time': parsed_schedule['start_time'],
+        'end_time': parsed_schedule['end_time'],
+        'blocks': parsed_schedule['blocks'],
+        'students_enrolled': parse_enrollment(enrollment),
+        'scraped_at': datetime.now().isoformat()
+    }
+
+
+def _benchmark(count):
+    import random
+    import time
+
+    samples = [
+        'MWF 10:00-11:30', 'TR 2:00pm-3:20pm', 'Mon/Wed 10:00 - 11:15', 'TuTh 9-10:15am',
+        'MW 10:00-11:15; F 13:00-14:00', '10:00-11:30 MWF', 'M-F 08:00-09:00', 'TBA',
+    ]
+    rng = random.Random(0)
+    distinct = [f'{rng.choice(["MWF", "TR", "MW", "Mon/Wed", "TuTh", "F"])} '
+                f'{rng.randint(7, 20)}:{rng.choice(["00", "15", "30", "45"])}-'
+                f'{rng.randint(8, 21)}:{rng.choice(["00", "15", "30", "50"])}' for _ in range(2000)]
+    strings = [rng.choice(samples + distinct) for _ in range(count)]
+
+    for label, run in (('parse_schedule', lambda: [parse_schedule(s) for s in strings]),
+                       ('parse_many', lambda: parse_many(strings))):
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        print(f"{label:>15}: {count} strings in {elapsed:.3f}s ({count / elapsed:,.0f}/s)")
+
+
+if __name__ == "__main__":
+    import sys
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
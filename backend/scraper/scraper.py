@@ -9,27 +9,60 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from concurrent.futures import ThreadPoolExecutor
 import os
+import queue
+import re
 import sys
+from urllib.parse import urlparse
 from dotenv import load_dotenv
-from datetime import datetime, time
-import time as time_module
 import json
 
 # Add parent directory to path to import app modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import create_app, db
-from app.models import Course, TimeSlot
+from app.cache import bump_data_version
+from app.course_import import upsert_courses
+
+try:
+    from .schedule_parser import build_course, parse_enrollment, parse_schedule
+    from .stream import CourseStream
+except ImportError:
+    # run as a script: python scraper.py
+    from schedule_parser import build_course, parse_enrollment, parse_schedule
+    from stream import CourseStream
 
 load_dotenv()
 
+# How long to wait for the login form and the course list to appear
+PAGE_TIMEOUT_SECONDS = 10
+# How long to wait for lazy-loaded content to grow the page after a scroll
+SCROLL_WAIT_SECONDS = 1
+
 
 class CourseScheduleScraper:
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, start_browser=True, snapshot_dir=None, stream=None):
         self.portal_url = os.getenv('PORTAL_URL')
         self.username = os.getenv('PORTAL_USERNAME')
         self.password = os.getenv('PORTAL_PASSWORD')
+        self.headless = headless
+        # Save each rendered course page here for offline re-parsing (see offline.py)
+        self.snapshot_dir = snapshot_dir
+        # With a CourseStream, courses are saved in batches instead of kept in self.courses
+        self.stream = stream
+        self.courses = []
+        self.page = None
+        self.failed_shards = []
+        self.driver = None
+        
+        # A coordinator for scrape_parallel doesn't need a browser of its own
+        if start_browser:
+            self._start_browser()
+
+    def _start_browser(self):
+        """Start a Chrome session for this scraper"""
+        headless = self.headless
         
         # Setup Chrome options
         chrome_options = Options()
@@ -42,8 +75,7 @@ class CourseScheduleScraper:
         chrome_options.add_experimental_option('useAutomationExtension', False)
         
         self.driver = webdriver.Chrome(options=chrome_options)
-        self.wait = WebDriverWait(self.driver, 10)
-        self.courses = []
+        self.wait = WebDriverWait(self.driver, PAGE_TIMEOUT_SECONDS)
 
     def login(self):
         """
@@ -51,8 +83,9 @@ class CourseScheduleScraper:
         MODIFY: Update selectors based on your portal's login form
         """
         try:
-            print(f"Navigating to {self.portal_url}/login")
-            self.driver.get(f"{self.portal_url}/login")
+            login_url = f"{self.portal_url}/login"
+            print(f"Navigating to {login_url}")
+            self.driver.get(login_url)
             
             # TODO: Update these selectors for your portal
             # Option 1: By ID
@@ -78,9 +111,12 @@ class CourseScheduleScraper:
             password_field.clear()
             password_field.send_keys(self.password)
             
-            # Submit
+            # Submit and wait for the portal to navigate away from the login form
             submit_button.click()
-            time_module.sleep(2)
+            self.wait.until(EC.any_of(
+                EC.url_changes(login_url),
+                EC.staleness_of(submit_button)
+            ))
             
             print("✓ Login successful")
             return True
@@ -94,19 +130,29 @@ class CourseScheduleScraper:
             self.driver.save_screenshot('login_error.png')
             return False
 
-    def navigate_to_courses(self):
-        """Navigate to courses/schedule page"""
+    def navigate_to_courses(self, path='/courses'):
+        """Navigate to courses/schedule page
+        
+        path selects one page or department of the catalogue, e.g.
+        '/courses?page=2' or '/courses?dept=CSCI'. driver.get returns once the
+        page has loaded; scrape_courses then waits for the course list itself.
+        """
         # TODO: Update this URL to your portal's courses page
-        courses_url = f"{self.portal_url}/courses"
+        courses_url = f"{self.portal_url}{path}"
         
         print(f"Navigating to courses: {courses_url}")
         self.driver.get(courses_url)
-        time_module.sleep(2)
+        self.page = path
 
     def scrape_courses(self):
         """
         Scrape course schedule information
         MODIFY: Update selectors based on your portal's structure
+        
+        Returns this page's courses, or with a stream, passes them to it
+        (skipping entries saved before a resume) and returns an empty list.
+        Returns None if the page timed out or failed part way, so callers can
+        tell a truncated page from a complete one.
         """
         try:
             # TODO: Update this selector to match your portal's course list
@@ -118,6 +164,9 @@ class CourseScheduleScraper:
             # Scroll to load all courses (if lazy loading)
             self._scroll_to_bottom()
             
+            if self.snapshot_dir:
+                self.save_snapshot(self.snapshot_dir)
+            
             # TODO: Update selector to find all course elements
             course_elements = self.driver.find_elements(By.CLASS_NAME, "course-item")
             
@@ -128,21 +177,37 @@ class CourseScheduleScraper:
             
             print(f"Found {len(course_elements)} course entries")
             
+            if self.stream:
+                start = self.stream.saved(self.page)
+                if start:
+                    print(f"Skipping {start} entries saved by an earlier run")
+                for index in range(start, len(course_elements)):
+                    course_data = self._extract_course_data(course_elements[index])
+                    if course_data:
+                        self.stream.add(self.page, index, course_data)
+                return []
+            
+            page_courses = []
             for element in course_elements:
                 course_data = self._extract_course_data(element)
                 if course_data:
-                    self.courses.append(course_data)
+                    page_courses.append(course_data)
             
-            return self.courses
+            self.courses.extend(page_courses)
+            return page_courses
             
         except TimeoutException:
             print("✗ Timeout waiting for courses to load")
             self.driver.save_screenshot('courses_error.png')
-            return []
+            if self.stream:
+                self.stream.fail(self.page)
+            return None
         except Exception as e:
             print(f"✗ Error scraping courses: {e}")
             self.driver.save_screenshot('courses_error.png')
-            return []
+            if self.stream:
+                self.stream.fail(self.page)
+            return None
 
     def _extract_course_data(self, element):
         """
@@ -181,160 +246,147 @@ class CourseScheduleScraper:
             except:
                 course_code = "UNKNOWN"
             
-            # Parse the schedule into structured data
-            parsed_schedule = self._parse_schedule(schedule)
-            
-            return {
-                'course_name': course_name.strip(),
-                'course_code': course_code.strip(),
-                'schedule_raw': schedule.strip(),
-                'days': parsed_schedule['days'],
-                'start_time': parsed_schedule['start_time'],
-                'end_time': parsed_schedule['end_time'],
-                'students_enrolled': self._parse_enrollment(enrollment),
-                'scraped_at': datetime.now().isoformat()
-            }
+            return self._build_course(course_name, course_code, schedule, enrollment)
         except Exception as e:
             print(f"Error extracting course data: {e}")
             return None
 
+    def _build_course(self, course_name, course_code, schedule, enrollment, parsed_schedule=None):
+        """Turn the raw text of one course entry into a course record
+        
+        See schedule_parser.build_course, which the offline snapshot parser
+        uses directly.
+        """
+        return build_course(course_name, course_code, schedule, enrollment, parsed_schedule)
+
     def _parse_schedule(self, schedule_str):
         """
         Parse schedule string into days and times
         Example: "MWF 10:00-11:30" -> {days: [M, W, F], start: 10:00, end: 11:30}
         
-        TODO: Adjust this based on your portal's time format
+        Multi-block schedules also fill 'blocks'; see schedule_parser.py for
+        the supported formats.
         """
-        result = {'days': [], 'start_time': None, 'end_time': None}
-        
-        if not schedule_str:
-            return result
-        
-        # Extract day codes (M, T, W, R, F, S, U)
-        day_map = {
-            'M': 'Monday',
-            'T': 'Tuesday',
-            'W': 'Wednesday',
-            'R': 'Thursday',
-            'F': 'Friday',
-            'S': 'Saturday',
-            'U': 'Sunday'
-        }
-        
-        # Find day letters at start of string
-        import re
-        days_match = re.search(r'^([MTWRFSU]+)', schedule_str.upper())
-        if days_match:
-            day_codes = days_match.group(1)
-            result['days'] = [day_map.get(d, d) for d in day_codes]
-        
-        # Extract time range (handles both 24hr and 12hr formats)
-        # Patterns: "10:00-11:30" or "10:00am-11:30am" or "2:00pm-3:15pm"
-        time_match = re.search(r'(\d{1,2}:\d{2}(?:am|pm)?)\s*-\s*(\d{1,2}:\d{2}(?:am|pm)?)', 
-                              schedule_str.lower())
-        if time_match:
-            start = time_match.group(1)
-            end = time_match.group(2)
-            
-            # Convert to 24-hour format if needed
-            result['start_time'] = self._convert_to_24hour(start)
-            result['end_time'] = self._convert_to_24hour(end)
-        
-        return result
-
-    def _convert_to_24hour(self, time_str):
-        """Convert 12-hour time to 24-hour format"""
-        try:
-            if 'am' in time_str or 'pm' in time_str:
-                dt = datetime.strptime(time_str, '%I:%M%p')
-                return dt.strftime('%H:%M')
-            return time_str
-        except:
-            return time_str
+        return parse_schedule(schedule_str)
 
     def _parse_enrollment(self, enrollment_str):
         """
         Parse enrollment string to get student count
         Examples: "45/50" -> 45, "45 of 50" -> 45, "45" -> 45
         """
-        import re
-        if not enrollment_str:
-            return 0
+        return parse_enrollment(enrollment_str)
+
+    def save_snapshot(self, directory):
+        """Write the rendered page to directory, named after its path and query
         
-        # Match patterns like "45/50" or "45 of 50"
-        match = re.search(r'(\d+)', enrollment_str)
-        if match:
-            return int(match.group(1))
-        return 0
+        e.g. /courses?page=2 -> courses_page_2.html. Returns the file path.
+        """
+        url = urlparse(self.driver.current_url)
+        name = re.sub(r'[^A-Za-z0-9]+', '_', f"{url.path}_{url.query}").strip('_') or 'index'
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}.html")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.driver.page_source)
+        print(f"✓ Saved snapshot {path}")
+        return path
 
     def _scroll_to_bottom(self):
-        """Scroll to bottom to load lazy-loaded content"""
-        last_height = self.driver.execute_script("return document.body.scrollHeight")
+        """Scroll to bottom to load lazy-loaded content
+        
+        After each scroll, continue as soon as the page grows; stop once it
+        hasn't grown for SCROLL_WAIT_SECONDS.
+        """
+        height_script = "return document.body.scrollHeight"
+        last_height = self.driver.execute_script(height_script)
         
         while True:
             self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time_module.sleep(1)
-            new_height = self.driver.execute_script("return document.body.scrollHeight")
-            if new_height == last_height:
+            try:
+                WebDriverWait(self.driver, SCROLL_WAIT_SECONDS, poll_frequency=0.1).until(
+                    lambda d: d.execute_script(height_script) > last_height
+                )
+            except TimeoutException:
                 break
-            last_height = new_height
+            last_height = self.driver.execute_script(height_script)
 
-    def save_to_database(self):
-        """Save scraped courses to database for calendar heatmap"""
+    def scrape_parallel(self, shards, workers=4):
+        """
+        Scrape several catalogue pages/departments at once
+        
+        shards is a list of course page paths (see navigate_to_courses). Each
+        worker runs its own logged-in browser session and takes the next
+        unscraped shard until none are left. Results are merged into
+        self.courses in shard order, keeping the first entry per course code.
+        Shards that could not be scraped completely are left out and listed
+        in self.failed_shards.
+        """
+        pending = queue.Queue()
+        for index, path in enumerate(shards):
+            pending.put((index, path))
+        results = {}
+        
+        def run_worker(worker_id):
+            worker = CourseScheduleScraper(headless=self.headless, snapshot_dir=self.snapshot_dir,
+                                           stream=self.stream)
+            try:
+                if not worker.login():
+                    print(f"✗ Worker {worker_id}: login failed")
+                    return
+                while True:
+                    try:
+                        index, path = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    worker.navigate_to_courses(path)
+                    courses = worker.scrape_courses()
+                    if courses is not None:
+                        results[index] = courses
+            finally:
+                worker.close()
+        
+        workers = max(1, min(workers, len(shards)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run_worker, range(workers)))
+        
+        missing = [shards[i] for i in range(len(shards)) if i not in results]
+        if missing:
+            print(f"✗ {len(missing)} shard(s) not scraped: {', '.join(missing)}")
+        self.failed_shards = missing
+        
+        seen = {course['course_code'] for course in self.courses}
+        for index in sorted(results):
+            for course in results[index]:
+                if course['course_code'] not in seen:
+                    seen.add(course['course_code'])
+                    self.courses.append(course)
+        return self.courses
+
+    def save_to_database(self, remove_missing=False):
+        """Save changed courses to database for calendar heatmap"""
         app = create_app()
         
         with app.app_context():
             print("\n💾 Saving to database...")
-            saved_count = 0
-            
-            for course_data in self.courses:
-                try:
-                    # Check if course already exists
-                    existing = Course.query.filter_by(
-                        course_code=course_data['course_code']
-                    ).first()
-                    
-                    if existing:
-                        # Update existing course
-                        existing.course_name = course_data['course_name']
-                        existing.schedule_raw = course_data['schedule_raw']
-                        existing.students_enrolled = course_data['students_enrolled']
-                        existing.updated_at = datetime.utcnow()
-                        print(f"  Updated: {course_data['course_code']}")
-                    else:
-                        # Create new course
-                        course = Course(
-                            course_code=course_data['course_code'],
-                            course_name=course_data['course_name'],
-                            schedule_raw=course_data['schedule_raw'],
-                            students_enrolled=course_data['students_enrolled']
-                        )
-                        db.session.add(course)
-                        print(f"  Added: {course_data['course_code']}")
-                    
-                    # Create time slots for calendar heatmap
-                    if existing:
-                        # Delete old time slots
-                        TimeSlot.query.filter_by(course_code=existing.course_code).delete()
-                    
-                    for day in course_data['days']:
-                        if course_data['start_time'] and course_data['end_time']:
-                            time_slot = TimeSlot(
-                                course_code=course_data['course_code'],
-                                day_of_week=day,
-                                start_time=datetime.strptime(course_data['start_time'], '%H:%M').time(),
-                                end_time=datetime.strptime(course_data['end_time'], '%H:%M').time(),
-                                students_count=course_data['students_enrolled']
-                            )
-                            db.session.add(time_slot)
-                    
-                    saved_count += 1
-                    
-                except Exception as e:
-                    print(f"  ✗ Error saving {course_data.get('course_code', 'UNKNOWN')}: {e}")
-            
+            result = upsert_courses(self.courses, remove_missing=remove_missing)
+
+            for code, error in result['skipped'].items():
+                print(f"  ✗ Error saving {code or 'UNKNOWN'}: {error}")
+            for label in ('added', 'changed', 'removed'):
+                if result[label]:
+                    print(f"  {label.capitalize()}: {', '.join(result[label])}")
+            print(f"\n✓ {len(result['added'])} added, {len(result['changed'])} changed, "
+                  f"{len(result['removed'])} removed{'' if remove_missing else ' (kept)'}, "
+                  f"{result['unchanged']} unchanged")
+
+            if not (result['added'] or result['changed'] or (remove_missing and result['removed'])):
+                print("✓ No course changes, calendar cache left as is")
+                return result
+
+            # Invalidate cached calendar responses in the API
+            version = bump_data_version('calendar')
             db.session.commit()
-            print(f"\n✓ Saved {saved_count} courses to database")
+            print(f"✓ Calendar data version is now {version}")
+            return result
 
     def save_to_json(self, filename='courses_data.json'):
         """Save to JSON file as backup"""
@@ -344,7 +396,9 @@ class CourseScheduleScraper:
 
     def close(self):
         """Close the browser"""
-        self.driver.quit()
+        if self.driver:
+            self.driver.quit()
+            self.driver = None
 
 
 def main():
@@ -353,31 +407,80 @@ def main():
     print("Course Schedule Scraper for Calendar Heatmap")
     print("=" * 60)
     
+    # Comma separated course page paths to scrape in parallel, e.g.
+    # COURSES_SHARDS=/courses?page=1,/courses?page=2
+    shards = [path.strip() for path in os.getenv('COURSES_SHARDS', '').split(',') if path.strip()]
+    workers = int(os.getenv('SCRAPER_WORKERS') or 4)
+    
+    # Pruning removed courses needs the whole catalogue at once; otherwise
+    # courses are saved in batches as they are scraped
+    prune = os.getenv('PRUNE_REMOVED_COURSES') == '1'
+    stream = None
+    if not prune:
+        stream = CourseStream('courses_data.ndjson', batch_size=int(os.getenv('SCRAPER_BATCH_SIZE') or 100))
+    
     # Set headless=False to see the browser (useful for debugging)
-    scraper = CourseScheduleScraper(headless=False)
+    scraper = CourseScheduleScraper(headless=False, start_browser=not shards,
+                                    snapshot_dir=os.getenv('SNAPSHOT_DIR') or None, stream=stream)
     
     try:
-        # Step 1: Login
-        print("\n📝 Step 1: Logging in...")
-        if not scraper.login():
-            print("✗ Login failed. Check credentials in .env file")
-            return
-        
-        # Step 2: Navigate to courses
-        print("\n📚 Step 2: Navigating to courses...")
-        scraper.navigate_to_courses()
-        
-        # Step 3: Scrape courses
-        print("\n🔍 Step 3: Scraping course schedules...")
-        scraper.scrape_courses()
+        if shards:
+            # Steps 1-3 in parallel: each worker logs in and scrapes shards
+            print(f"\n🔍 Scraping {len(shards)} course pages with {workers} browser sessions...")
+            scraper.scrape_parallel(shards, workers=workers)
+        else:
+            # Step 1: Login
+            print("\n📝 Step 1: Logging in...")
+            if not scraper.login():
+                print("✗ Login failed. Check credentials in .env file")
+                return
+            
+            # Step 2: Navigate to courses
+            print("\n📚 Step 2: Navigating to courses...")
+            scraper.navigate_to_courses()
+            
+            # Step 3: Scrape courses
+            print("\n🔍 Step 3: Scraping course schedules...")
+            if scraper.scrape_courses() is None and not stream:
+                print("✗ The course page could not be scraped completely; nothing saved")
+                return
         
+        if stream:
+            if scraper.failed_shards:
+                # keep the checkpoint so the next run picks up where this one stopped
+                stream.save()
+                print("✗ Run again to resume the remaining shards")
+                return
+            
+            # Steps 4-5 happened batch by batch; save the rest
+            print("\n💾 Saving the last batch...")
+            totals = stream.finish()
+            if totals['failed']:
+                return
+            if not totals['courses']:
+                print("✗ No courses found. Check selectors in scraper.py")
+                return
+            
+            print("\n" + "=" * 60)
+            print("✓ Scraping complete!")
+            print(f"  Total courses: {totals['courses']} in {totals['batches']} batches "
+                  f"({totals['added']} added, {totals['changed']} changed)")
+            print(f"  Data saved to database and {stream.path}")
+            print("=" * 60)
+            return
+
+        if scraper.failed_shards:
+            # pruning would delete every course on the missing pages
+            print("✗ Some course pages could not be scraped; nothing saved")
+            return
+
         if not scraper.courses:
             print("✗ No courses found. Check selectors in scraper.py")
             return
         
         # Step 4: Save to database
         print(f"\n💾 Step 4: Saving {len(scraper.courses)} courses to database...")
-        scraper.save_to_database()
+        scraper.save_to_database(remove_missing=prune)
         
         # Step 5: Save backup
         print("\n📄 Step 5: Creating JSON backup...")
@@ -0,0 +1,140 @@
+"""
+Streaming output for the course scraper
+Writes course records to an NDJSON file and the database in fixed-size
+batches as they are extracted, so memory is bounded by the batch size and an
+interrupted run resumes after its last committed batch
+"""
+
+import json
+import os
+import threading
+
+from app import create_app, db
+from app.cache import bump_data_version
+from app.course_import import upsert_courses
+
+
+class CourseStream:
+    """
+    Batches scraped courses into the database and an NDJSON file
+
+    After every batch a checkpoint file next to the NDJSON file records, per
+    course page, how many course entries are saved, plus the NDJSON size. If
+    the checkpoint exists when a stream is opened the run resumes: the NDJSON
+    file is cut back to the last batch and scrape_courses skips the entries
+    already saved. finish() removes the checkpoint, unless a page failed
+    during the run (see fail), in which case the next run resumes.
+
+    Safe to share between the browser sessions of scrape_parallel.
+    """
+
+    def __init__(self, path='courses_data.ndjson', batch_size=100, app=None):
+        self.path = path
+        self.checkpoint_path = f"{path}.checkpoint"
+        self.batch_size = batch_size
+        self.app = app or create_app()
+        self.lock = threading.Lock()
+        # (page, index, course) entries not yet saved
+        self.buffer = []
+        # pages that errored in this run; a resumed run retries them
+        self.failed_pages = set()
+
+        self.resumed = os.path.exists(self.checkpoint_path)
+        if self.resumed:
+            with open(self.checkpoint_path) as f:
+                self.state = json.load(f)
+            # a batch that was being written when the run stopped may have
+            # changed courses, so the calendar cache has to be refreshed
+            self.state['dirty'] = self.state['dirty'] or self.state.pop('in_flight', False)
+            with open(self.path, 'a') as f:
+                f.truncate(self.state['ndjson_bytes'])
+            print(f"↻ Resuming after {self.state['courses']} saved courses ({self.state['batches']} batches)")
+        else:
+            self.state = {'pages': {}, 'batches': 0, 'courses': 0, 'added': 0, 'changed': 0,
+                          'dirty': False, 'ndjson_bytes': 0}
+            open(self.path, 'w').close()
+
+    def saved(self, page):
+        """Number of leading course entries on page saved by earlier batches"""
+        return self.state['pages'].get(page, 0)
+
+    def add(self, page, index, course):
+        """Queue the course found at entry index of page; saves full batches"""
+        with self.lock:
+            self.buffer.append((page, index, course))
+            if len(self.buffer) >= self.batch_size:
+                self._flush()
+
+    def fail(self, page):
+        """Record that page could not be scraped completely, so finish()
+        keeps the checkpoint"""
+        with self.lock:
+            self.failed_pages.add(page)
+
+    def _write_checkpoint(self):
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        batch, self.buffer = self.buffer, []
+        courses = [course for _, _, course in batch]
+
+        # recorded before the commit so a crash mid-batch still refreshes the cache
+        self.state['in_flight'] = True
+        self._write_checkpoint()
+        with self.app.app_context():
+            result = upsert_courses(courses, partial=True)
+        for code, error in result['skipped'].items():
+            print(f"  ✗ Error saving {code or 'UNKNOWN'}: {error}")
+
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for course in courses:
+                f.write(json.dumps(course) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+            self.state['ndjson_bytes'] = f.tell()
+
+        for page, index, _ in batch:
+            self.state['pages'][page] = max(self.saved(page), index + 1)
+        self.state['batches'] += 1
+        self.state['courses'] += len(courses)
+        self.state['added'] += len(result['added'])
+        self.state['changed'] += len(result['changed'])
+        self.state['dirty'] = self.state['dirty'] or bool(result['added'] or result['changed'])
+        self.state.pop('in_flight')
+        self._write_checkpoint()
+        print(f"  ✓ Batch {self.state['batches']}: {len(courses)} courses "
+              f"({len(result['added'])} added, {len(result['changed'])} changed)")
+
+    def save(self):
+        """Save the queued courses now, keeping the run resumable"""
+        with self.lock:
+            self._flush()
+
+    def finish(self):
+        """Save the last partial batch, refresh the calendar cache if anything
+        changed and remove the checkpoint, or keep it if any page failed.
+        Returns the run totals, with the failed pages."""
+        with self.lock:
+            self._flush()
+            if self.state['dirty']:
+                with self.app.app_context():
+                    version = bump_data_version('calendar')
+                    db.session.commit()
+                self.state['dirty'] = False
+                print(f"✓ Calendar data version is now {version}")
+            else:
+                print("✓ No course changes, calendar cache left as is")
+            if self.failed_pages:
+                self._write_checkpoint()
+                print(f"✗ {len(self.failed_pages)} page(s) failed; run again to resume: "
+                      f"{', '.join(sorted(self.failed_pages))}")
+            elif os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
+            totals = {key: self.state[key] for key in ('batches', 'courses', 'added', 'changed')}
+            totals['failed'] = sorted(self.failed_pages)
+            return totals
@@ -1,7 +1,9 @@
 import os
 import io
 import pytest
+from contextlib import contextmanager
 from flask import url_for
+from sqlalchemy import event
 
 # Ensure tests use in-memory sqlite
 os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
@@ -57,6 +59,27 @@ def create_token_for(user_uid):
     return create_access_token(identity=user_uid)
 
 
+@pytest.fixture
+def count_queries(app, db):
+    """Context manager that records every SQL statement sent to the engine."""
+    @contextmanager
+    def _count():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    return _count
+
+
 @pytest.fixture
 def helpers(app, db):
     class H:
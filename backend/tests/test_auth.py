@@ -52,3 +52,26 @@ def test_me_with_token(client):
     assert resp.status_code == 200
     data = resp.get_json()
     assert data.get('email') == 'dana@example.com'
+
+
+def test_login_rehashes_when_method_changes(app, client, db):
+    from app.models import User
+
+    client.post('/auth/register', json={'name': 'Eve', 'email': 'eve-rehash@example.com', 'password': 'pw'})
+    hasher = app.extensions['password_hasher']
+    original = (hasher.method, hasher.workers, hasher._prefix)
+    try:
+        hasher.method, hasher.workers, hasher._prefix = 'pbkdf2:sha256:1000', 2, None
+        resp = client.post('/auth/login', json={'email': 'eve-rehash@example.com', 'password': 'pw'})
+        assert resp.status_code == 200
+        with app.app_context():
+            stored = User.query.filter_by(email='eve-rehash@example.com').one().password_hash
+        assert stored.startswith('pbkdf2:sha256:1000$')
+
+        # the upgraded hash verifies and is left alone on the next login
+        assert client.post('/auth/login', json={'email': 'eve-rehash@example.com', 'password': 'pw'}).status_code == 200
+        with app.app_context():
+            assert User.query.filter_by(email='eve-rehash@example.com').one().password_hash == stored
+        assert client.post('/auth/login', json={'email': 'eve-rehash@example.com', 'password': 'no'}).status_code == 401
+    finally:
+        hasher.method, hasher.workers, hasher._prefix = original
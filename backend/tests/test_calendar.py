@@ -0,0 +1,141 @@
+import pytest
+from datetime import time
+
+from app.cache import bump_data_version
+from app.models import Course, TimeSlot
+
+
+def _add_course(db, code, day, start, end, students):
+    db.session.add(Course(course_code=code, course_name=code, schedule_raw='', students_enrolled=students))
+    db.session.add(TimeSlot(course_code=code, day_of_week=day, start_time=start, end_time=end, students_count=students))
+    db.session.commit()
+
+
+def test_heatmap_cached_until_data_version_bump(app, client, db, count_queries):
+    with app.app_context():
+        _add_course(db, 'CACHE-101', 'Monday', time(10, 0), time(11, 30), 40)
+
+    first = client.get('/calendar/heatmap')
+    assert first.status_code == 200
+    assert first.get_json()['success'] is True
+
+    with count_queries() as statements:
+        again = client.get('/calendar/heatmap')
+    assert statements == []
+    assert again.data == first.data
+
+    with app.app_context():
+        _add_course(db, 'CACHE-102', 'Friday', time(16, 0), time(17, 0), 25)
+        # without a bump the cached body is still served
+        assert client.get('/calendar/heatmap').data == first.data
+        bump_data_version('calendar')
+        db.session.commit()
+
+    days = {slot['day'] for slot in client.get('/calendar/heatmap').get_json()['data']}
+    assert 'Friday' in days
+
+
+def test_data_version_memo_dropped_on_commit_only(app, db):
+    from app.cache import data_version
+
+    with app.app_context():
+        assert data_version('memo-test') == 0
+        assert bump_data_version('memo-test') == 1
+        db.session.rollback()
+        assert data_version('memo-test') == 0
+
+        # first bumps insert the row with an upsert, later ones increment it
+        assert bump_data_version('memo-test') == 1
+        assert bump_data_version('memo-test') == 2
+        db.session.commit()
+        assert data_version('memo-test') == 2
+
+
+def test_calendar_stats_and_optimal_times(client):
+    stats = client.get('/calendar/stats')
+    assert stats.status_code == 200
+    assert stats.get_json()['stats']['total_courses'] >= 0
+
+    optimal = client.get('/calendar/optimal-times')
+    assert optimal.status_code == 200
+    assert 'optimal_times' in optimal.get_json()
+
+
+def test_occupancy_grid_sums_overlapping_slots():
+    from app.occupancy import occupancy_grid, slot_arrays
+
+    rows = [
+        ('Tuesday', time(10, 0), time(11, 30), 30),
+        ('Tuesday', time(11, 0), time(12, 20), 20),
+        ('Tuesday', time(9, 0), time(9, 0), 99),  # zero length, ignored
+        ('Someday', time(9, 0), time(10, 0), 99),  # unknown day, ignored
+    ]
+    grid = occupancy_grid(*slot_arrays(rows), bucket_minutes=30)
+    assert grid.shape == (7, 48)
+    tuesday = grid[1]
+    assert tuesday[19] == 0              # 09:30
+    assert tuesday[20] == 30             # 10:00
+    assert tuesday[22] == 50             # 11:00, both courses
+    assert tuesday[23] == 20             # 11:30
+    assert tuesday[24] == 20             # 12:00, second course ends 12:20
+    assert tuesday[25] == 0
+    assert grid.sum() == tuesday.sum()
+
+
+def test_heatmap_bucket_resolution(app, client, db):
+    with app.app_context():
+        _add_course(db, 'GRID-101', 'Sunday', time(10, 0), time(11, 30), 30)
+        _add_course(db, 'GRID-102', 'Sunday', time(11, 0), time(12, 20), 20)
+        bump_data_version('calendar')
+        db.session.commit()
+
+    hourly = client.get('/calendar/heatmap?bucket=60').get_json()
+    assert hourly['bucket_minutes'] == 60
+    sunday = hourly['grid'][hourly['days'].index('Sunday')]
+    assert len(sunday) == 24
+    assert sunday[10:13] == [30, 50, 20]
+    eleven = [s for s in hourly['data'] if s['day'] == 'Sunday' and s['start_time'] == '11:00'][0]
+    assert eleven == {'day': 'Sunday', 'start_time': '11:00', 'end_time': '12:00', 'total_students': 50, 'course_count': 2, 'density': 50}
+
+    assert len(client.get('/calendar/heatmap?bucket=5').get_json()['grid'][0]) == 288
+    assert client.get('/calendar/heatmap?bucket=7').status_code == 400
+    assert client.get('/calendar/heatmap?bucket=abc').status_code == 400
+
+
+def test_find_free_windows_ranks_quiet_distinct_windows():
+    from app.occupancy import find_free_windows, occupancy_grid, slot_arrays
+
+    rows = [
+        ('Tuesday', time(9, 0), time(12, 0), 100),
+        ('Tuesday', time(13, 0), time(14, 0), 10),
+        ('Wednesday', time(9, 0), time(21, 0), 200),
+    ]
+    grid = occupancy_grid(*slot_arrays(rows), bucket_minutes=5)
+    windows = find_free_windows(grid, 5, 90, [1, 2], 9 * 60, 21 * 60, limit=3)
+
+    assert [(w['day'], w['peak']) for w in windows] == [(1, 0), (1, 0), (1, 0)]
+    starts = sorted(w['start_minute'] for w in windows)
+    # distinct, non-overlapping windows avoiding the 9-12 and 13-14 classes
+    assert all(b - a >= 90 for a, b in zip(starts, starts[1:]))
+    assert all(s >= 14 * 60 for s in starts)
+
+    assert find_free_windows(grid, 5, 90, [2], 9 * 60, 21 * 60, max_busy=150) == []
+
+
+def test_free_windows_endpoint(app, client, db):
+    with app.app_context():
+        _add_course(db, 'FREE-101', 'Thursday', time(8, 0), time(20, 0), 500)
+        _add_course(db, 'FREE-102', 'Thursday', time(20, 0), time(22, 0), 5)
+        bump_data_version('calendar')
+        db.session.commit()
+
+    resp = client.get('/calendar/free-windows?duration=90&days=thu&start_hour=8&end_hour=22&limit=2')
+    assert resp.status_code == 200
+    windows = resp.get_json()['windows']
+    assert windows[0] == {'day': 'Thursday', 'start_time': '20:00', 'end_time': '21:30', 'peak_students': 5, 'average_students': 5.0}
+
+    none = client.get('/calendar/free-windows?duration=90&days=thu&max_busy=1').get_json()['windows']
+    assert none == []
+
+    assert client.get('/calendar/free-windows?days=blursday').status_code == 400
+    assert client.get('/calendar/free-windows?start_hour=20&end_hour=9').status_code == 400
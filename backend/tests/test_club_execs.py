@@ -65,3 +65,144 @@ def test_remove_exec_success_and_forbidden(client):
     norm_token = client.post('/auth/login', json={'email': 'norm2@example.com', 'password': 'pw'}).get_json()['access_token']
     bad = client.delete(f'/clubs/{club_uid}/execs/{user_uid}', headers={'Authorization': f'Bearer {norm_token}'})
     assert bad.status_code in (403, 404)
+
+
+def test_membership_cache_follows_promote_and_demote(app, client, count_queries):
+    from app.cache import SimpleCache
+
+    app.extensions['membership_cache'] = SimpleCache(max_entries=16)
+    try:
+        founder = client.post('/auth/register', json={'name': 'F', 'email': 'cache-founder@example.com', 'password': 'pw'}).get_json()
+        member = client.post('/auth/register', json={'name': 'M', 'email': 'cache-member@example.com', 'password': 'pw'}).get_json()
+        founder_headers = {'Authorization': f"Bearer {founder['access_token']}"}
+        member_headers = {'Authorization': f"Bearer {member['access_token']}"}
+        club_uid = client.post('/clubs/', json={'name': 'Cache Club'}, headers=founder_headers).get_json()['uid']
+        assert client.post(f'/clubs/{club_uid}/join', headers=member_headers).status_code == 201
+
+        # warm the member's cache entry, then promote them
+        assert client.put(f'/clubs/{club_uid}', json={'description': 'x'}, headers=member_headers).status_code == 403
+        client.post(f'/clubs/{club_uid}/execs', json={'email': 'cache-member@example.com'}, headers=founder_headers)
+
+        # the promotion dropped the stale entry; it is reloaded once, then reused
+        assert client.put(f'/clubs/{club_uid}', json={'description': 'y'}, headers=member_headers).status_code == 200
+        with count_queries() as statements:
+            assert client.put(f'/clubs/{club_uid}', json={'description': 'z'}, headers=member_headers).status_code == 200
+        assert not any('club_members' in s for s in statements)
+
+        assert client.delete(f"/clubs/{club_uid}/execs/{member['uid']}", headers=founder_headers).status_code == 200
+        assert client.put(f'/clubs/{club_uid}', json={'description': 'w'}, headers=member_headers).status_code == 403
+
+        assert client.post(f'/clubs/{club_uid}/leave', headers=member_headers).status_code == 200
+        assert client.post(f'/clubs/{club_uid}/leave', headers=member_headers).status_code == 400
+    finally:
+        del app.extensions['membership_cache']
+
+
+def test_exec_writes_authorize_from_token_claims(app, client, count_queries):
+    app.config['JWT_MEMBERSHIP_CLAIMS'] = True
+    try:
+        client.post('/auth/register', json={'name': 'F', 'email': 'claims-founder@example.com', 'password': 'pw'})
+        founder_token = client.post('/auth/login', json={'email': 'claims-founder@example.com', 'password': 'pw'}).get_json()['access_token']
+        founder_headers = {'Authorization': f'Bearer {founder_token}'}
+        club_uid = client.post('/clubs/', json={'name': 'Claims Club'}, headers=founder_headers).get_json()['uid']
+
+        client.post('/auth/register', json={'name': 'E', 'email': 'claims-exec@example.com', 'password': 'pw'})
+        client.post(f'/clubs/{club_uid}/execs', json={'email': 'claims-exec@example.com'}, headers=founder_headers)
+        login = client.post('/auth/login', json={'email': 'claims-exec@example.com', 'password': 'pw'}).get_json()
+        exec_headers = {'Authorization': f"Bearer {login['access_token']}"}
+
+        client.put(f'/clubs/{club_uid}', json={'description': 'a'}, headers=exec_headers)
+        with count_queries() as statements:
+            assert client.put(f'/clubs/{club_uid}', json={'description': 'b'}, headers=exec_headers).status_code == 200
+        assert not any('club_members' in s for s in statements)
+        # per-user versions are memoized apart from cached responses
+        version_key = f"data-version:membership:{login['uid']}"
+        assert app.extensions['membership_versions'].get(version_key) is not None
+        assert app.extensions['cache'].get(version_key) is None
+
+        # demotion bumps the membership version, so the old token's claims are ignored
+        assert client.delete(f"/clubs/{club_uid}/execs/{login['uid']}", headers=founder_headers).status_code == 200
+        assert client.put(f'/clubs/{club_uid}', json={'description': 'c'}, headers=exec_headers).status_code == 403
+
+        # the founder's token predates creating the club; the database still authorizes it
+        assert client.put(f'/clubs/{club_uid}', json={'description': 'd'}, headers=founder_headers).status_code == 200
+        refreshed = client.post('/auth/token', headers=founder_headers).get_json()['access_token']
+        with count_queries() as statements:
+            resp = client.put(f'/clubs/{club_uid}', json={'description': 'e'}, headers={'Authorization': f'Bearer {refreshed}'})
+        assert resp.status_code == 200
+        assert not any('club_members' in s for s in statements)
+    finally:
+        app.config['JWT_MEMBERSHIP_CLAIMS'] = False
+
+
+def test_token_claims_are_minted_from_the_database(app, client):
+    from flask_jwt_extended import decode_token
+    from app import db
+    from app.authz import bump_membership_version
+    from app.cache import SimpleCache
+    from app.models import ClubMember
+
+    app.config['JWT_MEMBERSHIP_CLAIMS'] = True
+    app.extensions['membership_cache'] = SimpleCache(max_entries=16)
+    try:
+        founder = client.post('/auth/register', json={'name': 'F', 'email': 'mint-founder@example.com', 'password': 'pw'}).get_json()
+        member = client.post('/auth/register', json={'name': 'M', 'email': 'mint-member@example.com', 'password': 'pw'}).get_json()
+        founder_headers = {'Authorization': f"Bearer {founder['access_token']}"}
+        club_uid = client.post('/clubs/', json={'name': 'Mint Club'}, headers=founder_headers).get_json()['uid']
+        client.post(f'/clubs/{club_uid}/execs', json={'email': 'mint-member@example.com'}, headers=founder_headers)
+        refreshed = client.post('/auth/token', headers={'Authorization': f"Bearer {member['access_token']}"}).get_json()
+        member_headers = {'Authorization': f"Bearer {refreshed['access_token']}"}
+        # warms this process's membership cache with the exec entry
+        assert client.put(f'/clubs/{club_uid}', json={'description': 'x'}, headers=member_headers).status_code == 200
+
+        # another process demotes the member; this process's cache entry is now stale
+        with app.app_context():
+            ClubMember.query.filter_by(user_uid=member['uid'], club_uid=club_uid).update({'type': 'member'})
+            bump_membership_version(member['uid'])
+            db.session.commit()
+
+        token = client.post('/auth/token', headers=member_headers).get_json()['access_token']
+        with app.app_context():
+            assert club_uid not in decode_token(token)['exec_clubs']
+    finally:
+        app.config['JWT_MEMBERSHIP_CLAIMS'] = False
+        del app.extensions['membership_cache']
+
+
+def test_join_and_leave_ignore_stale_cached_memberships(app, client):
+    from datetime import datetime, timedelta
+    from app import db
+    from app.cache import SimpleCache
+    from app.models import ClubDailyMetric, ClubMember
+
+    app.extensions['membership_cache'] = SimpleCache(max_entries=16)
+    try:
+        founder = client.post('/auth/register', json={'name': 'F', 'email': 'stale-founder@example.com', 'password': 'pw'}).get_json()
+        member = client.post('/auth/register', json={'name': 'M', 'email': 'stale-member@example.com', 'password': 'pw'}).get_json()
+        founder_headers = {'Authorization': f"Bearer {founder['access_token']}"}
+        member_headers = {'Authorization': f"Bearer {member['access_token']}"}
+        club_uid = client.post('/clubs/', json={'name': 'Stale Club'}, headers=founder_headers).get_json()['uid']
+        start = (datetime.utcnow() + timedelta(days=1)).isoformat()
+        event_uid = client.post('/events/', json={'name': 'Stale Event', 'start_datetime': start, 'type': 'online', 'club_uid': club_uid}, headers=founder_headers).get_json()['uid']
+
+        # caches "not a member", then another process adds the membership
+        assert client.post(f'/events/{event_uid}/join', headers=member_headers).status_code == 403
+        with app.app_context():
+            db.session.add(ClubMember(user_uid=member['uid'], club_uid=club_uid, type='member'))
+            db.session.commit()
+        assert client.post(f'/clubs/{club_uid}/join', headers=member_headers).status_code == 400
+
+        # once the entry expires "member" is cached, then another process
+        # removes the membership; leaving records nothing
+        app.extensions['membership_cache'].clear()
+        assert client.post(f'/events/{event_uid}/join', headers=member_headers).status_code in (200, 201)
+        with app.app_context():
+            ClubMember.query.filter_by(user_uid=member['uid'], club_uid=club_uid).delete()
+            db.session.commit()
+            leaves = db.session.get(ClubDailyMetric, (club_uid, datetime.utcnow().date())).leaves
+        assert client.post(f'/clubs/{club_uid}/leave', headers=member_headers).status_code == 400
+        with app.app_context():
+            assert ClubMember.query.filter_by(user_uid=member['uid'], club_uid=club_uid).count() == 0
+            assert db.session.get(ClubDailyMetric, (club_uid, datetime.utcnow().date())).leaves == leaves
+    finally:
+        del app.extensions['membership_cache']
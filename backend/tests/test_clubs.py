@@ -34,3 +34,97 @@ def test_club_members_list(client):
     arr = members.get_json()
     assert isinstance(arr, list)
     assert any(m.get('type') == 'exec' for m in arr)
+
+
+def test_list_clubs_member_counts_constant_queries(client, count_queries):
+    r = client.post('/auth/register', json={'name': 'Lister', 'email': 'lister@example.com', 'password': 'pw'})
+    token = r.get_json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    club_uids = []
+    for i in range(5):
+        resp = client.post('/clubs/', json={'name': f'Listed Club {i}'}, headers=headers)
+        club_uids.append(resp.get_json()['uid'])
+
+    # a second user joins one of the clubs
+    r2 = client.post('/auth/register', json={'name': 'Joiner', 'email': 'joiner@example.com', 'password': 'pw'})
+    client.post(f'/clubs/{club_uids[0]}/join', headers={'Authorization': f"Bearer {r2.get_json()['access_token']}"})
+
+    with count_queries() as statements:
+        resp = client.get('/clubs/')
+    assert resp.status_code == 200
+    assert len(statements) == 1
+
+    counts = {c['uid']: c['member_count'] for c in resp.get_json()}
+    assert counts[club_uids[0]] == 2
+    assert all(counts[uid] == 1 for uid in club_uids[1:])
+
+
+def test_club_stats_members_by_day_and_attendance(client, count_queries):
+    from datetime import datetime, timedelta
+
+    r = client.post('/auth/register', json={'name': 'Stats Founder', 'email': 'statsfounder@example.com', 'password': 'pw'})
+    headers = {'Authorization': f"Bearer {r.get_json()['access_token']}"}
+    club_uid = client.post('/clubs/', json={'name': 'Stats Club'}, headers=headers).get_json()['uid']
+
+    r2 = client.post('/auth/register', json={'name': 'Stats Member', 'email': 'statsmember@example.com', 'password': 'pw'})
+    member_headers = {'Authorization': f"Bearer {r2.get_json()['access_token']}"}
+    client.post(f'/clubs/{club_uid}/join', headers=member_headers)
+
+    start = (datetime.utcnow() + timedelta(days=1)).isoformat()
+    for i in range(3):
+        ev = client.post('/events/', json={'name': f'Stats Event {i}', 'start_datetime': start, 'type': 'online', 'club_uid': club_uid}, headers=headers)
+        if i == 0:
+            client.post(f"/events/{ev.get_json()['uid']}/join", headers=member_headers)
+
+    with count_queries() as statements:
+        resp = client.get(f'/clubs/{club_uid}/stats')
+    assert resp.status_code == 200
+    assert len(statements) == 6
+
+    data = resp.get_json()
+    assert data['total_members'] == 2
+    assert data['exec_count'] == 1
+    assert len(data['members_by_day']) == 30
+    assert data['members_by_day'][-1] == {'date': datetime.utcnow().date().isoformat(), 'count': 2}
+    assert sum(d['count'] for d in data['members_by_day']) == 2
+    attendance = {a['name']: a['count'] for a in data['attendance_by_event']}
+    assert attendance == {'Stats Event 0': 1, 'Stats Event 1': 0, 'Stats Event 2': 0}
+
+
+def test_club_daily_metrics_incremental_and_rebuild(app, client, db):
+    from datetime import datetime, timedelta
+    from app.models import ClubDailyMetric
+
+    r = client.post('/auth/register', json={'name': 'Rollup Founder', 'email': 'rollupfounder@example.com', 'password': 'pw'})
+    headers = {'Authorization': f"Bearer {r.get_json()['access_token']}"}
+    club_uid = client.post('/clubs/', json={'name': 'Rollup Club'}, headers=headers).get_json()['uid']
+
+    r2 = client.post('/auth/register', json={'name': 'Rollup Member', 'email': 'rollupmember@example.com', 'password': 'pw'})
+    member_headers = {'Authorization': f"Bearer {r2.get_json()['access_token']}"}
+    client.post(f'/clubs/{club_uid}/join', headers=member_headers)
+
+    start = (datetime.utcnow() + timedelta(days=1)).isoformat()
+    ev = client.post('/events/', json={'name': 'Rollup Event', 'start_datetime': start, 'type': 'online', 'club_uid': club_uid}, headers=headers)
+    client.post(f"/events/{ev.get_json()['uid']}/join", headers=member_headers)
+    # a signup that is withdrawn and an event that is deleted leave no trace
+    other = client.post('/events/', json={'name': 'Rollup Event 2', 'start_datetime': start, 'type': 'online', 'club_uid': club_uid}, headers=headers)
+    client.post(f"/events/{other.get_json()['uid']}/join", headers=member_headers)
+    client.post(f"/events/{other.get_json()['uid']}/join", headers=headers)
+    client.post(f"/events/{other.get_json()['uid']}/leave", headers=headers)
+    client.delete(f"/events/{other.get_json()['uid']}", headers=headers)
+    client.post(f'/clubs/{club_uid}/leave', headers=member_headers)
+
+    today = datetime.utcnow().date()
+    with app.app_context():
+        metric = db.session.get(ClubDailyMetric, (club_uid, today))
+        # the member who left is no longer counted as a join; their leave is
+        assert (metric.joins, metric.leaves, metric.event_signups, metric.events_created) == (1, 1, 1, 1)
+        members_by_day = client.get(f'/clubs/{club_uid}/stats').get_json()['members_by_day']
+
+    result = app.test_cli_runner().invoke(args=['rebuild-club-metrics'])
+    assert result.exit_code == 0
+
+    with app.app_context():
+        metric = db.session.get(ClubDailyMetric, (club_uid, today))
+        assert (metric.joins, metric.leaves, metric.event_signups, metric.events_created) == (1, 1, 1, 1)
+    assert client.get(f'/clubs/{club_uid}/stats').get_json()['members_by_day'] == members_by_day
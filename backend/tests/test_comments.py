@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+
+
+def _event_with_user(client, name, email):
+    r = client.post('/auth/register', json={'name': name, 'email': email, 'password': 'pw'})
+    headers = {'Authorization': f"Bearer {r.get_json()['access_token']}"}
+    start = (datetime.utcnow() + timedelta(days=1)).isoformat()
+    ev = client.post('/events/', json={'name': f'{name} Event', 'start_datetime': start, 'type': 'online'}, headers=headers)
+    return ev.get_json()['uid'], headers
+
+
+def test_comment_tree_one_query_per_reply_level(client, count_queries):
+    event_uid, headers = _event_with_user(client, 'Commenter', 'commenter@example.com')
+
+    first = client.post('/comments/', json={'event_uid': event_uid, 'content': 'first'}, headers=headers).get_json()
+    second = client.post('/comments/', json={'event_uid': event_uid, 'content': 'second'}, headers=headers).get_json()
+    reply = client.post(f"/comments/{first['uid']}/reply", json={'content': 'reply'}, headers=headers).get_json()
+    client.post(f"/comments/{reply['uid']}/reply", json={'content': 'nested'}, headers=headers)
+    client.post(f"/comments/{first['uid']}/reply", json={'content': 'reply 2'}, headers=headers)
+
+    with count_queries() as statements:
+        resp = client.get(f'/comments/event/{event_uid}')
+    assert resp.status_code == 200
+    # event lookup, the page of top-level comments, then at most one query per
+    # reply level (default depth 3, plus one to count replies below the last level)
+    assert len(statements) <= 2 + 4
+
+    tree = resp.get_json()['comments']
+    assert [c['content'] for c in tree] == ['second', 'first']
+    assert tree[0]['uid'] == second['uid']
+    assert [r['content'] for r in tree[1]['replies']] == ['reply', 'reply 2']
+    assert tree[1]['replies'][0]['replies'][0]['content'] == 'nested'
+    assert tree[1]['replies'][0]['replies'][0]['user_name'] == 'Commenter'
+
+
+def test_comment_tree_deep_reply_chain(client):
+    event_uid, headers = _event_with_user(client, 'Chainer', 'chainer@example.com')
+
+    parent = client.post('/comments/', json={'event_uid': event_uid, 'content': 'root'}, headers=headers).get_json()
+    for i in range(60):
+        parent = client.post(f"/comments/{parent['uid']}/reply", json={'content': f'depth {i + 1}'}, headers=headers).get_json()
+
+    node = client.get(f'/comments/event/{event_uid}?depth=10').get_json()['comments'][0]
+    depth = 0
+    while node['replies']:
+        node = node['replies'][0]
+        depth += 1
+    assert depth == 10
+    assert node['reply_count'] == 1
+
+    # keep expanding the truncated subtree until the end of the chain
+    while node['reply_count']:
+        page = client.get(f"/comments/{node['uid']}/replies?depth=10&cursor={node['replies_cursor']}").get_json()
+        node = page['replies'][0]
+        while node['replies']:
+            node = node['replies'][0]
+            depth += 1
+        depth += 1
+    assert depth == 60
+    assert node['content'] == 'depth 60'
+
+
+def test_comment_pagination_and_reply_truncation(client, count_queries):
+    event_uid, headers = _event_with_user(client, 'Pager Commenter', 'pagercommenter@example.com')
+
+    top = [client.post('/comments/', json={'event_uid': event_uid, 'content': f'top {i}'}, headers=headers).get_json() for i in range(5)]
+    for i in range(4):
+        client.post(f"/comments/{top[4]['uid']}/reply", json={'content': f'reply {i}'}, headers=headers)
+
+    seen = []
+    cursor = None
+    while True:
+        url = f'/comments/event/{event_uid}?limit=2&replies=2'
+        if cursor:
+            url += f'&cursor={cursor}'
+        page = client.get(url).get_json()
+        seen.extend(page['comments'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert [c['content'] for c in seen] == ['top 4', 'top 3', 'top 2', 'top 1', 'top 0']
+
+    busy = seen[0]
+    assert busy['reply_count'] == 4
+    assert [r['content'] for r in busy['replies']] == ['reply 0', 'reply 1']
+    assert busy['replies_cursor']
+    assert seen[1]['reply_count'] == 0 and seen[1]['replies_cursor'] is None
+
+    rest = client.get(f"/comments/{busy['uid']}/replies?cursor={busy['replies_cursor']}").get_json()
+    assert [r['content'] for r in rest['replies']] == ['reply 2', 'reply 3']
+    assert rest['next_cursor'] is None
+
+    flat = client.get(f'/comments/event/{event_uid}?depth=0').get_json()['comments']
+    assert flat[0]['replies'] == [] and flat[0]['reply_count'] == 4
+
+    assert client.get(f'/comments/event/{event_uid}?cursor=bogus').status_code == 400
+    assert client.get('/comments/missing/replies').status_code == 404
+
+
+def test_comment_stream_pushes_new_comments_and_replies(app, client):
+    import json
+
+    event_uid, headers = _event_with_user(client, 'Streamer', 'streamer@example.com')
+    broker = app.extensions['pubsub']
+    channel = f'comments:{event_uid}'
+
+    resp = client.get(f'/comments/event/{event_uid}/stream', buffered=False)
+    assert resp.status_code == 200
+    assert resp.mimetype == 'text/event-stream'
+    assert broker.subscriber_count(channel) == 1
+    chunks = iter(resp.response)
+    assert next(chunks) == b': connected\n\n'
+
+    top = client.post('/comments/', json={'event_uid': event_uid, 'content': 'live'}, headers=headers).get_json()
+    client.post(f"/comments/{top['uid']}/reply", json={'content': 'live reply'}, headers=headers)
+
+    first = next(chunks).decode()
+    assert first.startswith('event: comment\n')
+    data = json.loads(first.split('data: ', 1)[1])
+    assert data['uid'] == top['uid'] and data['parent_uid'] is None
+
+    second = json.loads(next(chunks).decode().split('data: ', 1)[1])
+    assert second['content'] == 'live reply' and second['parent_uid'] == top['uid']
+
+    resp.close()
+    assert broker.subscriber_count(channel) == 0
+
+    assert client.get('/comments/event/missing/stream').status_code == 404
+
+
+def test_comment_streams_are_capped_per_process(app, client, monkeypatch):
+    event_uid, _ = _event_with_user(client, 'Crowded', 'crowded@example.com')
+    monkeypatch.setattr(app.extensions['pubsub'], 'max_subscribers', 1)
+
+    first = client.get(f'/comments/event/{event_uid}/stream', buffered=False)
+    assert first.status_code == 200
+    full = client.get(f'/comments/event/{event_uid}/stream')
+    assert full.status_code == 503 and full.headers['Retry-After']
+    first.close()
+    again = client.get(f'/comments/event/{event_uid}/stream', buffered=False)
+    assert again.status_code == 200
+    again.close()
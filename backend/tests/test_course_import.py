@@ -0,0 +1,112 @@
+from datetime import time
+
+from app.course_import import upsert_courses
+from app.models import Course, TimeSlot
+
+
+def _scraped(code, students, days=('Saturday',), start='09:00', end='10:15'):
+    return {
+        'course_code': code,
+        'course_name': f'{code} name',
+        'schedule_raw': f'{"/".join(days)} {start}-{end}',
+        'students_enrolled': students,
+        'days': list(days),
+        'start_time': start,
+        'end_time': end,
+    }
+
+
+def test_upsert_inserts_then_updates_courses(app, db, count_queries):
+    with app.app_context():
+        result = upsert_courses([_scraped('BULK-101', 30), _scraped('BULK-102', 12, days=('Saturday', 'Sunday'))])
+        assert result['added'] == ['BULK-101', 'BULK-102'] and result['changed'] == []
+        assert TimeSlot.query.filter_by(course_code='BULK-102').count() == 2
+
+        courses = [_scraped('BULK-101', 45, start='13:00', end='14:00'), _scraped('BULK-102', 12, days=('Sunday',))]
+        with count_queries() as statements:
+            result = upsert_courses(courses)
+        assert result['added'] == [] and result['changed'] == ['BULK-101', 'BULK-102']
+        # existing codes, upsert, slot delete and slot insert
+        assert len(statements) <= 4
+
+        db.session.expire_all()
+        course = Course.query.filter_by(course_code='BULK-101').one()
+        assert course.students_enrolled == 45
+        slots = TimeSlot.query.filter_by(course_code='BULK-101').all()
+        assert [(s.day_of_week, s.start_time, s.students_count) for s in slots] == [('Saturday', time(13, 0), 45)]
+        assert [s.day_of_week for s in TimeSlot.query.filter_by(course_code='BULK-102')] == ['Sunday']
+
+
+def test_upsert_skips_courses_with_bad_times(app, db):
+    with app.app_context():
+        result = upsert_courses([_scraped('BULK-201', 5, start='9am'), _scraped('BULK-202', 8)])
+        assert list(result['skipped']) == ['BULK-201']
+        assert result['added'] == ['BULK-202']
+        assert Course.query.filter_by(course_code='BULK-201').first() is None
+
+
+def test_unchanged_courses_are_not_written(app, db, count_queries):
+    with app.app_context():
+        courses = [_scraped('HASH-101', 20), _scraped('HASH-102', 9)]
+        upsert_courses(courses)
+        stamp = Course.query.filter_by(course_code='HASH-101').one().updated_at
+
+        with count_queries() as statements:
+            result = upsert_courses(courses)
+        assert result['added'] == [] and result['changed'] == [] and result['unchanged'] == 2
+        # only the stored hashes are read
+        assert len(statements) == 1
+
+        result = upsert_courses([_scraped('HASH-101', 21)])
+        assert result['changed'] == ['HASH-101']
+        assert 'HASH-102' in result['removed']
+        db.session.expire_all()
+        assert Course.query.filter_by(course_code='HASH-101').one().updated_at > stamp
+        # removed courses are only reported unless remove_missing is set
+        assert Course.query.filter_by(course_code='HASH-102').first() is not None
+
+        # rescrape everything else unchanged so only HASH-102 is missing
+        others = [{'course_code': c.course_code, 'course_name': c.course_name, 'schedule_raw': c.schedule_raw,
+                   'students_enrolled': c.students_enrolled} for c in Course.query if c.course_code != 'HASH-102']
+        result = upsert_courses(others, remove_missing=True)
+        assert result['removed'] == ['HASH-102']
+        assert Course.query.filter_by(course_code='HASH-102').first() is None
+        assert TimeSlot.query.filter_by(course_code='HASH-102').count() == 0
+
+
+def test_multi_block_courses_get_slots_per_block(app, db):
+    with app.app_context():
+        course = dict(_scraped('BLOCK-101', 15), blocks=[
+            {'days': ['Saturday'], 'start_time': '09:00', 'end_time': '10:15'},
+            {'days': ['Sunday'], 'start_time': '13:00', 'end_time': '14:00'},
+        ])
+        upsert_courses([course])
+        slots = {s.day_of_week: s.start_time for s in TimeSlot.query.filter_by(course_code='BLOCK-101')}
+        assert slots == {'Saturday': time(9, 0), 'Sunday': time(13, 0)}
+
+
+def test_parser_changes_rewrite_slots_of_unchanged_strings(app, db):
+    with app.app_context():
+        # stored by an older parser that only read the first day
+        old = dict(_scraped('REPARSE-101', 10, days=('Saturday',)), schedule_raw='Sat/Sun 09:00-10:15')
+        upsert_courses([old])
+
+        new = dict(old, days=['Saturday', 'Sunday'])
+        result = upsert_courses([new], partial=True)
+        assert result['changed'] == ['REPARSE-101'] and result['unchanged'] == 0
+        days = sorted(s.day_of_week for s in TimeSlot.query.filter_by(course_code='REPARSE-101'))
+        assert days == ['Saturday', 'Sunday']
+
+
+def test_course_upserts_stay_under_the_bind_parameter_limit(app, db, count_queries, monkeypatch):
+    from app import course_import
+
+    monkeypatch.setattr(course_import, 'MAX_BIND_PARAMS', 30)
+    with app.app_context():
+        with count_queries() as statements:
+            result = upsert_courses([_scraped(f'BIND-{i:03}', i) for i in range(10)])
+        assert len(result['added']) == 10
+        upserts = [s for s in statements if s.startswith('INSERT INTO courses')]
+        # 7 parameters per row, so 4 rows per statement
+        assert len(upserts) == 3
+        assert all(s.count('?') <= 30 for s in upserts)
@@ -0,0 +1,97 @@
+import json
+
+from app.cache import data_version
+from app.models import Course
+from scraper.stream import CourseStream
+
+
+def _scraped(code, students):
+    return {'course_code': code, 'course_name': code, 'schedule_raw': 'MW 08:00-09:00',
+            'students_enrolled': students, 'days': ['Monday', 'Wednesday'],
+            'start_time': '08:00', 'end_time': '09:00'}
+
+
+def _lines(path):
+    with open(path) as f:
+        return [json.loads(line)['course_code'] for line in f]
+
+
+def test_stream_saves_full_batches_as_they_fill(app, tmp_path):
+    path = str(tmp_path / 'courses.ndjson')
+    stream = CourseStream(path, batch_size=2, app=app)
+    stream.add('/courses', 0, _scraped('NDJ-101', 10))
+    assert _lines(path) == []
+    stream.add('/courses', 1, _scraped('NDJ-102', 11))
+    stream.add('/courses', 2, _scraped('NDJ-103', 12))
+
+    # the first batch is in the database and the file; the third course is queued
+    assert _lines(path) == ['NDJ-101', 'NDJ-102']
+    assert len(stream.buffer) == 1
+    with app.app_context():
+        assert Course.query.filter_by(course_code='NDJ-102').one().students_enrolled == 11
+        before = data_version('calendar')
+
+    totals = stream.finish()
+    assert totals == {'batches': 2, 'courses': 3, 'added': 3, 'changed': 0, 'failed': []}
+    assert _lines(path) == ['NDJ-101', 'NDJ-102', 'NDJ-103']
+    assert not (tmp_path / 'courses.ndjson.checkpoint').exists()
+    with app.app_context():
+        app.extensions['cache'].clear()
+        assert data_version('calendar') == before + 1
+
+
+def test_stream_resumes_after_last_saved_batch(app, tmp_path):
+    path = str(tmp_path / 'courses.ndjson')
+    stream = CourseStream(path, batch_size=2, app=app)
+    for index, code in enumerate(['RES-101', 'RES-102', 'RES-103']):
+        stream.add('/courses?page=1', index, _scraped(code, 5))
+    # the run dies with RES-103 unsaved and a partial line written after the batch
+    with open(path, 'a') as f:
+        f.write('{"course_code": "RES-1')
+
+    resumed = CourseStream(path, batch_size=2, app=app)
+    assert resumed.resumed
+    assert resumed.saved('/courses?page=1') == 2
+    assert resumed.saved('/courses?page=2') == 0
+    assert _lines(path) == ['RES-101', 'RES-102']
+
+    resumed.add('/courses?page=1', 2, _scraped('RES-103', 5))
+    totals = resumed.finish()
+    assert totals['courses'] == 3 and totals['batches'] == 2
+    assert _lines(path) == ['RES-101', 'RES-102', 'RES-103']
+
+
+def test_unchanged_stream_leaves_calendar_version(app, tmp_path):
+    path = str(tmp_path / 'courses.ndjson')
+    first = CourseStream(path, batch_size=10, app=app)
+    first.add('/courses', 0, _scraped('SAME-101', 7))
+    first.finish()
+
+    with app.app_context():
+        app.extensions['cache'].clear()
+        before = data_version('calendar')
+    again = CourseStream(path, batch_size=10, app=app)
+    again.add('/courses', 0, _scraped('SAME-101', 7))
+    assert again.finish()['changed'] == 0
+    with app.app_context():
+        app.extensions['cache'].clear()
+        assert data_version('calendar') == before
+
+
+def test_failed_page_keeps_checkpoint_for_resume(app, tmp_path):
+    path = str(tmp_path / 'courses.ndjson')
+    stream = CourseStream(path, batch_size=10, app=app)
+    stream.add('/courses?page=1', 0, _scraped('FAIL-101', 3))
+    stream.fail('/courses?page=2')
+    totals = stream.finish()
+    assert totals['failed'] == ['/courses?page=2'] and totals['courses'] == 1
+    assert (tmp_path / 'courses.ndjson.checkpoint').exists()
+
+    # the next run skips what was saved and retries the failed page
+    resumed = CourseStream(path, batch_size=10, app=app)
+    assert resumed.saved('/courses?page=1') == 1
+    assert resumed.saved('/courses?page=2') == 0
+    resumed.add('/courses?page=2', 0, _scraped('FAIL-201', 4))
+    assert resumed.finish()['failed'] == []
+    assert not (tmp_path / 'courses.ndjson.checkpoint').exists()
+    assert _lines(path) == ['FAIL-101', 'FAIL-201']
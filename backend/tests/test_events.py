@@ -60,3 +60,211 @@ def test_update_delete_event_permissions(client):
     # deleting again returns 404
     d2 = client.delete(f'/events/{event_uid}', headers={'Authorization': f'Bearer {owner_token}'})
     assert d2.status_code == 404
+
+
+def test_list_events_constant_queries(client, count_queries):
+    r = client.post('/auth/register', json={'name': 'Feed Owner', 'email': 'feedowner@example.com', 'password': 'pw'})
+    token = r.get_json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    club_uid = client.post('/clubs/', json={'name': 'Feed Club'}, headers=headers).get_json()['uid']
+
+    start = (datetime.utcnow() + timedelta(days=3)).isoformat()
+    event_uids = []
+    for i in range(4):
+        ev = client.post('/events/', json={'name': f'Feed Event {i}', 'start_datetime': start, 'type': 'in-person', 'club_uid': club_uid}, headers=headers)
+        event_uids.append(ev.get_json()['uid'])
+    client.post(f'/events/{event_uids[0]}/join', headers=headers)
+
+    with count_queries() as statements:
+        resp = client.get(f'/events/?club_uid={club_uid}')
+    assert resp.status_code == 200
+    assert len(statements) == 1
+
+    by_uid = {e['uid']: e for e in resp.get_json()['events']}
+    assert by_uid[event_uids[0]]['participant_count'] == 1
+    assert by_uid[event_uids[1]]['participant_count'] == 0
+    assert by_uid[event_uids[1]]['club_name'] == 'Feed Club'
+
+
+def test_list_events_keyset_pagination_and_filters(client):
+    r = client.post('/auth/register', json={'name': 'Pager', 'email': 'pager@example.com', 'password': 'pw'})
+    headers = {'Authorization': f"Bearer {r.get_json()['access_token']}"}
+    club_uid = client.post('/clubs/', json={'name': 'Pager Club'}, headers=headers).get_json()['uid']
+
+    base = datetime.utcnow()
+    created = []
+    for i in range(5):
+        start = (base + timedelta(days=10 + i)).isoformat()
+        ev = client.post('/events/', json={'name': f'Paged {i}', 'start_datetime': start, 'type': 'online', 'club_uid': club_uid}, headers=headers)
+        created.append(ev.get_json()['uid'])
+    # one past event that has already ended
+    past = (base - timedelta(days=5)).isoformat()
+    past_end = (base - timedelta(days=5) + timedelta(hours=1)).isoformat()
+    client.post('/events/', json={'name': 'Paged past', 'start_datetime': past, 'end_datetime': past_end, 'type': 'in-person', 'club_uid': club_uid}, headers=headers)
+
+    seen = []
+    cursor = None
+    while True:
+        url = f'/events/?club_uid={club_uid}&status=upcoming&limit=2'
+        if cursor:
+            url += f'&cursor={cursor}'
+        page = client.get(url).get_json()
+        assert len(page['events']) <= 2
+        seen.extend(e['uid'] for e in page['events'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    # newest first, no duplicates, past event excluded
+    assert seen == list(reversed(created))
+
+    completed = client.get(f'/events/?club_uid={club_uid}&status=completed').get_json()['events']
+    assert [e['name'] for e in completed] == ['Paged past']
+
+    in_person = client.get(f'/events/?club_uid={club_uid}&type=in-person').get_json()['events']
+    assert [e['name'] for e in in_person] == ['Paged past']
+
+    window_to = (base + timedelta(days=11, hours=12)).isoformat()
+    windowed = client.get(f'/events/?club_uid={club_uid}&from={base.isoformat()}&to={window_to}').get_json()['events']
+    assert [e['name'] for e in windowed] == ['Paged 1', 'Paged 0']
+
+    assert client.get('/events/?cursor=not-a-cursor').status_code == 400
+    assert client.get('/events/?status=bogus').status_code == 400
+
+
+def test_club_events_attendance_constant_queries(client, count_queries):
+    r = client.post('/auth/register', json={'name': 'Historian', 'email': 'historian@example.com', 'password': 'pw'})
+    headers = {'Authorization': f"Bearer {r.get_json()['access_token']}"}
+    club_uid = client.post('/clubs/', json={'name': 'History Club'}, headers=headers).get_json()['uid']
+
+    start = (datetime.utcnow() + timedelta(days=4)).isoformat()
+    event_uids = []
+    for i in range(6):
+        ev = client.post('/events/', json={'name': f'History {i}', 'start_datetime': start, 'type': 'online', 'club_uid': club_uid}, headers=headers)
+        event_uids.append(ev.get_json()['uid'])
+    client.post(f'/events/{event_uids[2]}/join', headers=headers)
+
+    with count_queries() as statements:
+        resp = client.get(f'/events/club/{club_uid}', headers=headers)
+    assert resp.status_code == 200
+    # club lookup, events with participant counts, and the caller's attendance
+    assert len(statements) == 3
+
+    by_uid = {e['uid']: e for e in resp.get_json()}
+    assert by_uid[event_uids[2]]['is_attending'] is True
+    assert by_uid[event_uids[2]]['participant_count'] == 1
+    assert not any(by_uid[uid]['is_attending'] for uid in event_uids if uid != event_uids[2])
+
+    anon = client.get(f'/events/club/{club_uid}').get_json()
+    assert not any(e['is_attending'] for e in anon)
+
+
+def test_event_interval_index_overlaps():
+    from app.schedule_index import EventIntervalIndex
+
+    base = datetime(2030, 1, 7, 9, 0)
+    index = EventIntervalIndex()
+    index.load([
+        ('a', base, base + timedelta(hours=2), 'c1'),
+        ('b', base + timedelta(hours=3), None, 'c1'),  # no end: one hour
+        ('c', base - timedelta(days=1), base + timedelta(hours=1), 'c2'),
+    ], version=1)
+
+    def uids(start, end):
+        return sorted(e[0] for e in index.overlapping(start, end))
+
+    assert uids(base + timedelta(minutes=30), base + timedelta(hours=1)) == ['a', 'c']
+    assert uids(base + timedelta(hours=2), base + timedelta(hours=3)) == []
+    assert uids(base + timedelta(hours=3, minutes=30), base + timedelta(hours=5)) == ['b']
+
+    index.add('a', base + timedelta(hours=6), base + timedelta(hours=7), 'c1')
+    index.remove('c')
+    assert uids(base, base + timedelta(hours=1)) == []
+    assert uids(base + timedelta(hours=6), base + timedelta(hours=8)) == ['a']
+    assert len(index) == 2
+
+    # removing the day-long event and shortening 'a' shrank the scanned window
+    assert index._max_duration == timedelta(hours=1)
+    index.add('d', base, base + timedelta(hours=1), 'c2')
+    index.remove('a')
+    index.remove('b')
+    assert index._max_duration == timedelta(hours=1)
+    index.remove('d')
+    assert index._max_duration == timedelta(0)
+
+
+def test_check_conflicts_scores_course_load_and_events(app, client, db):
+    from datetime import time
+    from app.cache import bump_data_version
+    from app.models import Course, TimeSlot
+
+    r = client.post('/auth/register', json={'name': 'Planner', 'email': 'planner@example.com', 'password': 'pw'})
+    headers = {'Authorization': f"Bearer {r.get_json()['access_token']}"}
+    club_uid = client.post('/clubs/', json={'name': 'Planner Club'}, headers=headers).get_json()['uid']
+
+    r2 = client.post('/auth/register', json={'name': 'Other Exec', 'email': 'otherexec@example.com', 'password': 'pw'})
+    other_headers = {'Authorization': f"Bearer {r2.get_json()['access_token']}"}
+    other_club = client.post('/clubs/', json={'name': 'Other Planner Club'}, headers=other_headers).get_json()['uid']
+    # the planner joins the other club and registers for its event
+    client.post(f'/clubs/{other_club}/join', headers=headers)
+
+    # a Saturday far in the future, with a course on Saturday mornings
+    day = datetime(2031, 3, 1)
+    assert day.weekday() == 5
+    with app.app_context():
+        db.session.add(Course(course_code='PLAN-101', course_name='Planning', schedule_raw='S 06:00-07:00', students_enrolled=77))
+        db.session.add(TimeSlot(course_code='PLAN-101', day_of_week='Saturday', start_time=time(6, 0), end_time=time(7, 0), students_count=77))
+        bump_data_version('calendar')
+        db.session.commit()
+
+    own = client.post('/events/', json={'name': 'Own Event', 'start_datetime': (day + timedelta(hours=6)).isoformat(), 'end_datetime': (day + timedelta(hours=8)).isoformat(), 'type': 'online', 'club_uid': club_uid}, headers=headers).get_json()['uid']
+    other = client.post('/events/', json={'name': 'Other Event', 'start_datetime': (day + timedelta(hours=7)).isoformat(), 'type': 'online', 'club_uid': other_club}, headers=other_headers).get_json()['uid']
+    client.post(f'/events/{other}/join', headers=headers)
+
+    params = f"start={(day + timedelta(hours=6, minutes=30)).isoformat()}&end={(day + timedelta(hours=7, minutes=30)).isoformat()}&club_uid={club_uid}"
+    resp = client.get(f'/events/conflicts?{params}', headers=headers)
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['course_load']['peak_students'] == 77
+    assert [c['uid'] for c in data['club_conflicts']] == [own]
+    assert [(c['uid'], c['members_registered']) for c in data['member_conflicts']] == [(other, 1)]
+    assert data['score'] == 77 + 10 + 100
+
+    # moving our event out of the window updates the index incrementally
+    client.put(f'/events/{own}', json={'start_datetime': (day + timedelta(hours=12)).isoformat(), 'end_datetime': (day + timedelta(hours=13)).isoformat()}, headers=headers)
+    data = client.get(f'/events/conflicts?{params}', headers=headers).get_json()
+    assert data['club_conflicts'] == []
+
+    client.delete(f'/events/{other}', headers=other_headers)
+    data = client.get(f'/events/conflicts?{params}', headers=headers).get_json()
+    assert data['member_conflicts'] == [] and data['score'] == 77
+
+    assert client.get(f'/events/conflicts?{params}', headers=other_headers).status_code == 403
+    assert client.get('/events/conflicts?start=bad', headers=headers).status_code == 400
+
+    # aware times are compared as UTC, like the naive UTC stored on events
+    aware = f"start={(day + timedelta(hours=12, minutes=30)).isoformat()}Z&end={(day + timedelta(hours=14, minutes=30)).isoformat()}%2B01:00&club_uid={club_uid}"
+    resp = client.get(f'/events/conflicts?{aware}', headers=headers)
+    assert resp.status_code == 200
+    assert [c['uid'] for c in resp.get_json()['club_conflicts']] == [own]
+
+
+def test_aware_event_times_are_stored_as_naive_utc(client):
+    r = client.post('/auth/register', json={'name': 'Zoned', 'email': 'zoned@example.com', 'password': 'pw'})
+    headers = {'Authorization': f"Bearer {r.get_json()['access_token']}"}
+    club_uid = client.post('/clubs/', json={'name': 'Zoned Club'}, headers=headers).get_json()['uid']
+
+    # a naive event first, so the interval index compares against it
+    client.post('/events/', json={'name': 'Naive', 'start_datetime': '2032-01-01T09:00:00', 'type': 'online', 'club_uid': club_uid}, headers=headers)
+    resp = client.post('/events/', json={'name': 'Aware', 'start_datetime': '2032-01-01T10:00:00+00:00', 'end_datetime': '2032-01-01T13:00:00+02:00', 'type': 'online', 'club_uid': club_uid}, headers=headers)
+    assert resp.status_code == 201
+    uid = resp.get_json()['uid']
+    body = client.get(f'/events/{uid}').get_json()
+    assert (body['start_datetime'], body['end_datetime']) == ('2032-01-01T10:00:00', '2032-01-01T11:00:00')
+
+    assert client.put(f'/events/{uid}', json={'start_datetime': '2032-01-01T11:30:00Z', 'end_datetime': '2032-01-01T12:30:00Z'}, headers=headers).status_code == 200
+    assert client.get(f'/events/{uid}').get_json()['start_datetime'] == '2032-01-01T11:30:00'
+    data = client.get(f'/events/conflicts?start=2032-01-01T12:00:00&club_uid={club_uid}', headers=headers).get_json()
+    assert [c['uid'] for c in data['club_conflicts']] == [uid]
+
+    windowed = client.get(f'/events/?club_uid={club_uid}&from=2032-01-01T10:00:00Z&to=2032-01-01T12:00:00%2B00:00').get_json()['events']
+    assert [e['name'] for e in windowed] == ['Aware']
@@ -1,30 +1,131 @@
+import hashlib
+import io
+import json
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
+import requests
 
 
-class DummyResp:
-    def __init__(self, status_code=200, json_data=None, text=''):
-        self.status_code = status_code
-        self._json = json_data or {'secure_url': 'https://res.cloudinary.com/test/image/upload/v1/test.jpg'}
-        self.text = text
+class StubUploadHandler(BaseHTTPRequestHandler):
+    """Stands in for Cloudinary's upload API, recording each request."""
 
-    def json(self):
-        return self._json
+    def do_POST(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            body = b''
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                chunk = self.rfile.read(size + 2)[:-2]
+                if not size:
+                    break
+                body += chunk
+        else:
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.received.append({'path': self.path, 'headers': dict(self.headers), 'body': body})
 
+        status, payload = self.server.reply
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upload_server(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubUploadHandler)
+    server.received = []
+    server.reply = (200, {'secure_url': 'https://cdn.example/test.jpg'})
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv('CLOUDINARY_API_URL', f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setenv('CLOUDINARY_CLOUD_NAME', 'test')
+    monkeypatch.setenv('CLOUDINARY_UPLOAD_PRESET', 'preset')
+    monkeypatch.setenv('CLOUDINARY_UPLOAD_PRESET_LOGO', 'logo-preset')
+    yield server
+    server.shutdown()
+
+
+class StubStorageHandler(BaseHTTPRequestHandler):
+    """Stands in for Cloudinary's signed upload API: checks the signature and
+    answers with a signed public_id/version like the real service."""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+        form = {part.get_param('name', header='content-disposition'): part.get_payload(decode=True)
+                for part in message.iter_parts()}
+        secret = self.server.api_secret
+        params = {k: v.decode() for k, v in form.items() if k not in ('file', 'api_key', 'signature')}
+        signed = '&'.join(f'{k}={v}' for k, v in sorted(params.items()))
+        if form.get('signature', b'').decode() != hashlib.sha1((signed + secret).encode()).hexdigest():
+            status, payload = 401, {'error': {'message': 'Invalid Signature'}}
+        else:
+            self.server.stored[params['public_id']] = form['file']
+            version = '1700000000'
+            payload = {
+                'public_id': params['public_id'],
+                'version': int(version),
+                'format': 'png',
+                'signature': hashlib.sha1(f"public_id={params['public_id']}&version={version}{secret}".encode()).hexdigest(),
+            }
+            status = 200
+        self.server.received.append(params)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def storage_server(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubStorageHandler)
+    server.api_secret = 'shh'
+    server.received = []
+    server.stored = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv('CLOUDINARY_API_URL', f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setenv('CLOUDINARY_DELIVERY_URL', 'https://cdn.example')
+    monkeypatch.setenv('CLOUDINARY_CLOUD_NAME', 'test')
+    monkeypatch.setenv('CLOUDINARY_API_KEY', 'key')
+    monkeypatch.setenv('CLOUDINARY_API_SECRET', server.api_secret)
+    monkeypatch.setenv('CLOUDINARY_UPLOAD_PRESET_LOGO', 'logo-preset')
+    monkeypatch.setenv('CLOUDINARY_UPLOAD_PRESET_BANNER', 'banner-preset')
+    yield server
+    server.shutdown()
 
-def test_upload_media_success(monkeypatch, client):
-    # register user
-    r = client.post('/auth/register', json={'name': 'M1', 'email': 'm1@example.com', 'password': 'pw'})
-    token = r.get_json()['access_token']
 
-    # mock requests.post used in media.upload
-    import requests
+def _direct_upload(client, headers, content, **target):
+    """Sign, upload to the stub storage as a browser would, then confirm."""
+    signed = client.post('/media/sign', json=target, headers=headers)
+    assert signed.status_code == 200
+    signed = signed.get_json()
+    stored = requests.post(signed['upload_url'], data=signed['fields'], files={'file': ('logo.png', content)})
+    assert stored.status_code == 200
+    return client.post('/media/confirm', json=stored.json(), headers=headers)
 
-    def fake_post(url, data=None, files=None, timeout=30):
-        return DummyResp(status_code=200, json_data={'secure_url': 'https://cdn.example/test.jpg'})
 
-    monkeypatch.setattr('requests.post', fake_post)
+def _token(client, email):
+    r = client.post('/auth/register', json={'name': 'Media', 'email': email, 'password': 'pw'})
+    return r.get_json()['access_token']
 
-    import io
+
+def test_upload_media_success(client, upload_server):
+    token = _token(client, 'm1@example.com')
 
     data = {
         'file': (io.BytesIO(b'abc'), 'test.png')
@@ -34,6 +135,44 @@ def test_upload_media_success(monkeypatch, client):
     j = resp.get_json()
     assert 'url' in j and j['url'].startswith('https://')
 
+    [upstream] = upload_server.received
+    assert upstream['path'] == '/v1_1/test/auto/upload'
+    assert b'name="upload_preset"\r\n\r\npreset\r\n' in upstream['body']
+
+
+def test_upload_media_streams_large_file_with_preset(client, upload_server):
+    token = _token(client, 'm-stream@example.com')
+    content = bytes(range(256)) * 4096  # 1 MiB, spans many chunks
+
+    data = {'preset_type': 'logo', 'file': (io.BytesIO(content), 'club logo.png', 'image/png')}
+    resp = client.post('/media/upload', data=data, headers={'Authorization': f'Bearer {token}'}, content_type='multipart/form-data')
+    assert resp.status_code == 200
+
+    [upstream] = upload_server.received
+    # forwarded as it arrived rather than with a precomputed length
+    assert upstream['headers'].get('Transfer-Encoding') == 'chunked'
+    body = upstream['body']
+    assert b'name="upload_preset"\r\n\r\nlogo-preset\r\n' in body
+    assert b'filename="club logo.png"\r\nContent-Type: image/png\r\n\r\n' + content + b'\r\n--' in body
+
+
+def test_upload_media_upstream_error_and_size_cap(app, client, upload_server):
+    token = _token(client, 'm-errors@example.com')
+    headers = {'Authorization': f'Bearer {token}'}
+
+    upload_server.reply = (400, {'error': {'message': 'Invalid image file'}})
+    resp = client.post('/media/upload', data={'file': (io.BytesIO(b'abc'), 'x.png')}, headers=headers, content_type='multipart/form-data')
+    assert resp.status_code == 400
+    assert resp.get_json()['msg'] == 'upload failed'
+
+    limit = app.config['MEDIA_MAX_UPLOAD_BYTES']
+    app.config['MEDIA_MAX_UPLOAD_BYTES'] = 1000
+    try:
+        resp = client.post('/media/upload', data={'file': (io.BytesIO(b'x' * 200_000), 'big.png')}, headers=headers, content_type='multipart/form-data')
+    finally:
+        app.config['MEDIA_MAX_UPLOAD_BYTES'] = limit
+    assert resp.status_code == 413
+
 
 def test_upload_media_missing_file(client):
     r = client.post('/auth/register', json={'name': 'M2', 'email': 'm2@example.com', 'password': 'pw'})
@@ -47,3 +186,75 @@ def test_get_media_not_found(client):
     # No GET route for media metadata implemented; hitting a generic route should return 404
     r = client.get('/media/1')
     assert r.status_code in (404, 405)
+
+
+def test_signed_upload_records_club_icon(client, storage_server):
+    token = _token(client, 'm-signed@example.com')
+    headers = {'Authorization': f'Bearer {token}'}
+    club_uid = client.post('/clubs/', json={'name': 'Signed Uploads'}, headers=headers).get_json()['uid']
+
+    resp = _direct_upload(client, headers, b'logo bytes', club_uid=club_uid)
+    assert resp.status_code == 200
+    url = resp.get_json()['url']
+
+    [params] = storage_server.received
+    assert params['upload_preset'] == 'logo-preset'
+    assert params['public_id'].startswith(f'clubs/{club_uid}/logo/')
+    assert storage_server.stored[params['public_id']] == b'logo bytes'
+    assert url == f"https://cdn.example/test/image/upload/v1700000000/{params['public_id']}.png"
+    assert client.get(f'/clubs/{club_uid}').get_json()['icon_url'] == url
+
+
+def test_signed_upload_records_event_banner_and_unattached(app, client, storage_server):
+    from app.cache import stored_data_version
+
+    token = _token(client, 'm-signed-event@example.com')
+    headers = {'Authorization': f'Bearer {token}'}
+    event = client.post('/events/', json={'name': 'Signed Banner', 'start_datetime': '2030-05-01T10:00:00', 'type': 'social'}, headers=headers)
+    event_uid = event.get_json()['uid']
+    with app.app_context():
+        events_version = stored_data_version('events')
+
+    resp = _direct_upload(client, headers, b'banner bytes', event_uid=event_uid)
+    assert resp.status_code == 200
+    # a new banner doesn't move the event, so the interval index isn't reloaded
+    with app.app_context():
+        assert stored_data_version('events') == events_version
+    assert storage_server.received[-1]['upload_preset'] == 'banner-preset'
+    assert client.get(f'/events/{event_uid}').get_json()['banner_url'] == resp.get_json()['url']
+
+    # a banner picked before its event exists is only returned
+    resp = _direct_upload(client, headers, b'new banner', preset_type='banner')
+    assert resp.status_code == 200
+    assert '/users/' in resp.get_json()['url']
+
+
+def test_signed_upload_rejections(app, client, storage_server):
+    owner = {'Authorization': f"Bearer {_token(client, 'm-signed-owner@example.com')}"}
+    other = {'Authorization': f"Bearer {_token(client, 'm-signed-other@example.com')}"}
+    club_uid = client.post('/clubs/', json={'name': 'Signed Rejections'}, headers=owner).get_json()['uid']
+
+    # only execs may sign for a club
+    assert client.post('/media/sign', json={'club_uid': club_uid}, headers=other).status_code == 403
+    assert client.post('/media/sign', json={'club_uid': 'missing'}, headers=owner).status_code == 404
+
+    signed = client.post('/media/sign', json={'club_uid': club_uid}, headers=owner).get_json()
+    stored = requests.post(signed['upload_url'], data=signed['fields'], files={'file': ('a.png', b'a')}).json()
+
+    # the upload response can't be forged or reused by a non-exec
+    forged = dict(stored, public_id=stored['public_id'].replace(club_uid, 'elsewhere'))
+    assert client.post('/media/confirm', json=forged, headers=owner).status_code == 400
+    assert client.post('/media/confirm', json=stored, headers=other).status_code == 403
+
+    ttl = app.config['MEDIA_SIGNED_UPLOAD_TTL_SECONDS']
+    app.config['MEDIA_SIGNED_UPLOAD_TTL_SECONDS'] = -1
+    try:
+        resp = client.post('/media/confirm', json=stored, headers=owner)
+    finally:
+        app.config['MEDIA_SIGNED_UPLOAD_TTL_SECONDS'] = ttl
+    assert resp.status_code == 400
+    assert resp.get_json()['msg'] == 'upload signature expired'
+
+    # tampering with the signed fields is refused by storage itself
+    fields = dict(signed['fields'], public_id=f'clubs/{club_uid}/logo/1-abc')
+    assert requests.post(signed['upload_url'], data=fields, files={'file': ('a.png', b'a')}).status_code == 401
@@ -0,0 +1,147 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from app.storage import LocalStorage, VariantPool
+
+
+@pytest.fixture
+def local_storage(app, tmp_path, monkeypatch):
+    storage = LocalStorage(str(tmp_path))
+    pool = VariantPool(storage, workers=2)
+    monkeypatch.setitem(app.extensions, 'media_storage', storage)
+    monkeypatch.setitem(app.extensions, 'media_variants', pool)
+    monkeypatch.setitem(app.config, 'MEDIA_PUBLIC_URL', 'https://media.example/files')
+    return storage
+
+
+def _image(size, fmt='PNG', mode='RGBA'):
+    buf = io.BytesIO()
+    Image.new(mode, size, (200, 30, 30)).save(buf, fmt)
+    return buf.getvalue()
+
+
+def _token(client, email):
+    r = client.post('/auth/register', json={'name': 'Storage', 'email': email, 'password': 'pw'})
+    return r.get_json()['access_token']
+
+
+def _upload(client, headers, content, preset_type):
+    data = {'preset_type': preset_type, 'file': (io.BytesIO(content), 'img')}
+    return client.post('/media/upload', data=data, headers=headers, content_type='multipart/form-data')
+
+
+def _key(url):
+    return url.split('/files/', 1)[1]
+
+
+def _stored_files(storage):
+    return sorted(os.path.join(d, f) for d, _, files in os.walk(storage.root) for f in files)
+
+
+def test_local_upload_dedupes_and_renders_logo_variants(client, local_storage):
+    headers = {'Authorization': f"Bearer {_token(client, 'storage-logo@example.com')}"}
+    content = _image((800, 600))
+
+    resp = _upload(client, headers, content, 'logo')
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body['url'] == body['variants']['icon']
+    assert body['variants']['original'].endswith('/original.png')
+
+    pool = client.application.extensions['media_variants']
+    for name in ('thumb', 'icon'):
+        key = _key(body['variants'][name])
+        pool.wait(key)
+        with Image.open(local_storage.path(key)) as img:
+            assert img.format == 'WEBP'
+            assert max(img.size) == {'thumb': 96, 'icon': 256}[name]
+    files = _stored_files(local_storage)
+
+    # the same bytes again store and render nothing new
+    again = _upload(client, headers, content, 'logo').get_json()
+    assert again == body
+    assert _stored_files(local_storage) == files
+
+
+def test_local_upload_crops_banners_without_upscaling(client, local_storage):
+    headers = {'Authorization': f"Bearer {_token(client, 'storage-banner@example.com')}"}
+    pool = client.application.extensions['media_variants']
+
+    large = _upload(client, headers, _image((2400, 1600), 'JPEG', 'RGB'), 'banner').get_json()
+    small = _upload(client, headers, _image((300, 300), 'JPEG', 'RGB'), 'banner').get_json()
+    assert large['url'] == large['variants']['full']
+    for body, sizes in ((large, {'card': (600, 200), 'full': (1200, 400)}),
+                        (small, {'card': (300, 100), 'full': (300, 100)})):
+        for name, size in sizes.items():
+            key = _key(body['variants'][name])
+            pool.wait(key)
+            with Image.open(local_storage.path(key)) as img:
+                assert img.size == size
+
+
+def test_list_views_get_smaller_variants(client, local_storage):
+    headers = {'Authorization': f"Bearer {_token(client, 'storage-views@example.com')}"}
+    icon_url = _upload(client, headers, _image((400, 400)), 'logo').get_json()['url']
+    club_uid = client.post('/clubs/', json={'name': 'Variant Club', 'icon_url': icon_url}, headers=headers).get_json()['uid']
+
+    assert client.get(f'/clubs/{club_uid}').get_json()['icon_url'] == icon_url
+    [listed] = [c for c in client.get('/clubs/').get_json() if c['uid'] == club_uid]
+    assert listed['icon_url'] == icon_url.replace('/icon.webp', '/thumb.webp')
+
+    # urls from other storage are left alone
+    client.put(f'/clubs/{club_uid}', json={'icon_url': 'https://cdn.example/logo.png'}, headers=headers)
+    [listed] = [c for c in client.get('/clubs/').get_json() if c['uid'] == club_uid]
+    assert listed['icon_url'] == 'https://cdn.example/logo.png'
+
+
+def test_serve_file_renders_missing_variants(client, local_storage):
+    headers = {'Authorization': f"Bearer {_token(client, 'storage-serve@example.com')}"}
+    body = _upload(client, headers, _image((500, 500), 'GIF', 'P'), 'logo').get_json()
+    key = _key(body['variants']['thumb'])
+    client.application.extensions['media_variants'].wait(key)
+
+    # e.g. lost when the process restarted before rendering
+    os.remove(local_storage.path(key))
+    resp = client.get(f'/media/files/{key}')
+    assert resp.status_code == 200
+    assert resp.mimetype == 'image/webp'
+    assert 'max-age' in resp.headers['Cache-Control']
+
+    digest = key.split('/')[0]
+    assert client.get(f'/media/files/{digest}/original.jpg').status_code == 404
+    assert client.get(f'/media/files/{digest}/huge.webp').status_code == 404
+    assert client.get('/media/files/../secrets.txt').status_code == 404
+
+
+def test_local_upload_rejects_non_images(client, local_storage):
+    headers = {'Authorization': f"Bearer {_token(client, 'storage-reject@example.com')}"}
+    resp = _upload(client, headers, b'not an image', 'logo')
+    assert resp.status_code == 400
+    assert resp.get_json()['msg'] == 'file is not a supported image'
+    assert _stored_files(local_storage) == []
+    # signed uploads go to Cloudinary, so they are off with local storage
+    assert client.post('/media/sign', json={}, headers=headers).status_code == 500
+
+
+def test_local_upload_rejects_huge_images_and_survives_corrupt_originals(client, local_storage, monkeypatch):
+    headers = {'Authorization': f"Bearer {_token(client, 'storage-bomb@example.com')}"}
+
+    # tiny on disk, but decodes to more pixels than allowed
+    monkeypatch.setitem(client.application.config, 'MEDIA_MAX_IMAGE_PIXELS', 1000 * 1000)
+    resp = _upload(client, headers, _image((2000, 1000), mode='RGB'), 'banner')
+    assert resp.status_code == 400
+    assert resp.get_json()['msg'] == 'image dimensions too large'
+    assert _stored_files(local_storage) == []
+
+    body = _upload(client, headers, _image((300, 300), 'JPEG', 'RGB'), 'logo').get_json()
+    pool = client.application.extensions['media_variants']
+    key = _key(body['variants']['thumb'])
+    pool.wait(key)
+    os.remove(local_storage.path(key))
+    # the stored original is damaged later on
+    with open(local_storage.path(_key(body['variants']['original'])), 'r+b') as f:
+        f.truncate(100)
+    assert client.get(f'/media/files/{key}').status_code == 404
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'portal')
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_offline_parser_does_not_need_selenium():
+    code = "import sys, scraper.offline; sys.exit('selenium' in sys.modules)"
+    assert subprocess.run([sys.executable, '-c', code], cwd=BACKEND).returncode == 0
+
+
+def test_offline_parse_matches_live_fields():
+    from scraper import offline
+
+    page = offline.parse_snapshot(os.path.join(FIXTURES, 'courses-1.html'))
+    assert [c['course_code'] for c in page] == ['CSCI-1000', 'CSCI-2000']
+    assert page[1]['course_name'] == 'Data Structures'
+    assert page[1]['days'] == ['Tuesday', 'Thursday']
+    assert (page[1]['start_time'], page[1]['end_time']) == ('14:00', '15:20')
+    assert page[1]['students_enrolled'] == 30
+
+    # fallback selectors, nested markup and entries missing required fields
+    html = '''
+        <div class="course-item"><b class="course-code"> BIO-<i>110</i> </b><br>
+          <p class="course-name">Biology</p><span class="schedule">F 1:00pm-2:00pm</span>
+          <span class="students">12 enrolled</span></div>
+        <div class="course-item"><span class="course-name">No schedule</span></div>
+    '''
+    [course] = offline.parse_html(html)
+    assert course['course_code'] == 'BIO-110'
+    assert (course['days'], course['start_time'], course['students_enrolled']) == (['Friday'], '13:00', 12)
+
+
+def test_offline_parse_directory_in_processes():
+    from scraper import offline
+
+    courses = offline.parse_snapshots(FIXTURES, workers=2)
+    # courses-1 before courses-2; the login and home pages have no courses
+    assert [c['course_code'] for c in courses] == ['CSCI-1000', 'CSCI-2000', 'MATH-1010']
@@ -0,0 +1,46 @@
+import pytest
+
+from scraper.schedule_parser import parse_enrollment, parse_many, parse_schedule, parse_time
+
+
+@pytest.mark.parametrize('schedule, days, start, end', [
+    ('MWF 10:00-11:30', ['Monday', 'Wednesday', 'Friday'], '10:00', '11:30'),
+    ('TR 2:00pm-3:20pm', ['Tuesday', 'Thursday'], '14:00', '15:20'),
+    ('TuTh 9-10:15am', ['Tuesday', 'Thursday'], '09:00', '10:15'),
+    ('Mon/Wed 10:00 - 11:15', ['Monday', 'Wednesday'], '10:00', '11:15'),
+    ('Mon, Wed, Fri 1pm to 2pm', ['Monday', 'Wednesday', 'Friday'], '13:00', '14:00'),
+    ('M-F 08:00-09:00', ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday'], '08:00', '09:00'),
+    ('10:00-11:30 MWF', ['Monday', 'Wednesday', 'Friday'], '10:00', '11:30'),
+    ('Lecture MW 11:00-12:15pm Rm 101', ['Monday', 'Wednesday'], '11:00', '12:15'),
+    ('Sat 9:30 a.m.-12 p.m.', ['Saturday'], '09:30', '12:00'),
+])
+def test_parse_single_block_formats(schedule, days, start, end):
+    result = parse_schedule(schedule)
+    assert (result['days'], result['start_time'], result['end_time']) == (days, start, end)
+    assert result['blocks'] == [{'days': days, 'start_time': start, 'end_time': end}]
+    assert result['tba'] is False
+
+
+def test_parse_multi_block_and_tba():
+    result = parse_schedule('MW 10:00-11:15; F 13:00-14:00')
+    assert result['blocks'] == [
+        {'days': ['Monday', 'Wednesday'], 'start_time': '10:00', 'end_time': '11:15'},
+        {'days': ['Friday'], 'start_time': '13:00', 'end_time': '14:00'},
+    ]
+    assert result['days'] == ['Monday', 'Wednesday']
+
+    for schedule in ('TBA', 'tbd', 'MWF Arranged'):
+        result = parse_schedule(schedule)
+        assert result['tba'] is True and result['blocks'] == [] and result['start_time'] is None
+    # bare numbers are not clock times
+    assert parse_schedule('Section 1-2')['blocks'] == []
+
+
+def test_parse_many_and_helpers():
+    batch = ['MWF 10:00-11:30', 'TBA', 'MWF 10:00-11:30']
+    results = parse_many(batch)
+    assert results == [parse_schedule(s) for s in batch]
+    assert results[0] is results[2]
+
+    assert [parse_time(t) for t in ('2:00pm', '14:00', '12am', '25:00')] == ['14:00', '14:00', '00:00', None]
+    assert [parse_enrollment(e) for e in ('45/50', '45 of 50', '', 'full')] == [45, 45, 0, 0]
@@ -0,0 +1,45 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app import create_app, db as _db
+
+
+def test_upgrade_schema_alters_tables_from_an_older_release(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'old.db'}"
+    engine = create_engine(url)
+    # the tables as an older create_all made them: no rollup, no events.created_at
+    # or courses.content_hash, and none of the indexes added since
+    _db.metadata.create_all(engine, tables=[t for t in _db.metadata.sorted_tables if t.name != 'club_daily_metrics'])
+    with engine.begin() as conn:
+        conn.execute(text('DROP INDEX ix_events_start_datetime_uid'))
+        conn.execute(text('ALTER TABLE events DROP COLUMN created_at'))
+        conn.execute(text('ALTER TABLE courses DROP COLUMN content_hash'))
+        conn.execute(text("INSERT INTO courses (course_code, course_name, schedule_raw, students_enrolled) VALUES ('OLD-101', 'Old Course', 'MW 10:00-11:00', 20)"))
+        conn.execute(text("INSERT INTO users (uid, name, email, password_hash) VALUES ('u1', 'Old', 'old@example.com', 'x')"))
+        conn.execute(text("INSERT INTO clubs (uid, name, budget, status) VALUES ('c1', 'Old Club', 500, 'Approved')"))
+        conn.execute(text("INSERT INTO club_members (user_uid, club_uid, type, joined_at) VALUES ('u1', 'c1', 'member', '2030-01-02 10:00:00')"))
+        conn.execute(text("INSERT INTO events (uid, name, start_datetime, type, status, club_uid) VALUES ('e1', 'Old Event', '2030-01-05 10:00:00', 'online', 'scheduled', 'c1')"))
+    engine.dispose()
+
+    monkeypatch.setenv('DATABASE_URL', url)
+    for _ in range(2):
+        # the second start finds nothing left to do
+        upgraded = create_app()
+    with upgraded.app_context():
+        schema = inspect(_db.engine)
+        assert 'created_at' in {c['name'] for c in schema.get_columns('events')}
+        assert 'ix_events_start_datetime_uid' in {i['name'] for i in schema.get_indexes('events')}
+        # the rollup was filled from the existing memberships
+        rows = _db.session.execute(text('SELECT club_uid, day, joins FROM club_daily_metrics')).all()
+        assert [tuple(map(str, r)) for r in rows] == [('c1', '2030-01-02', '1')]
+        # old events have no creation day and are simply not counted
+        resp = upgraded.test_client().get('/events/?club_uid=c1')
+        assert [e['uid'] for e in resp.get_json()['events']] == ['e1']
+
+        # stored courses without a hash are rewritten once, then left alone
+        from app.course_import import upsert_courses
+        course = {'course_code': 'OLD-101', 'course_name': 'Old Course', 'schedule_raw': 'MW 10:00-11:00',
+                  'students_enrolled': 20, 'days': ['Monday', 'Wednesday'], 'start_time': '10:00', 'end_time': '11:00'}
+        assert upsert_courses([course])['changed'] == ['OLD-101']
+        assert upsert_courses([course])['unchanged'] == 1
+        _db.session.remove()
+        _db.engine.dispose()
@@ -0,0 +1,213 @@
+import os
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+pytest.importorskip('selenium')
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'portal')
+
+
+class PortalHandler(SimpleHTTPRequestHandler):
+    """Serves the static portal fixtures: /login, /home and /courses?page=N."""
+
+    def translate_path(self, path):
+        url = urlparse(path)
+        if url.path == '/courses':
+            page = parse_qs(url.query).get('page', ['1'])[0]
+            return os.path.join(FIXTURES, f'courses-{page}.html')
+        return os.path.join(FIXTURES, url.path.strip('/') + '.html')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def portal(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(PortalHandler, directory=FIXTURES))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv('PORTAL_URL', f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setenv('PORTAL_USERNAME', 'student')
+    monkeypatch.setenv('PORTAL_PASSWORD', 'secret')
+    yield server
+    server.shutdown()
+
+
+class FakeElement:
+    """Just enough of a selenium WebElement for the scraper's selectors."""
+
+    def __init__(self, text='', classes=None, attrs=None, on_click=None):
+        self.text = text
+        self.classes = classes or {}
+        self.attrs = attrs or {}
+        self.on_click = on_click
+
+    def find_element(self, by, value):
+        from selenium.common.exceptions import NoSuchElementException
+        for selector in value.split(','):
+            name = selector.strip().lstrip('.')
+            if name in self.classes:
+                return FakeElement(self.classes[name])
+        raise NoSuchElementException(value)
+
+    def get_attribute(self, name):
+        return self.attrs.get(name)
+
+    def clear(self):
+        pass
+
+    def send_keys(self, keys):
+        self.text = keys
+
+    def click(self):
+        self.on_click()
+
+    def is_enabled(self):
+        return True
+
+
+class FakeDriver:
+    """Stands in for Chrome, serving the portal fixtures. Course pages
+    without a fixture never show a course list, like a page that hangs."""
+
+    def __init__(self, options=None):
+        self.current_url = 'about:blank'
+
+    def _path(self):
+        url = urlparse(self.current_url)
+        return url.path + (f'?{url.query}' if url.query else '')
+
+    def get(self, url):
+        self.current_url = url
+
+    def find_element(self, by, value):
+        from selenium.common.exceptions import NoSuchElementException
+        if self._path() == '/login':
+            login = urlparse(self.current_url)
+            home = f'{login.scheme}://{login.netloc}/home'
+            return FakeElement(on_click=lambda: self.get(home))
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(value)
+        return elements[0]
+
+    def find_elements(self, by, value):
+        from scraper.offline import CourseListParser
+        page = parse_qs(urlparse(self.current_url).query).get('page', [None])[0]
+        path = os.path.join(FIXTURES, f'courses-{page}.html')
+        if value != 'course-item' or not os.path.exists(path):
+            return []
+        parser = CourseListParser()
+        with open(path) as f:
+            parser.feed(f.read())
+        return [FakeElement(classes={c: ' '.join(''.join(parts).split()) for c, parts in item['text'].items()},
+                            attrs={'data-course-code': item['data-course-code']})
+                for item in parser.items]
+
+    def execute_script(self, script):
+        return 1000 if script.startswith('return') else None
+
+    def save_screenshot(self, path):
+        pass
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def fake_chrome(monkeypatch):
+    from types import SimpleNamespace
+    from scraper import scraper as module
+
+    monkeypatch.setattr(module, 'webdriver', SimpleNamespace(Chrome=FakeDriver))
+    monkeypatch.setattr(module, 'PAGE_TIMEOUT_SECONDS', 0.2)
+    monkeypatch.setattr(module, 'SCROLL_WAIT_SECONDS', 0.01)
+    monkeypatch.setenv('PORTAL_URL', 'http://portal.test')
+    return module
+
+
+def test_scrape_with_mocked_driver(fake_chrome):
+    scraper = fake_chrome.CourseScheduleScraper(headless=True)
+    try:
+        assert scraper.login()
+        scraper.navigate_to_courses('/courses?page=1')
+        page = scraper.scrape_courses()
+    finally:
+        scraper.close()
+
+    assert [c['course_code'] for c in page] == ['CSCI-1000', 'CSCI-2000']
+    assert page[1]['days'] == ['Tuesday', 'Thursday']
+    assert page[1]['students_enrolled'] == 30
+
+
+def test_timed_out_shards_are_reported_not_merged(fake_chrome):
+    coordinator = fake_chrome.CourseScheduleScraper(headless=True, start_browser=False)
+    courses = coordinator.scrape_parallel(['/courses?page=1', '/courses?page=9', '/courses?page=2'], workers=2)
+
+    assert [c['course_code'] for c in courses] == ['CSCI-1000', 'CSCI-2000', 'MATH-1010']
+    assert coordinator.failed_shards == ['/courses?page=9']
+
+
+def test_timed_out_page_fails_the_stream(app, tmp_path, fake_chrome):
+    from scraper.stream import CourseStream
+
+    stream = CourseStream(str(tmp_path / 'courses.ndjson'), batch_size=10, app=app)
+    scraper = fake_chrome.CourseScheduleScraper(headless=True, stream=stream)
+    try:
+        scraper.navigate_to_courses('/courses?page=9')
+        assert scraper.scrape_courses() is None
+    finally:
+        scraper.close()
+    assert stream.finish()['failed'] == ['/courses?page=9']
+    assert (tmp_path / 'courses.ndjson.checkpoint').exists()
+
+
+def test_prune_run_with_a_timed_out_shard_saves_nothing(fake_chrome, monkeypatch):
+    saved = []
+    monkeypatch.setattr(fake_chrome.CourseScheduleScraper, 'save_to_database',
+                        lambda self, remove_missing=False: saved.append(remove_missing))
+    monkeypatch.setattr(fake_chrome.CourseScheduleScraper, 'save_to_json', lambda self, *args: saved.append('json'))
+    monkeypatch.setenv('COURSES_SHARDS', '/courses?page=1,/courses?page=9')
+    monkeypatch.setenv('PRUNE_REMOVED_COURSES', '1')
+
+    fake_chrome.main()
+    assert saved == []
+
+
+@pytest.fixture
+def scraper_module():
+    from scraper import scraper as module
+    try:
+        probe = module.CourseScheduleScraper(headless=True)
+    except Exception as e:
+        pytest.skip(f'Chrome is not available: {e}')
+    probe.close()
+    return module
+
+
+def test_scrape_single_session(portal, scraper_module):
+    scraper = scraper_module.CourseScheduleScraper(headless=True)
+    try:
+        assert scraper.login()
+        scraper.navigate_to_courses('/courses?page=1')
+        page = scraper.scrape_courses()
+    finally:
+        scraper.close()
+
+    assert [c['course_code'] for c in page] == ['CSCI-1000', 'CSCI-2000']
+    assert page[1]['days'] == ['Tuesday', 'Thursday']
+    assert (page[1]['start_time'], page[1]['end_time']) == ('14:00', '15:20')
+    assert page[1]['students_enrolled'] == 30
+
+
+def test_scrape_parallel_merges_shards(portal, scraper_module):
+    coordinator = scraper_module.CourseScheduleScraper(headless=True, start_browser=False)
+    courses = coordinator.scrape_parallel(['/courses?page=1', '/courses?page=2'], workers=2)
+
+    # shard order is preserved and the cross-listed course appears once
+    assert [c['course_code'] for c in courses] == ['CSCI-1000', 'CSCI-2000', 'MATH-1010']
+    assert coordinator.driver is None
@@ -1,6 +1,6 @@
-import React, { useState } from "react";
+import React, { useState, useEffect } from "react";
 import { useNavigate } from "react-router-dom";
-import { eventAPI, mediaAPI } from "../services/api";
+import { eventAPI, mediaAPI, calendarAPI } from "../services/api";
 import { useClub } from "../contexts/ClubContext";
 import Navbar from "../components/Navbar";
 import "./CreateEvent.css";
@@ -44,9 +44,34 @@ function CreateEvent() {
   const [loading, setLoading] = useState(false);
   const [bannerFile, setBannerFile] = useState(null);
   const [heatmapData, setHeatmapData] = useState(generateDummyHeatmapData());
+  const [suggestedTimes, setSuggestedTimes] = useState([]);
   const navigate = useNavigate();
   const { selectedClub } = useClub();
 
+  // Suggest quiet weekday windows matching the event's length as it is edited
+  useEffect(() => {
+    const minutes = Math.round(
+      (new Date(endDateTime) - new Date(startDateTime)) / 60000
+    );
+    if (!startDateTime || !endDateTime || !(minutes > 0) || minutes > 720) {
+      setSuggestedTimes([]);
+      return;
+    }
+    const timer = setTimeout(() => {
+      calendarAPI
+        .freeWindows({
+          duration: minutes,
+          days: "mon,tue,wed,thu,fri",
+          start_hour: 9,
+          end_hour: 21,
+          limit: 3,
+        })
+        .then((res) => setSuggestedTimes(res.data.windows || []))
+        .catch(() => setSuggestedTimes([]));
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [startDateTime, endDateTime]);
+
   // Calculate color intensity based on student count
   const getHeatmapColor = (count) => {
     if (count === 0) return "rgba(0, 161, 255, 0.05)";
@@ -286,6 +311,22 @@ function CreateEvent() {
                 ))}
               </div>
 
+              {suggestedTimes.length > 0 && (
+                <div className="suggested-times">
+                  <h3>Suggested times</h3>
+                  <ul>
+                    {suggestedTimes.map((w) => (
+                      <li key={`${w.day}-${w.start_time}`}>
+                        {w.day} {w.start_time}–{w.end_time}
+                        <span className="suggested-busy">
+                          {w.peak_students} students in class
+                        </span>
+                      </li>
+                    ))}
+                  </ul>
+                </div>
+              )}
+
               <div className="heatmap-note">
                 💡 Tip: Schedule events during lighter colored time slots for
                 better availability
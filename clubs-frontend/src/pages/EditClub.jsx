@@ -62,7 +62,7 @@ function EditClub() {
 
       // upload any new files (icons use 'logo' preset)
       if (iconFile) {
-        const up = await mediaAPI.upload(iconFile, "logo");
+        const up = await mediaAPI.upload(iconFile, "logo", { club_uid: clubUid });
         data.icon_url = up.data.url;
       }
 
@@ -50,14 +50,40 @@ export const eventAPI = {
   join: (uid) => api.post(`/events/${uid}/join`),
   getClubEvents: (clubUid) => api.get(`/events/club/${clubUid}`),
   delete: (uid) => api.delete(`/events/${uid}`),
+  // params: { start, end, club_uid, exclude }
+  checkConflicts: (params) => api.get("/events/conflicts", { params }),
+};
+
+// Calendar endpoints
+export const calendarAPI = {
+  // params: { duration, days, start_hour, end_hour, max_busy, limit }
+  freeWindows: (params) => api.get("/calendar/free-windows", { params }),
 };
 
 // Media endpoints
 export const mediaAPI = {
-  upload: (file, presetType) => {
+  // target is { club_uid } or { event_uid } when the image belongs to an existing record
+  upload: async (file, presetType, target = {}) => {
+    let signed;
+    try {
+      signed = await api.post("/media/sign", { preset_type: presetType, ...target });
+    } catch (err) {
+      // signed uploads not configured: send the file through the API instead
+      if (err.response?.status !== 500) throw err;
+      return mediaAPI.uploadViaApi(file, presetType);
+    }
     const fd = new FormData();
+    Object.entries(signed.data.fields).forEach(([k, v]) => fd.append(k, v));
     fd.append("file", file);
+    // straight to storage, without our Authorization header
+    const stored = await axios.post(signed.data.upload_url, fd);
+    return api.post("/media/confirm", stored.data);
+  },
+  uploadViaApi: (file, presetType) => {
+    const fd = new FormData();
+    // the API streams the file upstream, so fields must come before it
     if (presetType) fd.append("preset_type", presetType);
+    fd.append("file", file);
     return api.post("/media/upload", fd, {
       headers: { "Content-Type": "multipart/form-data" },
     });
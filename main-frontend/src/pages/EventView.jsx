@@ -11,6 +11,7 @@ function EventView() {
   const { user } = useAuth();
   const [event, setEvent] = useState(null);
   const [comments, setComments] = useState([]);
+  const [commentsCursor, setCommentsCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [joining, setJoining] = useState(false);
   const [newComment, setNewComment] = useState("");
@@ -22,6 +23,31 @@ function EventView() {
     fetchEventData();
   }, [eventUid]);
 
+  // Live comments: merge comments and replies pushed by the server
+  useEffect(() => {
+    const source = commentAPI.stream(eventUid);
+    source.addEventListener("comment", (e) => {
+      const { parent_uid: parentUid, ...comment } = JSON.parse(e.data);
+      setComments((prev) => {
+        if (!parentUid) {
+          return prev.some((c) => c.uid === comment.uid)
+            ? prev
+            : [comment, ...prev];
+        }
+        return updateComment(prev, parentUid, (parent) =>
+          parent.replies.some((r) => r.uid === comment.uid)
+            ? parent
+            : {
+                ...parent,
+                replies: [...parent.replies, comment],
+                reply_count: parent.reply_count + 1,
+              }
+        );
+      });
+    });
+    return () => source.close();
+  }, [eventUid]);
+
   const fetchEventData = async () => {
     try {
       const [eventResponse, commentsResponse] = await Promise.all([
@@ -29,7 +55,8 @@ function EventView() {
         commentAPI.getEventComments(eventUid),
       ]);
       setEvent(eventResponse.data);
-      setComments(commentsResponse.data || []);
+      setComments(commentsResponse.data.comments || []);
+      setCommentsCursor(commentsResponse.data.next_cursor);
     } catch (err) {
       console.error("Failed to fetch event data:", err);
     } finally {
@@ -55,6 +82,53 @@ function EventView() {
     }
   };
 
+  // Apply fn to the comment with the given uid anywhere in the tree
+  const updateComment = (commentsList, commentUid, fn) =>
+    commentsList.map((comment) => {
+      if (comment.uid === commentUid) return fn(comment);
+      if (comment.replies.length > 0) {
+        return {
+          ...comment,
+          replies: updateComment(comment.replies, commentUid, fn),
+        };
+      }
+      return comment;
+    });
+
+  const loadMoreComments = async () => {
+    try {
+      const response = await commentAPI.getEventComments(eventUid, {
+        cursor: commentsCursor,
+      });
+      setComments((prev) => [...prev, ...(response.data.comments || [])]);
+      setCommentsCursor(response.data.next_cursor);
+    } catch (err) {
+      console.error("Failed to load more comments:", err);
+    }
+  };
+
+  const loadMoreReplies = async (comment) => {
+    try {
+      const response = await commentAPI.getReplies(comment.uid, {
+        cursor: comment.replies_cursor,
+      });
+      setComments((prev) =>
+        updateComment(prev, comment.uid, (c) => {
+          // skip replies this user posted locally since the thread was loaded
+          const shown = new Set(c.replies.map((r) => r.uid));
+          const more = response.data.replies.filter((r) => !shown.has(r.uid));
+          return {
+            ...c,
+            replies: [...c.replies, ...more],
+            replies_cursor: response.data.next_cursor,
+          };
+        })
+      );
+    } catch (err) {
+      console.error("Failed to load replies:", err);
+    }
+  };
+
   const handleSubmitComment = async (e) => {
     e.preventDefault();
     if (!newComment.trim()) return;
@@ -65,7 +139,11 @@ function EventView() {
         event_uid: eventUid,
         content: newComment,
       });
-      setComments([response.data, ...comments]);
+      setComments((prev) =>
+        prev.some((c) => c.uid === response.data.uid)
+          ? prev
+          : [response.data, ...prev]
+      );
       setNewComment("");
     } catch (err) {
       alert(err.response?.data?.msg || "Failed to post comment");
@@ -84,25 +162,17 @@ function EventView() {
       });
 
       // Update the comments tree with the new reply
-      const updateReplies = (commentsList) => {
-        return commentsList.map((comment) => {
-          if (comment.uid === commentUid) {
-            return {
-              ...comment,
-              replies: [...comment.replies, response.data],
-            };
-          }
-          if (comment.replies.length > 0) {
-            return {
-              ...comment,
-              replies: updateReplies(comment.replies),
-            };
-          }
-          return comment;
-        });
-      };
-
-      setComments(updateReplies(comments));
+      setComments((prev) =>
+        updateComment(prev, commentUid, (comment) =>
+          comment.replies.some((r) => r.uid === response.data.uid)
+            ? comment
+            : {
+                ...comment,
+                replies: [...comment.replies, response.data],
+                reply_count: comment.reply_count + 1,
+              }
+        )
+      );
       setReplyContent("");
       setReplyTo(null);
     } catch (err) {
@@ -196,6 +266,15 @@ function EventView() {
           ))}
         </div>
       )}
+
+      {comment.replies_cursor && (
+        <button className="btn-reply" onClick={() => loadMoreReplies(comment)}>
+          Show {comment.reply_count - comment.replies.length} more{" "}
+          {comment.reply_count - comment.replies.length === 1
+            ? "reply"
+            : "replies"}
+        </button>
+      )}
     </div>
   );
 
@@ -367,6 +446,11 @@ function EventView() {
                 <CommentItem key={comment.uid} comment={comment} />
               ))
             )}
+            {commentsCursor && (
+              <button className="btn-reply" onClick={loadMoreComments}>
+                Load more comments
+              </button>
+            )}
           </div>
         </div>
       </div>
@@ -4,9 +4,13 @@ import { clubAPI, eventAPI } from "../services/api";
 import Navbar from "../components/Navbar";
 import "./Home.css";
 
+const EVENTS_PAGE_SIZE = 24;
+
 function Home() {
   const [clubs, setClubs] = useState([]);
   const [events, setEvents] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [activeTab, setActiveTab] = useState("events");
 
@@ -18,10 +22,11 @@ function Home() {
     try {
       const [clubsResponse, eventsResponse] = await Promise.all([
         clubAPI.getAll(),
-        eventAPI.getAll(),
+        eventAPI.getAll({ status: "upcoming", limit: EVENTS_PAGE_SIZE }),
       ]);
       setClubs(clubsResponse.data || []);
-      setEvents(eventsResponse.data || []);
+      setEvents(eventsResponse.data.events || []);
+      setNextCursor(eventsResponse.data.next_cursor);
     } catch (err) {
       console.error("Failed to fetch data:", err);
     } finally {
@@ -29,6 +34,24 @@ function Home() {
     }
   };
 
+  const loadMoreEvents = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await eventAPI.getAll({
+        status: "upcoming",
+        limit: EVENTS_PAGE_SIZE,
+        cursor: nextCursor,
+      });
+      setEvents((prev) => [...prev, ...(response.data.events || [])]);
+      setNextCursor(response.data.next_cursor);
+    } catch (err) {
+      console.error("Failed to load more events:", err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const formatDateTime = (isoString) => {
     if (!isoString) return "TBD";
     const date = new Date(isoString);
@@ -113,6 +136,17 @@ function Home() {
                 ))}
               </div>
             )}
+            {nextCursor && (
+              <div className="load-more">
+                <button
+                  className="load-more-btn"
+                  onClick={loadMoreEvents}
+                  disabled={loadingMore}
+                >
+                  {loadingMore ? "Loading..." : "Load more events"}
+                </button>
+              </div>
+            )}
           </div>
         )}
 
@@ -40,7 +40,8 @@ export const clubAPI = {
 
 // Event endpoints
 export const eventAPI = {
-  getAll: () => api.get("/events/"),
+  // params: { limit, cursor, club_uid, type, status, from, to }
+  getAll: (params) => api.get("/events/", { params }),
   get: (uid) => api.get(`/events/${uid}`),
   join: (uid) => api.post(`/events/${uid}/join`),
   leave: (uid) => api.post(`/events/${uid}/leave`),
@@ -49,7 +50,14 @@ export const eventAPI = {
 
 // Comment endpoints
 export const commentAPI = {
-  getEventComments: (eventUid) => api.get(`/comments/event/${eventUid}`),
+  // params: { limit, cursor, depth, replies }
+  getEventComments: (eventUid, params) =>
+    api.get(`/comments/event/${eventUid}`, { params }),
+  getReplies: (commentUid, params) =>
+    api.get(`/comments/${commentUid}/replies`, { params }),
+  // Server-Sent Events stream of new comments and replies on an event
+  stream: (eventUid) =>
+    new EventSource(`${api.defaults.baseURL}/comments/event/${eventUid}/stream`),
   create: (data) => api.post("/comments/", data),
   reply: (commentUid, data) => api.post(`/comments/${commentUid}/reply`, data),
 };